@@ -1,6 +1,12 @@
 from PyQt5.QtGui import QImage, QPainter, QPen, QColor, QPixmap
 import math
 
+import numpy as np
+
+from fractals.raster import coverage_pixmap, rasterize_canvas
+from fractals.simplify import simplify_collinear, simplify_pixels
+from fractals.anytime import LineAnytime
+
 
 class LSystemGenerator:
     def __init__(self, width: int = 900, height: int = 600):
@@ -20,39 +26,33 @@ class LSystemGenerator:
                 break
         return word
 
-    def generate(
+    def _draw_set(self, axiom: str, rules: dict, draw_chars: str | None) -> set:
+        if draw_chars is not None:
+            return set(draw_chars)
+        control = set("+-[]")
+        draw_candidates = []
+        for ch in axiom:
+            if ch.isalpha() and ch not in control:
+                draw_candidates.append(ch)
+        for repl in rules.values():
+            for ch in repl:
+                if ch.isalpha() and ch not in control:
+                    draw_candidates.append(ch)
+        return set(draw_candidates) or {"F"}
+
+    def segments(
         self,
         iterations: int,
         angle_deg: float,
         step: float,
         axiom: str,
         rules: dict,
-        thickness: int = 1,
         auto_scale: bool = True,
         draw_chars: str | None = None,
     ):
-
         instructions = self._expand(axiom, rules, iterations)
         angle = math.radians(angle_deg)
-        if draw_chars is None:
-            control = set("+-[]")
-            draw_candidates = []
-            for ch in axiom:
-                if ch.isalpha() and ch not in control:
-                    draw_candidates.append(ch)
-            for repl in rules.values():
-                for ch in repl:
-                    if ch.isalpha() and ch not in control:
-                        draw_candidates.append(ch)
-            draw_set = set(draw_candidates) or {"F"}
-        else:
-            draw_set = set(draw_chars)
-
-        img = QImage(self.width, self.height, QImage.Format_RGB32)
-        img.fill(QColor(255, 255, 255))
-        painter = QPainter(img)
-        pen = QPen(QColor(0, 0, 0), thickness)
-        painter.setPen(pen)
+        draw_set = self._draw_set(axiom, rules, draw_chars)
 
         x = y = 0.0
         heading = -math.pi / 2
@@ -99,12 +99,14 @@ class LSystemGenerator:
         heading = -math.pi / 2
         stack = []
 
-        counter = 0
-        for cmd in instructions:
+        # One row per drawn segment: x0, y0, x1, y1 and the index of the
+        # command that drew it, so drawing can be replayed in order.
+        lines = []
+        for i, cmd in enumerate(instructions):
             if cmd in draw_set:
                 nx = x + step * math.cos(heading) * scale
                 ny = y + step * math.sin(heading) * scale
-                painter.drawLine(int(x), int(y), int(nx), int(ny))
+                lines.append((x, y, nx, ny, i))
                 x, y = nx, ny
             elif cmd == "+":
                 heading += angle
@@ -115,9 +117,78 @@ class LSystemGenerator:
             elif cmd == "]" and stack:
                 x, y, heading = stack.pop()
 
-            counter += 1
-            if counter % 80 == 0:
+        lines = np.array(lines, dtype=np.float64).reshape(-1, 5)
+        return lines[:, 0], lines[:, 1], lines[:, 2], lines[:, 3], lines[:, 4].astype(np.intp), len(instructions)
+
+    def render_anytime(
+        self,
+        budget: float,
+        iterations: int,
+        angle_deg: float,
+        step: float,
+        axiom: str,
+        rules: dict,
+        thickness: int = 1,
+        auto_scale: bool = True,
+        draw_chars: str | None = None,
+        state: LineAnytime | None = None,
+    ) -> LineAnytime:
+        key = (iterations, angle_deg, step, axiom, tuple(sorted(rules.items())), thickness, auto_scale,
+               draw_chars, self.width, self.height)
+        if state is None or state.key != key:
+            # Every depth is a complete drawing, so depth is the quality knob.
+            def render_level(depth):
+                x0, y0, x1, y1, _, _ = self.segments(depth, angle_deg, step, axiom, rules, auto_scale, draw_chars)
+                x0, y0, x1, y1 = simplify_collinear(x0, y0, x1, y1)
+                coverage = rasterize_canvas(x0, y0, x1, y1, self.width, self.height, thickness)
+                return coverage_pixmap(coverage), len(x0)
+            state = LineAnytime(key, render_level, iterations, "iterations")
+        return state.refine(budget)
+
+    def generate(
+        self,
+        iterations: int,
+        angle_deg: float,
+        step: float,
+        axiom: str,
+        rules: dict,
+        thickness: int = 1,
+        auto_scale: bool = True,
+        draw_chars: str | None = None,
+        backend: str = "qpainter",
+        antialias: bool = True,
+        simplify: bool = True,
+    ):
+        x0, y0, x1, y1, commands, n_commands = self.segments(
+            iterations, angle_deg, step, axiom, rules, auto_scale, draw_chars
+        )
+
+        if simplify and backend == "numpy":
+            x0, y0, x1, y1 = simplify_collinear(x0, y0, x1, y1)
+        elif simplify:
+            # Runs never straddle a frame, so every frame stays exact as well.
+            x0, y0, x1, y1, commands = simplify_pixels(x0, y0, x1, y1, commands, commands // 80, thickness)
+
+        if backend == "numpy":
+            yield coverage_pixmap(rasterize_canvas(x0, y0, x1, y1, self.width, self.height, thickness, antialias))
+            return
+
+        img = QImage(self.width, self.height, QImage.Format_RGB32)
+        img.fill(QColor(255, 255, 255))
+        painter = QPainter(img)
+        pen = QPen(QColor(0, 0, 0), thickness)
+        painter.setPen(pen)
+
+        # A frame every 80 commands, drawn or not, as the turtle walks.
+        next_frame = 80
+        for i in range(len(x0)):
+            while commands[i] >= next_frame:
                 yield QPixmap.fromImage(img)
+                next_frame += 80
+            painter.drawLine(int(x0[i]), int(y0[i]), int(x1[i]), int(y1[i]))
+        while next_frame <= n_commands:
+            yield QPixmap.fromImage(img)
+            next_frame += 80
 
         painter.end()
         yield QPixmap.fromImage(img)
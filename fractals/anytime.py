@@ -0,0 +1,119 @@
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+from PyQt5.QtCore import Qt
+
+from fractals.escape_time import EscapeProgress, smooth_iterations
+
+
+class AnytimeRender(ABC):
+    def __init__(self, key):
+        self.key = key
+        self.pixmap = None
+        self.quality = None
+        self.complete = False
+        self.elapsed = 0.0
+
+    def refine(self, budget):
+        # Spends up to `budget` seconds improving the result; call again with
+        # more time to carry on from where the last call stopped.
+        started = time.perf_counter()
+        if not self.complete:
+            self.complete = self.improve(started + budget)
+        self.elapsed += time.perf_counter() - started
+        return self
+
+    @abstractmethod
+    def improve(self, deadline):
+        # Works until `deadline`; returns True once the result is final.
+        pass
+
+
+def escape_stages(max_iter, scales=(8, 4, 2)):
+    # Coarse previews at the full iteration count first, then the full
+    # resolution with the iteration count raised in steps on the same state.
+    stages = [(scale, max_iter) for scale in scales]
+    for target in sorted({max(1, max_iter // 4), max(1, max_iter // 2), max_iter}):
+        stages.append((1, target))
+    return stages
+
+
+class EscapeAnytime(AnytimeRender):
+    def __init__(self, key, generator, x, y, max_iter, base_color=None, **params):
+        super().__init__(key)
+        self.generator = generator
+        self.x = x
+        self.y = y
+        self.params = params
+        self.base_color = base_color
+        self.stages = escape_stages(max_iter)
+        self.stage = 0
+        self.progress = None
+        self.scale = None
+
+    def start(self, scale):
+        w = max(1, len(self.x) // scale)
+        h = max(1, len(self.y) // scale)
+        x = np.linspace(self.x[0], self.x[-1], w)
+        y = np.linspace(self.y[0], self.y[-1], h)
+        z, c = self.generator.initial_state(x + y[:, None] * 1j, **self.params)
+        self.progress = EscapeProgress(z, c, self.generator.formula)
+        self.scale = scale
+
+    def show(self, field, scale, reached):
+        iterations, z, inside = field
+        mu = smooth_iterations(iterations, z, self.generator.formula.power)
+        pixmap = self.generator.render_field(mu, inside, self.base_color)
+        if scale != 1:
+            pixmap = pixmap.scaled(len(self.x), len(self.y), Qt.IgnoreAspectRatio, Qt.FastTransformation)
+        self.pixmap = pixmap
+        self.quality = {"scale": 1.0 / scale, "max_iter": reached}
+
+    def improve(self, deadline):
+        finished = None
+        while self.stage < len(self.stages):
+            scale, target = self.stages[self.stage]
+            if self.scale != scale:
+                self.start(scale)
+            if not self.progress.run(target, deadline):
+                break
+            finished = (self.progress.result(), scale, target)
+            self.stage += 1
+
+        # Only the best finished stage is coloured; if nothing has been
+        # finished yet, the partial one stands in for it.
+        if finished is not None:
+            self.show(*finished)
+        elif self.pixmap is None:
+            self.show(self.progress.result(), self.scale, self.progress.done)
+        return self.stage == len(self.stages)
+
+
+class LineAnytime(AnytimeRender):
+    def __init__(self, key, render_level, levels, name="level"):
+        super().__init__(key)
+        self.render_level = render_level
+        self.levels = levels
+        self.name = name
+        self.level = 0
+        self.cost = None
+        self.segments = 0
+
+    def improve(self, deadline):
+        # A level cannot be stopped half-way, so the next one is only started
+        # if its cost, guessed from the last one and its growth in segments,
+        # still fits; the first level always runs.
+        while self.level <= self.levels:
+            started = time.perf_counter()
+            if self.cost is not None and self.pixmap is not None and started + self.cost > deadline:
+                return False
+            pixmap, segments = self.render_level(self.level)
+            spent = time.perf_counter() - started
+            growth = segments / self.segments if self.segments else 1.0
+            self.cost = spent * max(1.0, growth)
+            self.segments = segments
+            self.pixmap = pixmap
+            self.quality = {self.name: self.level, "segments": segments}
+            self.level += 1
+        return True
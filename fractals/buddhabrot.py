@@ -0,0 +1,271 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fractals.escape_time import escape_time
+from fractals.field_file import sidecar_path, write_sidecar
+from fractals.formulas import FORMULAS
+from fractals.mandelbrot import MandelbrotGenerator
+
+
+BUDDHA_FORMAT = "fractalab-buddhabrot"
+BUDDHA_VERSION = 1
+
+# Every c outside |c| <= 2 escapes at once, so this square holds all orbits
+# worth drawing for every formula.
+SAMPLE_REGION = (-2.0, 2.0, -2.0, 2.0)
+MAP_SIZE = 256
+MAP_FLOOR = 0.05
+BATCH = 1 << 15
+ORBIT_BUDGET = 1 << 22
+ROUND_SAMPLES = 1 << 17
+DENSITY_SPAN = 26.0
+GLOW_DENSITY = 0.5
+
+
+def init_worker():
+    # Parallelism comes from the worker processes; numba stays on one core.
+    os.environ["NUMBA_NUM_THREADS"] = "1"
+
+
+def in_cardioid_or_bulb(c):
+    # Points of the main cardioid and the period-2 bulb of z^2 + c never
+    # escape; testing for them is far cheaper than iterating them out.
+    x = c.real - 0.25
+    y2 = c.imag * c.imag
+    q = x * x + y2
+    return (q * (q + x) <= 0.25 * y2) | ((c.real + 1.0) ** 2 + y2 <= 0.0625)
+
+
+def importance_map(formula, max_iter, min_iter=0, size=MAP_SIZE):
+    # A coarse escape map of the sample region. Cells on the boundary of the
+    # set, or whose centre escapes only after min_iter, hold the long orbits
+    # and get most of the samples; the rest of the exterior keeps a small
+    # share, and cells deep inside the set get none.
+    left, right, bottom, top = SAMPLE_REGION
+    x = left + (np.arange(size) + 0.5) * (right - left) / size
+    y = bottom + (np.arange(size) + 0.5) * (top - bottom) / size
+    c = x + y[:, None] * 1j
+    iterations, _, inside = escape_time(np.zeros_like(c), c, max_iter, formula=formula)
+
+    padded = np.pad(inside, 1, mode="edge")
+    any_inside = np.zeros_like(inside)
+    all_inside = np.ones_like(inside)
+    for dy in range(3):
+        for dx in range(3):
+            part = padded[dy:dy + size, dx:dx + size]
+            any_inside |= part
+            all_inside &= part
+    border = any_inside & ~all_inside
+
+    weight = np.where(border | (~inside & (iterations >= min_iter)), 1.0, 0.0)
+    weight += MAP_FLOOR * ~inside
+    return (weight / weight.sum()).ravel()
+
+
+def sample_orbits(job):
+    formula = FORMULAS[job["formula"]]
+    probabilities = job["map"]
+    size = job["map_size"]
+    width, height = job["width"], job["height"]
+    x0, x1, y0, y1 = job["view_box"]
+    step_x = (x1 - x0) / (width - 1)
+    step_y = (y1 - y0) / (height - 1)
+    left, right, bottom, top = SAMPLE_REGION
+    cell_w = (right - left) / size
+    cell_h = (top - bottom) / size
+    mirror = job["mirror"]
+    cardioid = formula.power == 2 and formula.transform == "none"
+
+    rng = np.random.default_rng(job["seed"])
+    histogram = np.zeros(width * height)
+    pending_index = []
+    pending_weight = []
+    pending = 0
+
+    def flush():
+        nonlocal pending
+        if pending:
+            histogram[:] += np.bincount(np.concatenate(pending_index), np.concatenate(pending_weight),
+                                        minlength=histogram.size)
+            pending_index.clear()
+            pending_weight.clear()
+            pending = 0
+
+    def deposit(z, weight):
+        nonlocal pending
+        col = np.rint((z.real - x0) / step_x)
+        for imag in ((z.imag, -z.imag) if mirror else (z.imag,)):
+            row = np.rint((imag - y0) / step_y)
+            seen = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+            if seen.any():
+                pending_index.append((row[seen] * width + col[seen]).astype(np.intp))
+                pending_weight.append(weight[seen])
+                pending += pending_index[-1].size
+        if pending >= ORBIT_BUDGET:
+            flush()
+
+    for start in range(0, job["samples"], BATCH):
+        n = min(BATCH, job["samples"] - start)
+        cells = rng.choice(probabilities.size, n, p=probabilities)
+        row, col = np.divmod(cells, size)
+        c = (left + (col + rng.random(n)) * cell_w) + (bottom + (row + rng.random(n)) * cell_h) * 1j
+        # Each sample stands for 1 / (density it was drawn with) uniform ones.
+        weight = 1.0 / (probabilities[cells] * probabilities.size)
+        if cardioid:
+            keep = ~in_cardioid_or_bulb(c)
+            c, weight = c[keep], weight[keep]
+
+        # First pass: which orbits escape, and after how many steps. Only
+        # those are replayed and drawn.
+        iterations, _, inside = escape_time(np.zeros_like(c), c, job["max_iter"], formula=formula)
+        keep = ~inside & (iterations >= job["min_iter"])
+        c, weight, iterations = c[keep], weight[keep], iterations[keep]
+
+        z = np.zeros_like(c)
+        i = 0
+        while c.size:
+            z = formula.step(z, c)
+            deposit(z, weight)
+            # The replay also stops at its own escape: chaotic orbits can
+            # drift from the first pass's rounding and leave earlier.
+            live = (iterations > i) & (z.real * z.real + z.imag * z.imag <= 4.0)
+            if not live.all():
+                z, c, weight, iterations = z[live], c[live], weight[live], iterations[live]
+            i += 1
+
+    flush()
+    return histogram
+
+
+class BuddhaRun:
+    def __init__(self, meta, histogram=None, probabilities=None):
+        self.meta = meta
+        self.histogram = histogram if histogram is not None else np.zeros((meta["height"], meta["width"]))
+        self.probabilities = probabilities
+
+    @property
+    def samples(self):
+        return self.meta["samples"]
+
+    def matches(self, meta):
+        keys = ("formula", "view", "width", "height", "max_iter", "min_iter")
+        return all(self.meta[k] == meta[k] for k in keys)
+
+    def extend(self, samples, workers=None, progress=None, should_stop=None, round_done=None):
+        # Runs rounds of ROUND_SAMPLES per worker until `samples` in total
+        # have been drawn. Round r of worker w always uses the seed
+        # (seed, r, w), so a run continued from a checkpoint draws the same
+        # samples it would have drawn without the break.
+        meta = self.meta
+        formula = FORMULAS[meta["formula"]]
+        if self.probabilities is None:
+            self.probabilities = importance_map(formula, meta["max_iter"], meta["min_iter"], meta["map_size"])
+        workers = max(1, int(workers or os.cpu_count() or 1))
+        target = int(samples)
+
+        pool = None
+        if workers > 1 and target > meta["samples"]:
+            # Spawned, not forked: the parent may already run numba's OpenMP
+            # threads or a Qt event loop, neither of which survives a fork.
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=init_worker)
+        try:
+            while meta["samples"] < target:
+                if should_stop is not None and should_stop():
+                    return False
+                left = target - meta["samples"]
+                share = min(ROUND_SAMPLES, -(-left // workers))
+                jobs = []
+                for w in range(workers):
+                    n = min(share, left - w * share)
+                    if n <= 0:
+                        break
+                    jobs.append({
+                        "formula": meta["formula"], "map": self.probabilities, "map_size": meta["map_size"],
+                        "width": meta["width"], "height": meta["height"], "view_box": meta["view_box"],
+                        "mirror": meta["mirror"], "max_iter": meta["max_iter"], "min_iter": meta["min_iter"],
+                        "seed": [meta["seed"], meta["rounds"], w], "samples": n,
+                    })
+                parts = list(pool.map(sample_orbits, jobs) if pool is not None else map(sample_orbits, jobs))
+                # Per-worker histograms are merged once the whole round is in,
+                # so an interrupted round leaves no trace.
+                for job, part in zip(jobs, parts):
+                    self.histogram += part.reshape(self.histogram.shape)
+                    meta["samples"] += job["samples"]
+                meta["rounds"] += 1
+                if round_done is not None:
+                    round_done(self)
+                if progress is not None:
+                    progress(int(meta["samples"] / target * 100))
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        return True
+
+    def save(self, path):
+        tmp = path + ".tmp.npy"
+        np.save(tmp, self.histogram)
+        os.replace(tmp, path)
+        write_sidecar(path, self.meta)
+
+
+def open_run(path):
+    with open(sidecar_path(path), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != BUDDHA_FORMAT:
+        raise ValueError(path + " is not a Buddhabrot checkpoint")
+    return BuddhaRun(meta, np.load(path))
+
+
+class BuddhabrotGenerator(MandelbrotGenerator):
+    def run_meta(self, max_iter=1000, min_iter=20, zoom=1.0, offset_x=0.0, offset_y=0.0, seed=0):
+        x, y = self.view_axes(zoom, offset_x, offset_y)
+        return {
+            "format": BUDDHA_FORMAT,
+            "version": BUDDHA_VERSION,
+            "formula": self.formula.name,
+            "view": [float(zoom), float(offset_x), float(offset_y)],
+            "view_box": [float(x[0]), float(x[-1]), float(y[0]), float(y[-1])],
+            "width": self.width,
+            "height": self.height,
+            "max_iter": int(max_iter),
+            "min_iter": int(min_iter),
+            # conj() maps an orbit onto an orbit unless the formula uses abs().
+            "mirror": self.symmetry() == "mirror",
+            "map_size": MAP_SIZE,
+            "seed": int(seed),
+            "samples": 0,
+            "rounds": 0,
+        }
+
+    def new_run(self, max_iter=1000, min_iter=20, zoom=1.0, offset_x=0.0, offset_y=0.0, seed=0, run=None):
+        # An earlier run of the same picture is extended instead of restarted.
+        meta = self.run_meta(max_iter, min_iter, zoom, offset_x, offset_y, seed)
+        if run is not None and run.matches(meta):
+            return run
+        return BuddhaRun(meta)
+
+    def density_field(self, histogram):
+        # Orbit density runs through the theme like a smooth iteration count
+        # would; pixels no orbit ever reached stay black.
+        peak = histogram.max()
+        density = histogram / peak if peak > 0 else histogram
+        return np.sqrt(density) * DENSITY_SPAN, histogram <= 0
+
+    def density_colorize(self, mu, inside):
+        # Sparse regions fade to black instead of showing the palette's first
+        # colour, so the figure stands out from the background.
+        glow = np.minimum(1.0, mu / (DENSITY_SPAN * GLOW_DENSITY))
+        return (self.colorize_field(mu, inside) * glow[..., None]).astype(np.uint8)
+
+    def render_run(self, run, base_color=None):
+        mu, empty = self.density_field(run.histogram)
+        return self.render_field(mu, empty, base_color, self.density_colorize)
+
+    def run_rgb(self, run, base_color=None):
+        mu, empty = self.density_field(run.histogram)
+        return self.field_to_rgb(mu, empty, base_color, self.density_colorize)
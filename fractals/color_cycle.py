@@ -0,0 +1,63 @@
+import numpy as np
+from PIL import Image
+
+from fractals.frame_buffer import BLUE, GREEN, PAD, RED
+
+
+# colorize_field uses t = mu * 0.12 and every theme is periodic in t with
+# period 2*pi, so one turn of the palette is one loop of the animation.
+PHASE_SCALE = 0.12
+LUT_SIZE = 4096
+GIF_COLORS = 255
+
+def palette_lut(generator, base_color=None, size=LUT_SIZE):
+    # One palette turn sampled at `size` phases, as RGB rows. It is coloured
+    # through field_to_rgb, so the theme is picked the way the screen picks
+    # it (a Julia set with a chosen colour is drawn with the Custom theme).
+    mu = (np.arange(size) * (2 * np.pi / size) / PHASE_SCALE)[None, :]
+    return generator.field_to_rgb(mu, np.zeros(mu.shape, dtype=bool), base_color)[0]
+
+
+class ColorCycle:
+    def __init__(self, generator, mu, inside, base_color=None):
+        self.generator = generator
+        self.base_color = base_color
+        self.inside = inside
+        # The field is reduced once to a position on the palette turn; every
+        # frame then only adds its phase and looks the colour up.
+        self.position = np.mod(np.where(inside, 0.0, mu) * PHASE_SCALE / (2 * np.pi), 1.0)
+        self.index = np.floor(self.position * LUT_SIZE).astype(np.int32) & (LUT_SIZE - 1)
+
+        rgb = palette_lut(generator, base_color)
+        self.lut = np.empty((LUT_SIZE, 4), dtype=np.uint8)
+        self.lut[:, RED] = rgb[:, 0]
+        self.lut[:, GREEN] = rgb[:, 1]
+        self.lut[:, BLUE] = rgb[:, 2]
+        self.lut[:, PAD] = 255
+        # Whole RGB32 pixels are looked up as one 32-bit word each.
+        self.words = self.lut.view(np.uint32).ravel()
+        self.black = np.array([0, 0, 0, 255], dtype=np.uint8).view(np.uint32)[0]
+
+    def frame(self, frame, n_frames):
+        # A BGRX frame, handed to the video writer as it is.
+        shift = round(frame * LUT_SIZE / n_frames)
+        out = self.words[(self.index + shift) & (LUT_SIZE - 1)]
+        out[self.inside] = self.black
+        return out.view(np.uint8).reshape(out.shape + (4,))
+
+    def gif_frame(self, frame, n_frames):
+        # GIF frames are palette images already: index GIF_COLORS is black for
+        # the set, the rest is the palette turn, so nothing gets quantised.
+        palette = np.zeros((GIF_COLORS + 1, 3), dtype=np.uint8)
+        palette[:GIF_COLORS] = palette_lut(self.generator, self.base_color, GIF_COLORS)
+        index = np.floor((self.position + frame / n_frames) * GIF_COLORS).astype(np.int32) % GIF_COLORS
+        index[self.inside] = GIF_COLORS
+        image = Image.fromarray(index.astype(np.uint8), "P")
+        image.putpalette(palette.tobytes())
+        return image
+
+    def frames(self, n_frames):
+        return (self.frame(i, n_frames) for i in range(n_frames))
+
+    def gif_frames(self, n_frames):
+        return (self.gif_frame(i, n_frames) for i in range(n_frames))
@@ -0,0 +1,77 @@
+import numpy as np
+
+from fractals.escape_time import smooth_iterations
+
+
+def distance_field(generator, points, max_iter=200, radius=1000.0, **params):
+    formula = generator.formula
+    if formula.transform != "none":
+        raise ValueError(f"Distance estimation needs a holomorphic formula, not {formula.name}")
+    power = formula.power
+
+    z, c = generator.initial_state(points, **params)
+    shape = z.shape
+    c = np.broadcast_to(c, shape).ravel()
+    z = z.ravel()
+    dz = np.full(z.shape, generator.derivative_seed, dtype=np.complex128)
+    offset = generator.derivative_offset
+
+    iterations = np.zeros(z.size, dtype=np.int32)
+    final_z = np.zeros(z.size, dtype=np.complex128)
+    final_dz = np.ones(z.size, dtype=np.complex128)
+    escaped = np.zeros(z.size, dtype=bool)
+    live = np.arange(z.size)
+    radius2 = radius * radius
+
+    # Same escape-time loop, but carrying dz/dc (or dz/dz0) alongside z and
+    # compacting the live set as pixels escape so finished pixels cost nothing.
+    for i in range(max_iter):
+        zp = z if power == 2 else z ** (power - 1)
+        dz = power * zp * dz + offset
+        z = zp * z + c
+
+        out = z.real * z.real + z.imag * z.imag > radius2
+        if out.any():
+            ids = live[out]
+            iterations[ids] = i
+            final_z[ids] = z[out]
+            final_dz[ids] = dz[out]
+            escaped[ids] = True
+
+            keep = ~out
+            live = live[keep]
+            z = z[keep]
+            dz = dz[keep]
+            c = c[keep]
+            if live.size == 0:
+                break
+
+    abs_z = np.abs(final_z)
+    abs_dz = np.abs(final_dz)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance = np.where(escaped, abs_z * np.log(np.maximum(abs_z, 1.0)) / np.maximum(abs_dz, 1e-300), 0.0)
+
+    mu = smooth_iterations(iterations, np.where(escaped, final_z, 0), power)
+    inside = ~escaped
+    return mu.reshape(shape), inside.reshape(shape), distance.reshape(shape)
+
+
+def shade_by_distance(img_array, distance, inside, pixel_size, thickness=1.0):
+    shade = np.clip(distance / (thickness * pixel_size), 0.0, 1.0) ** 0.5
+    shade[inside] = 0.0
+    return np.round(img_array * shade[..., None]).astype(np.uint8)
+
+
+def inverse_iteration_points(c, power=2, walkers=4096, steps=48, burn_in=16, seed=0):
+    rng = np.random.default_rng(seed)
+    z = rng.standard_normal(walkers) + 1j * rng.standard_normal(walkers)
+    roots = np.exp(2j * np.pi * np.arange(power) / power)
+
+    # Backward orbits are attracted to the Julia set, so after a short
+    # burn-in every step of every walker lands on (or very near) the boundary.
+    points = []
+    for step in range(burn_in + steps):
+        z = (z - c) ** (1.0 / power) * roots[rng.integers(0, power, walkers)]
+        if step >= burn_in:
+            points.append(z)
+    return np.concatenate(points)
@@ -0,0 +1,165 @@
+from abc import ABC, abstractmethod
+
+from PyQt5.QtGui import QColor
+import numpy as np
+
+from fractals.escape_time import escape_time, smooth_iterations
+from fractals.workspace import EscapeWorkspace
+from fractals.distance import distance_field, shade_by_distance
+from fractals.field_file import open_field
+from fractals.formulas import DEFAULT_FORMULA
+from fractals.symmetry import symmetric_field
+from fractals.frame_buffer import FrameBuffer, BLUE, GREEN, RED, write_rgb
+from fractals.anytime import EscapeAnytime
+from fractals.field_state import FieldStates
+
+
+class EscapeTimeGenerator(ABC):
+    derivative_seed = 0.0
+    derivative_offset = 1.0
+
+    def __init__(self, width=900, height=600, formula=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.theme = "Ocean"
+        self.user_color = QColor(130, 30, 255)
+        self.formula = formula or DEFAULT_FORMULA
+        self.workspace = EscapeWorkspace()
+        self.field_states = FieldStates()
+
+    def get_theme_color(self, t):
+        # One palette definition for the per-pixel and the vectorised paths.
+        r, g, b = self.get_theme_color_numpy(np.array([t], dtype=np.float64))
+        return QColor(int(r[0]), int(g[0]), int(b[0]))
+
+    def get_theme_color_numpy(self, t_array):
+        r = np.zeros_like(t_array)
+        g = np.zeros_like(t_array)
+        b = np.zeros_like(t_array)
+        
+        if self.theme == "Ocean":
+            r = 20 + 60 * np.sin(t_array + 0.0)
+            g = 80 + 100 * np.sin(t_array + 1.0)
+            b = 150 + 100 * np.sin(t_array + 2.0)
+        elif self.theme == "Fire":
+            r = 150 + 100 * np.sin(t_array + 0.0)
+            g = 40 + 120 * np.sin(t_array + 1.5)
+            b = 10 + 40 * np.sin(t_array + 3.0)
+        elif self.theme == "Ice":
+            r = 180 + 40 * np.sin(t_array + 0.0)
+            g = 220 + 30 * np.sin(t_array + 1.0)
+            b = 255 + 0 * np.sin(t_array + 0.0)
+        elif self.theme == "Neon":
+            r = 180 + 70 * np.sin(t_array + 0.0)
+            g = 20 + 200 * np.sin(t_array + 1.0)
+            b = 200 + 50 * np.sin(t_array + 2.0)
+        elif self.theme == "Pastel":
+            r = 200 + 30 * np.sin(t_array + 0.0)
+            g = 180 + 40 * np.sin(t_array + 1.0)
+            b = 200 + 50 * np.sin(t_array + 2.0)
+        elif self.theme == "Custom":
+            ur = self.user_color.red()
+            ug = self.user_color.green()
+            ub = self.user_color.blue()
+            r = ur * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 0.0)))
+            g = ug * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 1.0)))
+            b = ub * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 2.0)))
+        else:
+            v = 127.5 * (1 + np.sin(t_array))
+            r = g = b = v
+        
+        r = np.clip(np.round(r), 0, 255).astype(np.uint8)
+        g = np.clip(np.round(g), 0, 255).astype(np.uint8)
+        b = np.clip(np.round(b), 0, 255).astype(np.uint8)
+        
+        return r, g, b
+
+    @abstractmethod
+    def initial_state(self, points, **params):
+        # The starting z and the c of every point of the view.
+        pass
+
+    def symmetry(self, **params):
+        return None
+
+    def compute_points(self, points, max_iter=200, **params):
+        z, c = self.initial_state(points, **params)
+        iterations, z, inside = escape_time(z, c, max_iter, formula=self.formula, workspace=self.workspace)
+        return smooth_iterations(iterations, z, self.formula.power), inside
+
+    def compute_field(self, x, y, max_iter=200, keep_state=False, **params):
+        # With keep_state (whole views on screen) the last few views keep
+        # their per-pixel state, so asking for the same view with another
+        # max_iter only iterates what is still inside. Pan strips, tiles and
+        # bands are never asked for twice and are not kept.
+        state = self.field_states.get(self, x, y, params) if keep_state else None
+        if state is not None:
+            return state.compute(max_iter)
+
+        def compute(x, y):
+            return self.compute_points(x + y[:, None] * 1j, max_iter, **params)
+        return symmetric_field(compute, x, y, self.symmetry(**params))
+
+    def compute_distance_field(self, x, y, max_iter=200, **params):
+        def compute(x, y):
+            return distance_field(self, x + y[:, None] * 1j, max_iter, **params)
+        return symmetric_field(compute, x, y, self.symmetry(**params))
+
+    def render_anytime_view(self, budget, view, max_iter=200, base_color=None, state=None, **params):
+        color = base_color.rgb() if isinstance(base_color, QColor) else None
+        key = (view, max_iter, self.formula.name, self.theme, color, self.width, self.height,
+               tuple(sorted(params.items())))
+        if state is None or state.key != key:
+            x, y = self.view_axes(*view)
+            state = EscapeAnytime(key, self, x, y, max_iter, base_color, **params)
+        return state.refine(budget)
+
+    def distance_colorize(self, distance, pixel_size, thickness=1.0):
+        def colorize(mu, inside):
+            return shade_by_distance(self.colorize_field(mu, inside), distance, inside, pixel_size, thickness)
+        return colorize
+
+    def colorize_field(self, mu, inside, out=None):
+        t_array = mu * 0.12
+        r, g, b = self.get_theme_color_numpy(t_array)
+
+        if out is None:
+            img_array = np.stack([r, g, b], axis=2)
+            img_array[inside] = [0, 0, 0]
+            return img_array
+
+        out[..., RED] = r
+        out[..., GREEN] = g
+        out[..., BLUE] = b
+        out[inside, :3] = 0
+        return out
+
+    def field_to_rgb(self, mu, inside, base_color=None, colorize=None, out=None):
+        if base_color is not None and isinstance(base_color, QColor):
+            self.user_color = base_color
+
+        if out is None:
+            colorize = colorize or self.colorize_field
+            return np.ascontiguousarray(colorize(mu, inside))
+
+        # With an output frame the default palette writes straight into its
+        # BGRX bytes; custom colorizers still produce RGB that is swizzled in.
+        if colorize is None:
+            return self.colorize_field(mu, inside, out)
+        write_rgb(out, colorize(mu, inside))
+        return out
+
+    def render_frame(self, mu, inside, base_color=None, colorize=None):
+        # Every frame gets its own buffer: the GUI and a video thread may
+        # render with the same generator at once, and frames already handed
+        # out are never drawn over.
+        height, width = mu.shape
+        frame = FrameBuffer(width, height)
+        self.field_to_rgb(mu, inside, base_color, colorize, frame.array)
+        return frame
+
+    def render_field(self, mu, inside, base_color=None, colorize=None):
+        return self.render_frame(mu, inside, base_color, colorize).pixmap()
+
+    def open_field(self, path, mode="r"):
+        return open_field(path, mode)
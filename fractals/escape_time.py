@@ -0,0 +1,175 @@
+import os
+import time
+
+import numpy as np
+
+from fractals import jit_backend
+from fractals.formulas import DEFAULT_FORMULA, escaped
+from fractals.tuning import SETTINGS
+from fractals.workspace import EscapeWorkspace
+
+
+BACKEND = os.environ.get("FRACTALAB_BACKEND", SETTINGS["escape_backend"])
+
+
+def select_backend(backend=None):
+    backend = backend or BACKEND
+    if backend in ("auto", "jit") and jit_backend.available():
+        return "jit"
+    if backend == "numpy":
+        return "numpy"
+    return "blocked"
+
+
+def advance(z, c, mask, iterations, start, stop, backend=None, formula=None):
+    formula = formula or DEFAULT_FORMULA
+    if select_backend(backend) == "jit" and z.flags.c_contiguous and iterations.flags.c_contiguous:
+        return jit_backend.advance(z, c, mask, iterations, start, stop, formula.transform_code, formula.power)
+
+    per_pixel_c = np.ndim(c) > 0
+    step = formula.step
+
+    for i in range(start, stop):
+        if per_pixel_c:
+            z[mask] = step(z[mask], c[mask])
+        else:
+            z[mask] = step(z[mask], c)
+        diverged = escaped(z)
+        iterations[diverged & mask] = i
+        mask = mask & (~diverged)
+
+    return mask
+
+
+def escape_time(z, c, max_iter, backend=None, formula=None, workspace=None):
+    if select_backend(backend) == "blocked":
+        workspace = workspace or EscapeWorkspace()
+        return workspace.escape_time(z, c, max_iter, formula or DEFAULT_FORMULA)
+
+    iterations = np.zeros(z.shape, dtype=np.int32)
+    mask = np.ones(z.shape, dtype=bool)
+    mask = advance(z, c, mask, iterations, 0, max_iter, backend, formula)
+    return iterations, z, mask
+
+
+class EscapeProgress:
+    def __init__(self, z, c, formula=None):
+        self.formula = formula or DEFAULT_FORMULA
+        self.shape = z.shape
+        self.z = z.reshape(-1)
+        self.c = np.broadcast_to(c, self.shape).reshape(-1) if np.ndim(c) > 0 else c
+        self.iterations = np.zeros(self.z.size, dtype=np.int32)
+        self.final_z = self.z.copy()
+        self.inside = np.ones(self.z.size, dtype=bool)
+        self.live = np.arange(self.z.size)
+        self.done = 0
+
+    def run(self, stop, deadline=None):
+        # Escaped pixels are dropped from the working arrays, so late iterations
+        # only touch what is still bounded instead of masking the whole block.
+        # The live state is kept, so a later call continues where this one ended.
+        step = self.formula.step
+        per_pixel_c = np.ndim(self.c) > 0
+        z, c, live = self.z, self.c, self.live
+        finished = True
+        while self.done < stop:
+            if live.size == 0:
+                self.done = stop
+                break
+            if deadline is not None and self.done % 8 == 0 and time.perf_counter() > deadline:
+                finished = False
+                break
+            z = step(z, c)
+            out = escaped(z)
+            if out.any():
+                ids = live[out]
+                self.iterations[ids] = self.done
+                self.final_z[ids] = z[out]
+                self.inside[ids] = False
+
+                keep = ~out
+                live = live[keep]
+                z = z[keep]
+                if per_pixel_c:
+                    c = c[keep]
+            self.done += 1
+
+        self.z, self.c, self.live = z, c, live
+        return finished
+
+    def result(self):
+        final_z = self.final_z.copy()
+        final_z[self.live] = self.z
+        return (self.iterations.reshape(self.shape).copy(), final_z.reshape(self.shape),
+                self.inside.reshape(self.shape).copy())
+
+
+class EscapeState:
+    def __init__(self, z, c, formula=None, backend=None, workspace=None):
+        self.formula = formula or DEFAULT_FORMULA
+        self.backend = backend
+        self.workspace = workspace
+        self.z = z
+        self.c = c
+        self.iterations = None
+        self.inside = None
+        self.done = 0
+
+    @classmethod
+    def resume(cls, z, c, done, formula=None, backend=None, workspace=None):
+        # Points known to be bounded after `done` iterations, carried on from
+        # their stored z.
+        state = cls(z, c, formula, backend, workspace)
+        state.iterations = np.zeros(z.shape, dtype=np.int32)
+        state.inside = np.ones(z.shape, dtype=bool)
+        state.done = int(done)
+        return state
+
+    def advance(self, max_iter):
+        # Only the pixels still bounded after `done` iterations are carried on,
+        # from their stored z; their new escape counts are offset by `done`.
+        if max_iter <= self.done:
+            return
+        if self.iterations is None:
+            self.iterations, self.z, self.inside = escape_time(self.z, self.c, max_iter, self.backend,
+                                                               self.formula, self.workspace)
+            self.done = max_iter
+            return
+
+        live = np.flatnonzero(self.inside)
+        if live.size == 0:
+            self.done = max_iter
+            return
+        c = np.broadcast_to(self.c, self.z.shape).reshape(-1)[live] if np.ndim(self.c) > 0 else self.c
+        iterations, z, inside = escape_time(self.z.reshape(-1)[live], c, max_iter - self.done, self.backend,
+                                            self.formula, self.workspace)
+        self.iterations.reshape(-1)[live] = np.where(inside, 0, iterations + self.done)
+        self.z.reshape(-1)[live] = z
+        self.inside.reshape(-1)[live] = inside
+        self.done = max_iter
+
+    def field(self, max_iter):
+        # A lower budget is answered from the stored counts: a pixel that
+        # escaped at or after it counts as inside.
+        self.advance(max_iter)
+        if max_iter == self.done:
+            return self.iterations, self.z, self.inside.copy()
+        counted = ~self.inside & (self.iterations < max_iter)
+        return np.where(counted, self.iterations, 0), self.z, ~counted
+
+
+def escape_compact(z, c, max_iter, formula=None, deadline=None):
+    progress = EscapeProgress(z, c, formula)
+    progress.run(max_iter, deadline)
+    iterations, final_z, inside = progress.result()
+    return iterations, final_z, inside, progress.done
+
+
+def smooth_iterations(iterations, z, power=2):
+    z_abs = np.abs(z)
+    log_z = np.log(np.where(z_abs > 1e-10, z_abs, 1e-10))
+    if power == 2:
+        mu = iterations - np.log2(np.where(log_z > 1e-10, log_z, 1e-10))
+    else:
+        mu = iterations - np.log(np.where(log_z > 1e-10, log_z, 1e-10)) / np.log(power)
+    return np.where(np.isfinite(mu), mu, iterations)
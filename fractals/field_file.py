@@ -0,0 +1,301 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from fractals.escape_time import EscapeState, smooth_iterations
+
+
+FIELD_FORMAT = "fractalab-field"
+FIELD_VERSION = 2
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def write_sidecar(path, meta):
+    tmp = sidecar_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, sidecar_path(path))
+
+
+def state_dir(path):
+    return os.path.splitext(path)[0] + ".state"
+
+
+def state_path(path, top):
+    return os.path.join(state_dir(path), f"{top:06d}.npz")
+
+
+def save_band_state(path, top, z, done):
+    # The z of a band's inside (NaN) pixels in row-major order, and the
+    # iteration they were stopped at. Written before the band's mu, so a
+    # state that does not match the stored NaN pixels is simply not used.
+    os.makedirs(state_dir(path), exist_ok=True)
+    tmp = state_path(path, top)[:-4] + ".tmp.npz"
+    np.savez(tmp, z=z, done=int(done))
+    os.replace(tmp, state_path(path, top))
+
+
+def load_band_state(path, top, count):
+    if not os.path.exists(state_path(path, top)):
+        return None, 0
+    with np.load(state_path(path, top)) as data:
+        z, done = data["z"], int(data["done"])
+    if z.size != count:
+        return None, 0
+    return z, done
+
+
+def escape_points(generator, points, max_iter, params, z=None, done=0):
+    # mu with NaN for the points still inside, and the z of those points.
+    # Given the z they reached after `done` iterations, only the remaining
+    # iterations are run.
+    if points.size == 0:
+        return np.empty(points.shape), np.empty(0, dtype=np.complex128)
+    z0, c = generator.initial_state(points, **params)
+    if z is None:
+        state = EscapeState(z0, c, generator.formula, workspace=generator.workspace)
+    else:
+        state = EscapeState.resume(z, c, done, generator.formula, workspace=generator.workspace)
+    state.advance(max_iter)
+    mu = smooth_iterations(state.iterations, state.z, generator.formula.power)
+    return np.where(state.inside, np.nan, mu), state.z[state.inside]
+
+
+def split_inside(stored):
+    mu = np.array(stored, dtype=np.float64)
+    inside = np.isnan(mu)
+    mu[inside] = 0.0
+    return mu, inside
+
+
+def field_meta(generator, x, y, max_iter, params, view=None, band_height=256):
+    return {
+        "format": FIELD_FORMAT,
+        "version": FIELD_VERSION,
+        "generator": type(generator).__name__,
+        "formula": generator.formula.name,
+        "view": [float(v) for v in view] if view is not None else None,
+        "params": {k: float(v) for k, v in (params or {}).items()},
+        "max_iter": int(max_iter),
+        "width": int(len(x)),
+        "height": int(len(y)),
+        "x_range": [float(x[0]), float(x[-1])],
+        "y_range": [float(y[0]), float(y[-1])],
+        "band_height": int(band_height),
+        "done": [],
+    }
+
+
+def write_field(path, generator, x, y, max_iter=200, params=None, view=None, band_height=256,
+                progress=None, should_stop=None):
+    params = params or {}
+    meta = field_meta(generator, x, y, max_iter, params, view, band_height)
+
+    # A sidecar describing the same job means an interrupted write: keep the
+    # bands it already lists and fill in the rest.
+    previous = None
+    if os.path.exists(path) and os.path.exists(sidecar_path(path)):
+        with open(sidecar_path(path), "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if {k: v for k, v in previous.items() if k != "done"} != {k: v for k, v in meta.items() if k != "done"}:
+            previous = None
+
+    if previous is None:
+        shutil.rmtree(state_dir(path), ignore_errors=True)
+        mu = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(y), len(x)))
+        write_sidecar(path, meta)
+    else:
+        meta = previous
+        mu = np.lib.format.open_memmap(path, mode="r+")
+
+    bands = list(range(0, len(y), band_height))
+    done = set(meta["done"])
+    for top in bands:
+        if top in done:
+            continue
+        if should_stop is not None and should_stop():
+            break
+
+        # The z of the pixels still inside is kept next to the field, so a
+        # later refine carries them on instead of starting over.
+        band_mu, band_z = escape_points(generator, x + y[top:top + band_height, None] * 1j, max_iter, params)
+        save_band_state(path, top, band_z, max_iter)
+        mu[top:top + band_height] = band_mu
+        mu.flush()
+
+        meta["done"].append(top)
+        write_sidecar(path, meta)
+        if progress is not None:
+            progress(int(len(meta["done"]) / len(bands) * 100))
+
+    del mu
+    return len(meta["done"]) == len(bands)
+
+
+class IterationField:
+    def __init__(self, path, mode="r"):
+        self.path = path
+        with open(sidecar_path(path), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FIELD_FORMAT or self.meta.get("version", 0) > FIELD_VERSION:
+            raise ValueError(f"Not a FractaLab iteration field: {path}")
+        self.mu = np.load(path, mmap_mode=mode)
+
+    @property
+    def width(self):
+        return self.meta["width"]
+
+    @property
+    def height(self):
+        return self.meta["height"]
+
+    @property
+    def max_iter(self):
+        return self.meta["max_iter"]
+
+    @property
+    def params(self):
+        return self.meta["params"]
+
+    @property
+    def complete(self):
+        return len(self.meta["done"]) == len(range(0, self.height, self.meta["band_height"]))
+
+    def axes(self):
+        x = np.linspace(*self.meta["x_range"], self.width)
+        y = np.linspace(*self.meta["y_range"], self.height)
+        return x, y
+
+    def band(self, top, bottom):
+        return split_inside(self.mu[top:bottom])
+
+    def preview(self, width, height):
+        # Every step-th pixel, enough to fill width x height.
+        step = max(1, -(-self.width // int(width)), -(-self.height // int(height)))
+        return split_inside(self.mu[::step, ::step])
+
+    def rgb_bands(self, generator, base_color=None, band_height=256):
+        for top in range(0, self.height, band_height):
+            mu, inside = self.band(top, top + band_height)
+            yield top, generator.field_to_rgb(mu, inside, base_color)
+
+    def band_state(self, top):
+        count = np.count_nonzero(np.isnan(self.mu[top:top + self.meta["band_height"]]))
+        return load_band_state(self.path, top, count)
+
+    def state_rows(self, start, stop):
+        # Stored z for rows start..stop laid out like the field (NaN where a
+        # pixel escaped), or None unless every band involved has a state and
+        # all of them stopped at the same iteration.
+        band_height = self.meta["band_height"]
+        first = start - start % band_height
+        rows = []
+        dones = set()
+        for top in range(first, stop, band_height):
+            inside = np.isnan(self.mu[top:top + band_height])
+            z, done = self.band_state(top)
+            if z is None:
+                return None, 0
+            full = np.full(inside.shape, np.nan, dtype=np.complex128)
+            full[inside] = z
+            rows.append(full)
+            dones.add(done)
+        if len(dones) != 1:
+            return None, 0
+        return np.concatenate(rows)[start - first:stop - first], dones.pop()
+
+    def crop(self, path, left, top, right, bottom, band_height=256, progress=None, should_stop=None):
+        if os.path.abspath(path) == os.path.abspath(self.path):
+            raise ValueError("Crop into a new file")
+        x, y = self.axes()
+        x = x[left:right]
+        y = y[top:bottom]
+        if not len(x) or not len(y):
+            raise ValueError("The crop box is empty")
+        right = left + len(x)
+        bottom = top + len(y)
+
+        # A crop has the field's aspect no longer, so no zoom and offset
+        # describe it: the sidecar keeps the view the whole field was made
+        # from and the crop box within it.
+        meta = dict(self.meta)
+        origin = self.meta.get("crop", [0, 0])
+        meta.update(
+            view=None,
+            source_view=self.meta.get("source_view", self.meta["view"]),
+            crop=[origin[0] + left, origin[1] + top, origin[0] + right, origin[1] + bottom],
+            width=len(x),
+            height=len(y),
+            x_range=[float(x[0]), float(x[-1])],
+            y_range=[float(y[0]), float(y[-1])],
+            band_height=band_height,
+            done=list(range(0, len(y), band_height)),
+        )
+
+        shutil.rmtree(state_dir(path), ignore_errors=True)
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=self.mu.dtype, shape=(len(y), len(x)))
+        for row in range(0, len(y), band_height):
+            if should_stop is not None and should_stop():
+                del out
+                os.remove(path)
+                shutil.rmtree(state_dir(path), ignore_errors=True)
+                return None
+            stop = min(top + row + band_height, bottom)
+            part = self.mu[top + row:stop, left:right]
+            z, done = self.state_rows(top + row, stop)
+            if z is not None:
+                save_band_state(path, row, z[:, left:right][np.isnan(part)], done)
+            out[row:row + band_height] = part
+            if progress is not None:
+                progress(int(min(row + band_height, len(y)) / len(y) * 100))
+        out.flush()
+        del out
+
+        write_sidecar(path, meta)
+        return IterationField(path)
+
+    def refine(self, generator, max_iter, progress=None, should_stop=None):
+        if self.meta["generator"] != type(generator).__name__:
+            raise ValueError("Field was computed by " + self.meta["generator"])
+        if self.meta.get("formula", generator.formula.name) != generator.formula.name:
+            raise ValueError("Field was computed with formula " + self.meta["formula"])
+        if self.mu.mode != "r+":
+            raise ValueError("Open the field with mode='r+' to refine it")
+        if max_iter <= self.max_iter:
+            return True
+
+        # Escaped pixels keep their smooth count at any higher budget, so only
+        # the pixels stored as inside (NaN) are iterated again, from the z
+        # they were stopped at. Bands without a usable state (older files)
+        # start over from z0. A band already refined this far by an
+        # interrupted run is skipped.
+        x, y = self.axes()
+        band_height = self.meta["band_height"]
+        for top in range(0, self.height, band_height):
+            z, done = self.band_state(top)
+            if z is not None and done >= max_iter:
+                continue
+            if should_stop is not None and should_stop():
+                return False
+            band = self.mu[top:top + band_height]
+            rows, cols = np.nonzero(np.isnan(band))
+            points = x[cols] + y[top + rows] * 1j
+            mu, z = escape_points(generator, points, max_iter, self.params, z, done)
+            save_band_state(self.path, top, z, max_iter)
+            band[rows, cols] = mu
+            self.mu.flush()
+            if progress is not None:
+                progress(int(min(top + band_height, self.height) / self.height * 100))
+
+        self.meta["max_iter"] = int(max_iter)
+        write_sidecar(self.path, self.meta)
+        return True
+
+
+def open_field(path, mode="r"):
+    return IterationField(path, mode)
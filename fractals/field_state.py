@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from fractals.escape_time import EscapeState, smooth_iterations
+from fractals.symmetry import symmetric_field
+
+
+STATE_PIXELS = 1 << 21
+
+
+class FieldState:
+    def __init__(self, generator, x, y, params):
+        self.generator = generator
+        self.formula = generator.formula
+        self.x = x
+        self.y = y
+        self.params = params
+        self.parts = []
+        self.lock = threading.Lock()
+
+    def matches(self, formula, x, y, params):
+        return (self.formula is formula and self.params == params
+                and np.array_equal(self.x, x) and np.array_equal(self.y, y))
+
+    def compute(self, max_iter):
+        # symmetric_field splits a view the same way every time, so the
+        # states of its pieces are created on the first call and replayed in
+        # the same order on later ones.
+        gen = self.generator
+        parts = iter(list(self.parts))
+        first = not self.parts
+
+        def compute(x, y):
+            if first:
+                z, c = gen.initial_state(x + y[:, None] * 1j, **self.params)
+                state = EscapeState(z, c, self.formula, workspace=gen.workspace)
+                self.parts.append(state)
+            else:
+                state = next(parts)
+            iterations, z, inside = state.field(max_iter)
+            return smooth_iterations(iterations, z, self.formula.power), inside
+
+        with self.lock:
+            try:
+                return symmetric_field(compute, self.x, self.y, gen.symmetry(**self.params))
+            except BaseException:
+                if first:
+                    self.parts = []
+                raise
+
+
+class FieldStates:
+    def __init__(self, pixels=STATE_PIXELS):
+        self.pixels = pixels
+        self.states = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, generator, x, y, params):
+        # Views larger than the budget (poster bands) are not kept.
+        size = len(x) * len(y)
+        if size > self.pixels:
+            return None
+        with self.lock:
+            for key, state in self.states.items():
+                if state.matches(generator.formula, x, y, params):
+                    self.states.move_to_end(key)
+                    return state
+            state = FieldState(generator, np.array(x), np.array(y), dict(params))
+            self.states[id(state)] = state
+            total = sum(len(s.x) * len(s.y) for s in self.states.values())
+            while total > self.pixels:
+                _, old = self.states.popitem(last=False)
+                total -= len(old.x) * len(old.y)
+            return state
+
+    def clear(self):
+        with self.lock:
+            self.states.clear()
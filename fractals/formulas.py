@@ -0,0 +1,137 @@
+import numpy as np
+
+
+# Steps are written out in real arithmetic, one IEEE operation at a time.
+# numpy's complex multiply and complex abs are SIMD loops whose rounding
+# (fused multiply-adds, scaled hypot) depends on the CPU numpy dispatches to,
+# so the numpy, blocked and jit engines would otherwise disagree on pixels
+# whose orbits pass close to the escape radius.
+TRANSFORMS = {
+    "none": (0, ["tr = z.real", "ti = z.imag"]),
+    "conj": (1, ["tr = z.real", "ti = -z.imag"]),
+    "abs": (2, ["tr = np.abs(z.real)", "ti = np.abs(z.imag)"]),
+}
+
+INPLACE_TRANSFORMS = {
+    "none": [],
+    "conj": ["np.negative(zi, out=zi)"],
+    "abs": ["np.abs(zr, out=zr)", "np.abs(zi, out=zi)"],
+}
+
+_step_cache = {}
+_inplace_cache = {}
+
+
+def power_lines(power):
+    # Square-and-multiply: z^d with O(log d) multiplications instead of np.power.
+    lines = []
+    result = None
+    base = "t"
+    n = 0
+    while power:
+        if power & 1:
+            if result is None:
+                result = base
+            else:
+                lines.append(f"w{n} = {result} * {base}")
+                result = f"w{n}"
+                n += 1
+        power >>= 1
+        if power:
+            lines.append(f"s{n} = {base} * {base}")
+            base = f"s{n}"
+            n += 1
+    return lines, result
+
+
+def escaped(z):
+    # |z| > 2 as x*x + y*y > 4, the test the jit kernel and the original
+    # per-pixel renderer use.
+    return z.real * z.real + z.imag * z.imag > 4.0
+
+
+def compile_step(transform="none", power=2):
+    key = (transform, power)
+    if key not in _step_cache:
+        code, pre = TRANSFORMS[transform]
+        lines, result = power_lines(power)
+        body = list(pre)
+        for line in lines:
+            target, expr = line.split(" = ")
+            a, b = expr.split(" * ")
+            # (ar + ai i)(br + bi i) in the jit kernel's order.
+            body.append(f"{target}r = {a}r * {b}r - {a}i * {b}i")
+            body.append(f"{target}i = {a}r * {b}i + {a}i * {b}r")
+        body += [
+            "out = np.empty(np.shape(z), dtype=np.complex128)",
+            f"out.real = {result}r + np.real(c)",
+            f"out.imag = {result}i + np.imag(c)",
+            "return out",
+        ]
+        source = "\n    ".join(["def step(z, c):"] + body)
+        namespace = {"np": np}
+        exec(compile(source, f"<formula {transform}^{power}>", "exec"), namespace)
+        _step_cache[key] = namespace["step"]
+    return _step_cache[key]
+
+
+def compile_step_inplace(transform="none", power=2):
+    # Same operations in the same order as compile_step, on separate real and
+    # imaginary planes: every temporary is a caller-owned float buffer and the
+    # result overwrites zr and zi. The last buffer is scratch for the second
+    # product of each component.
+    key = (transform, power)
+    if key not in _inplace_cache:
+        lines, result = power_lines(power)
+        body = list(INPLACE_TRANSFORMS[transform])
+        scratch = f"buffers[{2 * len(lines)}]"
+        names = {"t": ("zr", "zi")}
+        for n, line in enumerate(lines):
+            target, expr = line.split(" = ")
+            a, b = expr.split(" * ")
+            names[target] = (f"buffers[{2 * n}]", f"buffers[{2 * n + 1}]")
+            (ar, ai), (br, bi), (tr, ti) = names[a], names[b], names[target]
+            body += [
+                f"np.multiply({ar}, {br}, out={tr})",
+                f"np.multiply({ai}, {bi}, out={scratch})",
+                f"np.subtract({tr}, {scratch}, out={tr})",
+                f"np.multiply({ar}, {bi}, out={ti})",
+                f"np.multiply({ai}, {br}, out={scratch})",
+                f"np.add({ti}, {scratch}, out={ti})",
+            ]
+        rr, ri = names[result]
+        body += [f"np.add({rr}, cr, out=zr)", f"np.add({ri}, ci, out=zi)"]
+        source = "\n    ".join(["def step(zr, zi, cr, ci, buffers):"] + body)
+        namespace = {"np": np}
+        exec(compile(source, f"<formula {transform}^{power} in place>", "exec"), namespace)
+        _inplace_cache[key] = (namespace["step"], 2 * len(lines) + 1)
+    return _inplace_cache[key]
+
+
+class EscapeFormula:
+    def __init__(self, name, power=2, transform="none"):
+        if int(power) != power or power < 2:
+            raise ValueError("Formula power must be an integer >= 2")
+        if transform not in TRANSFORMS:
+            raise ValueError(f"Unknown formula transform: {transform}")
+        self.name = name
+        self.power = int(power)
+        self.transform = transform
+        self.transform_code = TRANSFORMS[transform][0]
+        self.step = compile_step(transform, self.power)
+        self.step_inplace, self.buffer_count = compile_step_inplace(transform, self.power)
+
+    def __repr__(self):
+        return f"EscapeFormula({self.name!r}, power={self.power}, transform={self.transform!r})"
+
+
+FORMULAS = {
+    "z^2 + c": EscapeFormula("z^2 + c"),
+    "z^3 + c": EscapeFormula("z^3 + c", power=3),
+    "z^4 + c": EscapeFormula("z^4 + c", power=4),
+    "z^5 + c": EscapeFormula("z^5 + c", power=5),
+    "Burning Ship": EscapeFormula("Burning Ship", transform="abs"),
+    "Tricorn": EscapeFormula("Tricorn", transform="conj"),
+}
+
+DEFAULT_FORMULA = FORMULAS["z^2 + c"]
@@ -0,0 +1,55 @@
+import numpy as np
+from PyQt5.QtGui import QImage, QPixmap
+from PIL import Image
+
+
+# QImage.Format_RGB32 is stored as 0xffRRGGBB words, i.e. B, G, R, X bytes on
+# little-endian machines; that byte order is what OpenCV calls BGRA.
+BLUE, GREEN, RED, PAD = 0, 1, 2, 3
+
+
+class FrameBuffer:
+    # The frame lives in a Qt-owned RGB32 QImage and `array` is a view of its
+    # memory, so colours are written straight into the image. QPixmap.fromImage
+    # shares that memory on raster platforms and Qt keeps it alive for as long
+    # as a pixmap uses it. Every frame gets its own buffer.
+    def __init__(self, width, height):
+        self.image = QImage(width, height, QImage.Format_RGB32)
+        ptr = self.image.bits()
+        ptr.setsize(self.image.byteCount())
+        self.array = np.frombuffer(ptr, np.uint8).reshape(height, width, 4)
+        self.array[..., PAD] = 255
+
+    @property
+    def width(self):
+        return self.array.shape[1]
+
+    @property
+    def height(self):
+        return self.array.shape[0]
+
+    def qimage(self):
+        return self.image
+
+    def pixmap(self):
+        return QPixmap.fromImage(self.image)
+
+
+def write_rgb(out, rgb):
+    out[..., RED] = rgb[..., 0]
+    out[..., GREEN] = rgb[..., 1]
+    out[..., BLUE] = rgb[..., 2]
+
+
+def qimage_view(image):
+    if image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32):
+        image = image.convertToFormat(QImage.Format_RGB32)
+    ptr = image.constBits()
+    ptr.setsize(image.byteCount())
+    # The view borrows the image's memory; the image is returned to keep it alive.
+    return np.frombuffer(ptr, np.uint8).reshape(image.height(), image.width(), 4), image
+
+
+def bgrx_to_pil(array):
+    height, width = array.shape[:2]
+    return Image.frombuffer("RGB", (width, height), array, "raw", "BGRX", array.strides[0], 1)
@@ -0,0 +1,46 @@
+import numpy as np
+
+from fractals.escape_time import advance
+
+
+AUTO_ITER_LIMIT = 20000
+
+
+def estimate_max_iter(generator, zoom, px, py, limit=AUTO_ITER_LIMIT, probe_width=120, probe_height=80,
+                      floor=50, tolerance=0.005, margin=1.25, **params):
+    x, y = generator.view_axes(zoom, px, py)
+    x = np.linspace(x[0], x[-1], probe_width)
+    y = np.linspace(y[0], y[-1], probe_height)
+
+    z, c = generator.initial_state(x + y[:, None] * 1j, **params)
+    c = np.broadcast_to(c, z.shape).ravel()
+    z = z.ravel()
+    allowed = tolerance * z.size
+    escaped = []
+
+    # Keep doubling the probe budget until a doubling stops flipping pixels
+    # from "inside" to "escaped"; that is where the boundary has converged.
+    # A stage in which nothing has escaped yet says nothing: at a deep zoom
+    # every pixel outlives the first budgets. Only the still-live pixels are
+    # carried from one stage to the next.
+    done = 0
+    seen = 0
+    budget = min(floor, limit)
+    while True:
+        iterations = np.zeros(z.shape, dtype=np.int32)
+        mask = advance(z, c, np.ones(z.shape, dtype=bool), iterations, done, budget, formula=generator.formula)
+        escaped.append(iterations[~mask])
+        z = z[mask]
+        c = c[mask]
+        done = budget
+        if budget >= limit or (budget > floor and seen and escaped[-1].size <= allowed):
+            break
+        seen += escaped[-1].size
+        budget = min(budget * 2, limit)
+
+    counts = np.sort(np.concatenate(escaped))
+    if counts.size <= allowed:
+        return min(floor, limit)
+
+    stable = int(counts[counts.size - 1 - int(allowed)]) + 1
+    return int(min(limit, max(floor, stable * margin)))
@@ -0,0 +1,171 @@
+import os
+import threading
+
+import numpy as np
+
+from fractals.formulas import FORMULAS, escaped
+from fractals.tuning import SETTINGS
+
+
+CHECK_ITER = 200
+
+_kernels = None
+_lock = threading.Lock()
+
+
+def build_kernels(numba):
+    @numba.njit(cache=True)
+    def step(zr, zi, cr, ci, transform, power):
+        if transform == 1:
+            zi = -zi
+        elif transform == 2:
+            zr = abs(zr)
+            zi = abs(zi)
+
+        if power == 2:
+            return zr * zr - zi * zi + cr, zr * zi + zi * zr + ci
+
+        # Same square-and-multiply order as the generated numpy step.
+        rr = 0.0
+        ri = 0.0
+        have = False
+        br = zr
+        bi = zi
+        while power:
+            if power & 1:
+                if have:
+                    rr, ri = rr * br - ri * bi, rr * bi + ri * br
+                else:
+                    rr, ri = br, bi
+                    have = True
+            power >>= 1
+            if power:
+                br, bi = br * br - bi * bi, br * bi + bi * br
+        return rr + cr, ri + ci
+
+    @numba.njit(parallel=True, cache=True)
+    def advance_array(z, c, mask, iterations, start, stop, transform, power):
+        for k in numba.prange(z.size):
+            if not mask[k]:
+                continue
+            zr = z[k].real
+            zi = z[k].imag
+            cr = c[k].real
+            ci = c[k].imag
+            for i in range(start, stop):
+                zr, zi = step(zr, zi, cr, ci, transform, power)
+                if zr * zr + zi * zi > 4.0:
+                    iterations[k] = i
+                    mask[k] = False
+                    break
+            z[k] = complex(zr, zi)
+
+    @numba.njit(parallel=True, cache=True)
+    def advance_scalar(z, c, mask, iterations, start, stop, transform, power):
+        for k in numba.prange(z.size):
+            if not mask[k]:
+                continue
+            zr = z[k].real
+            zi = z[k].imag
+            for i in range(start, stop):
+                zr, zi = step(zr, zi, c.real, c.imag, transform, power)
+                if zr * zr + zi * zi > 4.0:
+                    iterations[k] = i
+                    mask[k] = False
+                    break
+            z[k] = complex(zr, zi)
+
+    return advance_array, advance_scalar
+
+
+def numpy_reference(z, c, max_iter, formula):
+    # The numpy engine's loop; escape_time imports this module, so it is
+    # spelled out here.
+    iterations = np.zeros(z.shape, dtype=np.int32)
+    mask = np.ones(z.shape, dtype=bool)
+    for i in range(max_iter):
+        z[mask] = formula.step(z[mask], c[mask] if np.ndim(c) > 0 else c)
+        diverged = escaped(z) & mask
+        iterations[diverged] = i
+        mask &= ~diverged
+    return iterations, z, mask
+
+
+def matches_numpy(kernels):
+    # The kernels are only used if they reproduce the numpy engine bit for
+    # bit on every formula, Mandelbrot- and Julia-style; a compiler that
+    # contracts a * b + c into a fused multiply-add would not.
+    advance_array, advance_scalar = kernels
+    x = np.linspace(-2.0, 1.0, 48)
+    y = np.linspace(-1.2, 1.2, 32)
+    points = x + y[:, None] * 1j
+    for formula in FORMULAS.values():
+        for z0, c in ((np.zeros_like(points), points), (points, -0.8 + 0.156j)):
+            expected = numpy_reference(z0.copy(), c, CHECK_ITER, formula)
+            z = z0.reshape(-1).copy()
+            mask = np.ones(z.size, dtype=bool)
+            iterations = np.zeros(z.size, dtype=np.int32)
+            if np.ndim(c) > 0:
+                advance_array(z, c.reshape(-1).copy(), mask, iterations, 0, CHECK_ITER,
+                              formula.transform_code, formula.power)
+            else:
+                advance_scalar(z, c, mask, iterations, 0, CHECK_ITER, formula.transform_code, formula.power)
+            result = (iterations, z, mask)
+            if not all(np.array_equal(a.reshape(-1), b.reshape(-1)) for a, b in zip(result, expected)):
+                return False
+    return True
+
+
+def load_kernels():
+    global _kernels
+    with _lock:
+        if _kernels is None:
+            try:
+                # The calibrated thread count sizes numba's pool, unless the
+                # environment (a tile server worker, say) already set it.
+                if SETTINGS["jit_threads"]:
+                    os.environ.setdefault("NUMBA_NUM_THREADS", str(SETTINGS["jit_threads"]))
+                import numba
+                # TBB hangs the interpreter at exit once a parallel kernel has
+                # run on a non-main thread (QThread renders, the warm-up thread).
+                numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+                kernels = build_kernels(numba)
+                _kernels = kernels if matches_numpy(kernels) else False
+            except Exception:
+                _kernels = False
+    return _kernels or None
+
+
+def available():
+    return load_kernels() is not None
+
+
+def advance(z, c, mask, iterations, start, stop, transform=0, power=2):
+    advance_array, advance_scalar = load_kernels()
+    mask = np.array(mask, dtype=bool)
+    flat_z = z.reshape(-1)
+    flat_mask = mask.reshape(-1)
+    flat_iterations = iterations.reshape(-1)
+
+    if np.ndim(c) > 0:
+        flat_c = np.ascontiguousarray(np.broadcast_to(c, z.shape), dtype=np.complex128).reshape(-1)
+        advance_array(flat_z, flat_c, flat_mask, flat_iterations, start, stop, transform, power)
+    else:
+        advance_scalar(flat_z, complex(c), flat_mask, flat_iterations, start, stop, transform, power)
+
+    return mask
+
+
+def warm_up():
+    global _kernels
+    if not available():
+        return
+    # Compiling (or loading from numba's on-disk cache) happens on the first
+    # call; doing it here keeps that cost off the first real render.
+    z = np.zeros(4, dtype=np.complex128)
+    iterations = np.zeros(4, dtype=np.int32)
+    try:
+        advance(z, np.full(4, 0.5 + 0.5j), np.ones(4, dtype=bool), iterations, 0, 2)
+        advance(z, 0.5 + 0.5j, np.ones(4, dtype=bool), iterations, 0, 2)
+    except Exception:
+        _kernels = False
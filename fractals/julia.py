@@ -2,111 +2,18 @@ from PyQt5.QtGui import QImage, QPixmap, QColor
 import numpy as np
 import math
 
+from fractals.escape_generator import EscapeTimeGenerator
+from fractals.supersample import supersample
+from fractals.field_file import write_field
+from fractals.distance import inverse_iteration_points
+from fractals.julia_sweep import sweep_fields
 
-def clamp_int(v, lo=0, hi=255):
-    iv = int(round(v))
-    if iv < lo:
-        return lo
-    if iv > hi:
-        return hi
-    return iv
-
-
-class JuliaGenerator:
-    def __init__(self, width=900, height=600):
-        self.width = int(width)
-        self.height = int(height)
-        self.theme = "Ocean"
-        self.user_color = QColor(130, 30, 255)
-
-    def get_theme_color(self, t):
-        if self.theme == "Ocean":
-            r = 20 + 60 * math.sin(t + 0.0)
-            g = 80 + 100 * math.sin(t + 1.0)
-            b = 150 + 100 * math.sin(t + 2.0)
-        elif self.theme == "Fire":
-            r = 150 + 100 * math.sin(t + 0.0)
-            g = 40 + 120 * math.sin(t + 1.5)
-            b = 10 + 40 * math.sin(t + 3.0)
-        elif self.theme == "Ice":
-            r = 180 + 40 * math.sin(t + 0.0)
-            g = 220 + 30 * math.sin(t + 1.0)
-            b = 255 + 0 * math.sin(t + 0.0)
-        elif self.theme == "Neon":
-            r = 180 + 70 * math.sin(t + 0.0)
-            g = 20 + 200 * math.sin(t + 1.0)
-            b = 200 + 50 * math.sin(t + 2.0)
-        elif self.theme == "Pastel":
-            r = 200 + 30 * math.sin(t + 0.0)
-            g = 180 + 40 * math.sin(t + 1.0)
-            b = 200 + 50 * math.sin(t + 2.0)
-        elif self.theme == "Custom":
-            ur = self.user_color.red()
-            ug = self.user_color.green()
-            ub = self.user_color.blue()
-            r = ur * (0.4 + 0.6 * (0.5 + 0.5 * math.sin(t + 0.0)))
-            g = ug * (0.4 + 0.6 * (0.5 + 0.5 * math.sin(t + 1.0)))
-            b = ub * (0.4 + 0.6 * (0.5 + 0.5 * math.sin(t + 2.0)))
-        else:
-            v = 127.5 * (1 + math.sin(t))
-            r = g = b = v
-
-        return QColor(clamp_int(r), clamp_int(g), clamp_int(b))
-
-    def get_theme_color_numpy(self, t_array):
-        r = np.zeros_like(t_array)
-        g = np.zeros_like(t_array)
-        b = np.zeros_like(t_array)
-        
-        if self.theme == "Ocean":
-            r = 150 + 100 * np.sin(t_array + 0.0)
-            g = 40 + 120 * np.sin(t_array + 1.5)
-            b = 10 + 40 * np.sin(t_array + 3.0)
-        elif self.theme == "Fire":
-            r = 20 + 60 * np.sin(t_array + 0.0)
-            g = 80 + 100 * np.sin(t_array + 1.0)
-            b = 150 + 100 * np.sin(t_array + 2.0)
-        elif self.theme == "Ice":
-            r = 200 + 30 * np.sin(t_array + 0.0)
-            g = 180 + 40 * np.sin(t_array + 1.0)
-            b = 200 + 50 * np.sin(t_array + 2.0)
-        elif self.theme == "Neon":
-            r = 180 + 70 * np.sin(t_array + 0.0)
-            g = 20 + 200 * np.sin(t_array + 1.0)
-            b = 200 + 50 * np.sin(t_array + 2.0)
-        elif self.theme == "Pastel":
-            r = 180 + 40 * np.sin(t_array + 0.0)
-            g = 220 + 30 * np.sin(t_array + 1.0)
-            b = 255 + 0 * np.sin(t_array + 0.0)
-        elif self.theme == "Custom":
-            ub = self.user_color.red()
-            ug = self.user_color.green()
-            ur = self.user_color.blue()
-            r = ur * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 0.0)))
-            g = ug * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 1.0)))
-            b = ub * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 2.0)))
-        else:
-            v = 127.5 * (1 + np.sin(t_array))
-            r = g = b = v
-        
-        r = np.clip(np.round(r), 0, 255).astype(np.uint8)
-        g = np.clip(np.round(g), 0, 255).astype(np.uint8)
-        b = np.clip(np.round(b), 0, 255).astype(np.uint8)
-        
-        return r, g, b
 
-    def generate_numpy(self, center_x=0.0, center_y=0.0, zoom=1.0, max_iter=200, 
-                    cx_param=0.0, cy_param=0.0, base_color=None, width=900, height=600):
-        
-        original_theme = self.theme
-        
-        if base_color is not None and isinstance(base_color, QColor):
-            self.user_color = base_color
-            self.theme = "Custom"
-        
-        self.width = int(width)
-        self.height = int(height)
-        
+class JuliaGenerator(EscapeTimeGenerator):
+    derivative_seed = 1.0
+    derivative_offset = 0.0
+
+    def view_axes(self, zoom=1.0, center_x=0.0, center_y=0.0):
         x_range = 4.0 / zoom
         y_range = 3.0 / zoom
         
@@ -117,44 +24,103 @@ class JuliaGenerator:
         
         x = np.linspace(x_min, x_max, self.width)
         y = np.linspace(y_min, y_max, self.height)
-        
+        return x, y
+
+    def initial_state(self, points, cx_param=0.0, cy_param=0.0):
         c = cx_param + cy_param * 1j
-        z = x + y[:, None] * 1j
-        
-        iterations = np.zeros(z.shape, dtype=np.int32)
-        mask = np.ones(z.shape, dtype=bool)
-        
-        for i in range(max_iter):
-            z[mask] = z[mask] * z[mask] + c
-            diverged = np.abs(z) > 2.0
-            iterations[diverged & mask] = i
-            mask = mask & (~diverged)
-        
-        z_abs = np.abs(z)
-        log_z = np.log(np.where(z_abs > 1e-10, z_abs, 1e-10))
-        mu = iterations - np.log2(np.where(log_z > 1e-10, log_z, 1e-10))
-        mu = np.where(np.isfinite(mu), mu, iterations)
-        
-        t_array = mu * 0.12
-        
-        r, g, b = self.get_theme_color_numpy(t_array)
+        z = np.array(points, dtype=np.complex128)
+        return z, c
+
+    def symmetry(self, cx_param=0.0, cy_param=0.0):
+        # (-z)^d == z^d for even d, and abs() discards the sign for any d.
+        if self.formula.power % 2 == 0 or self.formula.transform == "abs":
+            return "point"
+        return None
+
+    def field_to_rgb(self, mu, inside, base_color=None, colorize=None, out=None):
+        original_theme = self.theme
         
-        inside_mask = mask
-        r[inside_mask] = 0
-        g[inside_mask] = 0
-        b[inside_mask] = 0
+        if base_color is not None and isinstance(base_color, QColor):
+            self.user_color = base_color
+            self.theme = "Custom"
         
-        img_array = np.stack([r, g, b], axis=2)
+        img_array = super().field_to_rgb(mu, inside, None, colorize, out)
         
-        height, width, channels = img_array.shape
-        bytes_per_line = 3 * width
-        q_image = QImage(img_array.data, width, height, bytes_per_line, QImage.Format_RGB888)
+        self.theme = original_theme
         
-        q_image = q_image.convertToFormat(QImage.Format_RGB32)
+        return img_array
+
+    def inverse_iteration_preview(self, center_x=0.0, center_y=0.0, zoom=1.0, cx_param=0.0, cy_param=0.0,
+                                  base_color=None, walkers=4096, steps=48):
+        x, y = self.view_axes(zoom, center_x, center_y)
+        points = inverse_iteration_points(cx_param + cy_param * 1j, self.formula.power, walkers, steps)
         
-        self.theme = original_theme
+        col = np.rint((points.real - x[0]) / (x[1] - x[0])).astype(np.intp)
+        row = np.rint((points.imag - y[0]) / (y[1] - y[0])).astype(np.intp)
+        visible = (col >= 0) & (col < self.width) & (row >= 0) & (row < self.height)
+        hits = np.bincount(row[visible] * self.width + col[visible], minlength=self.width * self.height)
+        hits = hits.reshape(self.height, self.width)
         
-        yield QPixmap.fromImage(q_image)
+        mu = np.log1p(hits.astype(np.float64)) * 8.0
+        return self.render_field(mu, hits == 0, base_color)
+
+    def save_field(self, path, center_x=0.0, center_y=0.0, zoom=1.0, max_iter=200, cx_param=0.0, cy_param=0.0,
+                   width=None, height=None, progress=None, should_stop=None):
+        x, y = self.view_axes(zoom, center_x, center_y)
+        x = np.linspace(x[0], x[-1], int(width or self.width))
+        y = np.linspace(y[0], y[-1], int(height or self.height))
+        params = {"cx_param": cx_param, "cy_param": cy_param}
+        return write_field(path, self, x, y, max_iter, params, view=(zoom, center_x, center_y),
+                           progress=progress, should_stop=should_stop)
+
+    def render_anytime(self, budget, center_x=0.0, center_y=0.0, zoom=1.0, max_iter=200, cx_param=0.0, cy_param=0.0,
+                       base_color=None, state=None):
+        return self.render_anytime_view(budget, (zoom, center_x, center_y), max_iter, base_color, state,
+                                        cx_param=cx_param, cy_param=cy_param)
+
+    def generate_numpy(self, center_x=0.0, center_y=0.0, zoom=1.0, max_iter=200, 
+                    cx_param=0.0, cy_param=0.0, base_color=None, width=None, height=None, antialias=False,
+                    mode="escape", as_frames=False):
+        # Renders at the generator's current size unless another is given;
+        # as_frames yields FrameBuffers (BGRX arrays for encoders) instead of
+        # pixmaps, and only the finished frame.
+        self.width = int(width or self.width)
+        self.height = int(height or self.height)
+        render = self.render_frame if as_frames else self.render_field
+        
+        x, y = self.view_axes(zoom, center_x, center_y)
+        
+        if mode == "distance":
+            if self.formula.transform == "none" and not as_frames:
+                yield self.inverse_iteration_preview(center_x, center_y, zoom, cx_param, cy_param, base_color)
+            mu, inside, distance = self.compute_distance_field(x, y, max_iter, cx_param=cx_param, cy_param=cy_param)
+            yield render(mu, inside, base_color, self.distance_colorize(distance, abs(x[1] - x[0])))
+            return
+        
+        mu, inside = self.compute_field(x, y, max_iter, cx_param=cx_param, cy_param=cy_param)
+        
+        colorize = None
+        if antialias:
+            def colorize(mu, inside):
+                return supersample(self, x, y, mu, inside, max_iter, cx_param=cx_param, cy_param=cy_param)
+        
+        yield render(mu, inside, base_color, colorize)
+        
+    def generate_sweep(self, c_values, center_x=0.0, center_y=0.0, zoom=1.0, max_iter=200, base_color=None,
+                       width=None, height=None, antialias=False, should_stop=None, as_frames=False):
+        self.width = int(width or self.width)
+        self.height = int(height or self.height)
+        render = self.render_frame if as_frames else self.render_field
+        
+        x, y = self.view_axes(zoom, center_x, center_y)
+        
+        for c, mu, inside in sweep_fields(self, x, y, c_values, max_iter, should_stop=should_stop):
+            colorize = None
+            if antialias:
+                def colorize(mu, inside, c=c):
+                    return supersample(self, x, y, mu, inside, max_iter, cx_param=c.real, cy_param=c.imag)
+            
+            yield render(mu, inside, base_color, colorize)
         
     def generate(self, max_iter=200, zoom=1.0, cx_param=0.0, cy_param=0.0, base_color=None, center_x=0.0, center_y=0.0):
         if base_color is not None and isinstance(base_color, QColor):
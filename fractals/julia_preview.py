@@ -0,0 +1,68 @@
+import time
+from collections import OrderedDict
+
+from fractals.escape_time import escape_compact, smooth_iterations
+from fractals.julia import JuliaGenerator
+from fractals.symmetry import symmetric_field
+
+
+class JuliaPreview:
+    def __init__(self, width=180, height=120, max_iter=150, deadline=0.012, quantum=1.0 / 512, capacity=128):
+        self.generator = JuliaGenerator(width, height)
+        self.max_iter = max_iter
+        self.deadline = deadline
+        self.quantum = quantum
+        self.capacity = capacity
+        self.fields = OrderedDict()
+        self.axes = None
+
+    def key(self, c):
+        return (
+            self.generator.formula.name,
+            int(round(c.real / self.quantum)),
+            int(round(c.imag / self.quantum)),
+        )
+
+    def view(self):
+        if self.axes is None or (len(self.axes[1]), len(self.axes[0])) != (self.generator.height, self.generator.width):
+            self.axes = self.generator.view_axes(1.0, 0.0, 0.0)
+        return self.axes
+
+    def compute(self, c, deadline):
+        formula = self.generator.formula
+        x, y = self.view()
+        reached = []
+
+        # The numpy loop rather than the JIT kernels: it can stop at the
+        # deadline between iterations and never pays a compile on first hover.
+        # The view is centred on the origin, so symmetric Julia sets only
+        # iterate one half.
+        def compute(x, y):
+            iterations, z, inside, done = escape_compact(x + y[:, None] * 1j, c, self.max_iter, formula, deadline)
+            reached.append(done)
+            return smooth_iterations(iterations, z, formula.power), inside
+
+        mu, inside = symmetric_field(compute, x, y, self.generator.symmetry())
+        return mu, inside, min(reached) >= self.max_iter
+
+    def field(self, c):
+        c = complex(c)
+        key = self.key(c)
+        if key in self.fields:
+            self.fields.move_to_end(key)
+            return self.fields[key]
+
+        # Whatever is still bounded when the deadline hits is drawn as inside;
+        # such a partial preview is shown but not cached.
+        q = complex(key[1] * self.quantum, key[2] * self.quantum)
+        mu, inside, complete = self.compute(q, time.perf_counter() + self.deadline)
+        if complete:
+            self.fields[key] = (mu, inside)
+            if len(self.fields) > self.capacity:
+                self.fields.popitem(last=False)
+        return mu, inside
+
+    def render(self, c, theme="Ocean", base_color=None):
+        self.generator.theme = theme
+        mu, inside = self.field(c)
+        return self.generator.render_field(mu, inside, base_color)
@@ -0,0 +1,50 @@
+import numpy as np
+
+from fractals.escape_time import escape_compact, escape_time, select_backend, smooth_iterations
+from fractals.symmetry import symmetric_field
+
+
+SWEEP_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# z, c, their compacted copies, smooth counts with temporaries, counts, mask.
+SWEEP_BYTES_PER_PIXEL = 16 * 4 + 8 * 3 + 4 + 1
+
+
+def frames_per_chunk(width, height, budget=SWEEP_MEMORY_BUDGET):
+    return max(1, int(budget // (width * height * SWEEP_BYTES_PER_PIXEL)))
+
+
+def c_path(start, end, n_frames):
+    t = np.linspace(0.0, 1.0, n_frames) if n_frames > 1 else np.zeros(1)
+    t = t * t * (3 - 2 * t)
+    return complex(start) + (complex(end) - complex(start)) * t
+
+
+def sweep_fields(generator, x, y, c_values, max_iter=200, budget=SWEEP_MEMORY_BUDGET, should_stop=None):
+    c_values = np.asarray(c_values, dtype=np.complex128).ravel()
+    formula = generator.formula
+    backend = select_backend()
+
+    chunk = frames_per_chunk(len(x), len(y), budget)
+    for first in range(0, c_values.size, chunk):
+        if should_stop is not None and should_stop():
+            return
+        block_c = c_values[first:first + chunk]
+
+        # One block holds every frame of the chunk, with the frame axis last so
+        # the symmetry stage can mirror rows and columns of all frames at once;
+        # each frame starts from the same grid and only its constant differs.
+        def compute(x, y):
+            z = np.repeat((x + y[:, None] * 1j)[..., None], block_c.size, axis=2)
+            c = np.ascontiguousarray(np.broadcast_to(block_c, z.shape))
+            if backend == "numpy":
+                iterations, z, inside, _ = escape_compact(z, c, max_iter, formula)
+            else:
+                # The jit kernels and the blocked workspace both take the
+                # per-pixel c of the whole chunk in one pass.
+                iterations, z, inside = escape_time(z, c, max_iter, backend, formula, generator.workspace)
+            return smooth_iterations(iterations, z, formula.power), inside
+
+        mu, inside = symmetric_field(compute, x, y, generator.symmetry())
+        for k in range(block_c.size):
+            yield block_c[k], mu[..., k], inside[..., k]
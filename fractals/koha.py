@@ -1,61 +1,108 @@
 from PyQt5.QtGui import QImage, QPainter, QPen, QColor, QPixmap
 import math
 
+import numpy as np
+
+from fractals.raster import coverage_pixmap, rasterize_canvas
+from fractals.simplify import simplify_collinear, simplify_pixels
+from fractals.anytime import LineAnytime
+
+
+atan2 = np.frompyfunc(math.atan2, 2, 1)
+
+
 class KochGenerator:
     def __init__(self, width=900, height=600):
         self.width = width
         self.height = height
 
-    def koch_curve(self, x1, y1, x2, y2, level, painter):
-        if level == 0:
-            painter.drawLine(int(x1), int(y1), int(x2), int(y2))
-            return
-
-        dx = (x2 - x1) / 3
-        dy = (y2 - y1) / 3
+    def koch_points(self, x1, y1, x2, y2, level):
+        # Points of the curve, subdivided one level at a time for every
+        # segment at once, in drawing order.
+        xs = np.array([x1, x2], dtype=np.float64)
+        ys = np.array([y1, y2], dtype=np.float64)
+        for _ in range(level):
+            dx = (xs[1:] - xs[:-1]) / 3
+            dy = (ys[1:] - ys[:-1]) / 3
 
-        xA = x1 + dx
-        yA = y1 + dy
+            xA = xs[:-1] + dx
+            yA = ys[:-1] + dy
 
-        xB = x1 + 2 * dx
-        yB = y1 + 2 * dy
+            xB = xs[:-1] + 2 * dx
+            yB = ys[:-1] + 2 * dy
 
-        angle = math.atan2(yB - yA, xB - xA) - math.pi / 3
-        dist = math.sqrt(dx**2 + dy**2)
-        xC = xA + math.cos(angle) * dist
-        yC = yA + math.sin(angle) * dist
+            # math.atan2 rather than np.arctan2, whose last bit can differ:
+            # both backends draw these points and must truncate them alike.
+            angle = atan2(yB - yA, xB - xA).astype(np.float64) - math.pi / 3
+            dist = np.sqrt(dx**2 + dy**2)
+            xC = xA + np.cos(angle) * dist
+            yC = yA + np.sin(angle) * dist
 
-        self.koch_curve(x1, y1, xA, yA, level - 1, painter)
-        self.koch_curve(xA, yA, xC, yC, level - 1, painter)
-        self.koch_curve(xC, yC, xB, yB, level - 1, painter)
-        self.koch_curve(xB, yB, x2, y2, level - 1, painter)
-
-    def generate(self, level=4, thickness=1, type="snowflake"):
-        img = QImage(self.width, self.height, QImage.Format_RGB32)
-        img.fill(QColor(255, 255, 255))
-
-        painter = QPainter(img)
-        pen = QPen(QColor(0, 0, 0), thickness)
-        painter.setPen(pen)
+            xs = np.append(np.column_stack((xs[:-1], xA, xC, xB)).ravel(), xs[-1])
+            ys = np.append(np.column_stack((ys[:-1], yA, yC, yB)).ravel(), ys[-1])
+        return xs, ys
 
+    def sides(self, type="snowflake"):
         margin = 50
 
         if type == "line":
             x1, y1 = margin, self.height // 2
             x2, y2 = self.width - margin, self.height // 2
-            self.koch_curve(x1, y1, x2, y2, level, painter)
-            yield QPixmap.fromImage(img)
+            return [(x1, y1, x2, y2)]
 
         elif type == "snowflake":
             x1, y1 = margin, self.height - margin
             x2, y2 = self.width - margin, self.height - margin
             x3 = (x1 + x2) / 2
             y3 = self.height - margin - math.sqrt(3)/2 * (x2 - x1)
+            return [(x1, y1, x2, y2), (x2, y2, x3, y3), (x3, y3, x1, y1)]
+
+        return []
+
+    def segments(self, level=4, type="snowflake"):
+        curves = [self.koch_points(*side, level) for side in self.sides(type)]
+        if not curves:
+            empty = np.empty(0)
+            return empty, empty, empty, empty
+        x0 = np.concatenate([xs[:-1] for xs, ys in curves])
+        y0 = np.concatenate([ys[:-1] for xs, ys in curves])
+        x1 = np.concatenate([xs[1:] for xs, ys in curves])
+        y1 = np.concatenate([ys[1:] for xs, ys in curves])
+        return x0, y0, x1, y1
+
+    def render_anytime(self, budget, level=4, thickness=1, type="snowflake", state=None):
+        key = (level, thickness, type, self.width, self.height)
+        if state is None or state.key != key:
+            def render_level(depth):
+                x0, y0, x1, y1 = self.segments(depth, type)
+                coverage = rasterize_canvas(x0, y0, x1, y1, self.width, self.height, thickness)
+                return coverage_pixmap(coverage), len(x0)
+            state = LineAnytime(key, render_level, level)
+        return state.refine(budget)
+
+    def generate(self, level=4, thickness=1, type="snowflake", backend="qpainter", antialias=True, simplify=True):
+        if backend == "numpy":
+            x0, y0, x1, y1 = self.segments(level, type)
+            if simplify:
+                x0, y0, x1, y1 = simplify_collinear(x0, y0, x1, y1)
+            yield coverage_pixmap(rasterize_canvas(x0, y0, x1, y1, self.width, self.height, thickness, antialias))
+            return
+
+        img = QImage(self.width, self.height, QImage.Format_RGB32)
+        img.fill(QColor(255, 255, 255))
 
-            sides = [(x1, y1, x2, y2), (x2, y2, x3, y3), (x3, y3, x1, y1)]
-            for x_start, y_start, x_end, y_end in sides:
-                self.koch_curve(x_start, y_start, x_end, y_end, level, painter)
-                yield QPixmap.fromImage(img)
+        painter = QPainter(img)
+        pen = QPen(QColor(0, 0, 0), thickness)
+        painter.setPen(pen)
+
+        for x_start, y_start, x_end, y_end in self.sides(type):
+            xs, ys = self.koch_points(x_start, y_start, x_end, y_end, level)
+            x0, y0, x1, y1 = xs[:-1], ys[:-1], xs[1:], ys[1:]
+            if simplify:
+                x0, y0, x1, y1 = simplify_pixels(x0, y0, x1, y1, thickness=thickness)
+            for i in range(len(x0)):
+                painter.drawLine(int(x0[i]), int(y0[i]), int(x1[i]), int(y1[i]))
+            yield QPixmap.fromImage(img)
 
         painter.end()
-        yield QPixmap.fromImage(img)
\ No newline at end of file
+        yield QPixmap.fromImage(img)
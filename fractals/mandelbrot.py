@@ -2,138 +2,57 @@ from PyQt5.QtGui import QImage, QPixmap, QColor
 import numpy as np
 import math
 
+from fractals.escape_generator import EscapeTimeGenerator
+from fractals.supersample import supersample
+from fractals.field_file import write_field
 
-def clamp_int(v, lo=0, hi=255):
-    iv = int(round(v))
-    if iv < lo:
-        return lo
-    if iv > hi:
-        return hi
-    return iv
-
-
-class MandelbrotGenerator:
-    def __init__(self, width=900, height=600):
-        self.width = int(width)
-        self.height = int(height)
-        self.theme = "Ocean"
-        self.user_color = QColor(130, 30, 255)
-
-    def get_theme_color(self, t):
-        if self.theme == "Ocean":
-            r = 20 + 60 * math.sin(t + 0.0)
-            g = 80 + 100 * math.sin(t + 1.0)
-            b = 150 + 100 * math.sin(t + 2.0)
-        elif self.theme == "Fire":
-            r = 150 + 100 * math.sin(t + 0.0)
-            g = 40 + 120 * math.sin(t + 1.5)
-            b = 10 + 40 * math.sin(t + 3.0)
-        elif self.theme == "Ice":
-            r = 180 + 40 * math.sin(t + 0.0)
-            g = 220 + 30 * math.sin(t + 1.0)
-            b = 255 + 0 * math.sin(t + 0.0)
-        elif self.theme == "Neon":
-            r = 180 + 70 * math.sin(t + 0.0)
-            g = 20 + 200 * math.sin(t + 1.0)
-            b = 200 + 50 * math.sin(t + 2.0)
-        elif self.theme == "Pastel":
-            r = 200 + 30 * math.sin(t + 0.0)
-            g = 180 + 40 * math.sin(t + 1.0)
-            b = 200 + 50 * math.sin(t + 2.0)
-        elif self.theme == "Custom":
-            ur = self.user_color.red()
-            ug = self.user_color.green()
-            ub = self.user_color.blue()
-            r = ur * (0.4 + 0.6 * (0.5 + 0.5 * math.sin(t + 0.0)))
-            g = ug * (0.4 + 0.6 * (0.5 + 0.5 * math.sin(t + 1.0)))
-            b = ub * (0.4 + 0.6 * (0.5 + 0.5 * math.sin(t + 2.0)))
-        else:
-            v = 127.5 * (1 + math.sin(t))
-            r = g = b = v
-
-        return QColor(clamp_int(r), clamp_int(g), clamp_int(b))
-
-    def get_theme_color_numpy(self, t_array):
-        r = np.zeros_like(t_array)
-        g = np.zeros_like(t_array)
-        b = np.zeros_like(t_array)
-        
-        if self.theme == "Ocean":
-            r = 150 + 100 * np.sin(t_array + 0.0)
-            g = 40 + 120 * np.sin(t_array + 1.5)
-            b = 10 + 40 * np.sin(t_array + 3.0)
-        elif self.theme == "Fire":
-            r = 20 + 60 * np.sin(t_array + 0.0)
-            g = 80 + 100 * np.sin(t_array + 1.0)
-            b = 150 + 100 * np.sin(t_array + 2.0)
-        elif self.theme == "Ice":
-            r = 200 + 30 * np.sin(t_array + 0.0)
-            g = 180 + 40 * np.sin(t_array + 1.0)
-            b = 200 + 50 * np.sin(t_array + 2.0)
-        elif self.theme == "Neon":
-            r = 180 + 70 * np.sin(t_array + 0.0)
-            g = 20 + 200 * np.sin(t_array + 1.0)
-            b = 200 + 50 * np.sin(t_array + 2.0)
-        elif self.theme == "Pastel":
-            r = 180 + 40 * np.sin(t_array + 0.0)
-            g = 220 + 30 * np.sin(t_array + 1.0)
-            b = 255 + 0 * np.sin(t_array + 0.0)
-        elif self.theme == "Custom":
-            ub = self.user_color.red()
-            ug = self.user_color.green()
-            ur = self.user_color.blue()
-            r = ur * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 0.0)))
-            g = ug * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 1.0)))
-            b = ub * (0.4 + 0.6 * (0.5 + 0.5 * np.sin(t_array + 2.0)))
-        else:
-            v = 127.5 * (1 + np.sin(t_array))
-            r = g = b = v
-        
-        r = np.clip(np.round(r), 0, 255).astype(np.uint8)
-        g = np.clip(np.round(g), 0, 255).astype(np.uint8)
-        b = np.clip(np.round(b), 0, 255).astype(np.uint8)
-        
-        return r, g, b
-
-    def generate_numpy(self, max_iter=200, zoom=1.0, offset_x=0.0, offset_y=0.0, base_color=None):
-        if base_color is not None and isinstance(base_color, QColor):
-            self.user_color = base_color
 
+class MandelbrotGenerator(EscapeTimeGenerator):
+    def view_axes(self, zoom=1.0, offset_x=0.0, offset_y=0.0):
         x = np.linspace(-2.5 / zoom + offset_x, 1.0 / zoom + offset_x, self.width)
         y = np.linspace(-1.2 / zoom + offset_y, 1.2 / zoom + offset_y, self.height)
-        
-        c = x + y[:, None] * 1j
-        
-        z = np.zeros_like(c, dtype=np.complex128)
-        iterations = np.zeros(c.shape, dtype=np.int32)
-        mask = np.ones(c.shape, dtype=bool)
-        
-        for i in range(max_iter):
-            z[mask] = z[mask] * z[mask] + c[mask]
-            diverged = np.abs(z) > 2.0
-            iterations[diverged & mask] = i
-            mask = mask & (~diverged)
-        
-        z_abs = np.abs(z)
-        log_z = np.log(np.where(z_abs > 1e-10, z_abs, 1e-10))
-        mu = iterations - np.log2(np.where(log_z > 1e-10, log_z, 1e-10))
-        mu = np.where(np.isfinite(mu), mu, iterations)
-        
-        t_array = mu * 0.12
-        r, g, b = self.get_theme_color_numpy(t_array)
-        
-        img_array = np.stack([r, g, b], axis=2)
-        
-        inside_mask = mask
-        img_array[inside_mask] = [0, 0, 0]
-        
-        height, width, channels = img_array.shape
-        bytes_per_line = 3 * width
-        q_image = QImage(img_array.data, width, height, bytes_per_line, QImage.Format_RGB888)
-        
-        q_image = q_image.convertToFormat(QImage.Format_RGB32)
-        
-        yield QPixmap.fromImage(q_image)
+        return x, y
+
+    def initial_state(self, points):
+        z = np.zeros_like(points, dtype=np.complex128)
+        return z, points
+
+    def symmetry(self):
+        # conj commutes with z^d and with the Tricorn step, but not with the
+        # Burning Ship's abs().
+        return None if self.formula.transform == "abs" else "mirror"
+
+    def save_field(self, path, max_iter=200, zoom=1.0, offset_x=0.0, offset_y=0.0, width=None, height=None,
+                   progress=None, should_stop=None):
+        x, y = self.view_axes(zoom, offset_x, offset_y)
+        x = np.linspace(x[0], x[-1], int(width or self.width))
+        y = np.linspace(y[0], y[-1], int(height or self.height))
+        return write_field(path, self, x, y, max_iter, view=(zoom, offset_x, offset_y),
+                           progress=progress, should_stop=should_stop)
+
+    def render_anytime(self, budget, max_iter=200, zoom=1.0, offset_x=0.0, offset_y=0.0, base_color=None,
+                       state=None):
+        return self.render_anytime_view(budget, (zoom, offset_x, offset_y), max_iter, base_color, state)
+
+    def generate_numpy(self, max_iter=200, zoom=1.0, offset_x=0.0, offset_y=0.0, base_color=None,
+                       antialias=False, mode="escape", as_frames=False):
+        # as_frames yields FrameBuffers (BGRX arrays for encoders) instead of pixmaps.
+        render = self.render_frame if as_frames else self.render_field
+        x, y = self.view_axes(zoom, offset_x, offset_y)
+
+        if mode == "distance":
+            mu, inside, distance = self.compute_distance_field(x, y, max_iter)
+            yield render(mu, inside, base_color, self.distance_colorize(distance, abs(x[1] - x[0])))
+            return
+
+        mu, inside = self.compute_field(x, y, max_iter)
+
+        colorize = None
+        if antialias:
+            def colorize(mu, inside):
+                return supersample(self, x, y, mu, inside, max_iter)
+
+        yield render(mu, inside, base_color, colorize)
         
     def generate(self, max_iter=200, zoom=1.0, offset_x=0.0, offset_y=0.0, base_color=None):
         if base_color is not None and isinstance(base_color, QColor):
@@ -0,0 +1,144 @@
+import numpy as np
+from fractals.frame_buffer import FrameBuffer
+from fractals.simplify import continues
+from fractals.tuning import SETTINGS
+
+
+SAMPLE_BUDGET = SETTINGS["raster_samples"]
+TILE = SETTINGS["raster_tile"]
+
+
+def segment_samples(x0, y0, x1, y1):
+    # One sample per pixel column (row, for steep segments) the segment
+    # crosses, weighted by how much of that column it spans; pieces of a
+    # split segment add up to the whole.
+    steep = np.abs(y1 - y0) > np.abs(x1 - x0)
+    m0 = np.where(steep, y0, x0)
+    m1 = np.where(steep, y1, x1)
+    n0 = np.where(steep, x0, y0)
+    n1 = np.where(steep, x1, y1)
+    low = np.minimum(m0, m1)
+    high = np.maximum(m0, m1)
+
+    first = np.floor(low).astype(np.intp)
+    counts = np.floor(high).astype(np.intp) - first + 1
+    seg = np.repeat(np.arange(len(x0)), counts)
+    start = np.cumsum(counts) - counts
+    pixel = first[seg] + np.arange(seg.size) - start[seg]
+
+    lo = np.maximum(low[seg], pixel)
+    hi = np.minimum(high[seg], pixel + 1)
+    span = m1 - m0
+    t = np.divide((lo + hi) / 2 - m0[seg], span[seg], out=np.zeros(seg.size), where=span[seg] != 0)
+    minor = n0[seg] + (n1 - n0)[seg] * t
+
+    length = np.hypot(x1 - x0, y1 - y0)
+    slope = np.divide(np.abs(span), length, out=np.ones_like(length), where=length > 0)
+    return pixel, minor, steep[seg], hi - lo, slope[seg]
+
+
+def accumulate(coverage, major_pixel, minor, steep, weight, half, antialias, left, top):
+    height, width = coverage.shape
+    lo = minor - half
+    hi = minor + half
+    first = np.floor(lo).astype(np.intp)
+    span = int(np.max(np.floor(hi).astype(np.intp) - first)) + 1 if minor.size else 0
+
+    for offset in range(span):
+        p = first + offset
+        if antialias:
+            # Box-filter coverage of pixel [p, p + 1) by the stroke across it;
+            # for a 1 px stroke this is exactly Wu's two-pixel split.
+            amount = np.clip(np.minimum(hi, p + 1) - np.maximum(lo, p), 0.0, 1.0) * weight
+        else:
+            amount = ((p + 0.5 >= lo) & (p + 0.5 <= hi)) | (p == np.floor(minor))
+            amount = (amount & (weight > 0)).astype(np.float64)
+
+        row = np.where(steep, major_pixel, p) - top
+        col = np.where(steep, p, major_pixel) - left
+        keep = (amount > 0) & (row >= 0) & (row < height) & (col >= 0) & (col < width)
+        np.add.at(coverage.reshape(-1), row[keep] * width + col[keep], amount[keep])
+
+
+def square_caps(x0, y0, x1, y1, thickness):
+    # Square caps, like QPainter's default pen: polyline ends run on by half
+    # the stroke width. Joints inside a polyline get none, so a stroke split
+    # into many short pieces does not pile up ink where they meet.
+    dx = x1 - x0
+    dy = y1 - y0
+    length = np.hypot(dx, dy)
+    reach = np.divide(max(1.0, float(thickness)) / 2.0, length, out=np.zeros_like(length), where=length > 0)
+    joined = continues(x0, y0, x1, y1)
+    head = np.where(joined, 0.0, reach)
+    tail = np.where(np.append(joined[1:], False), 0.0, reach)
+    return x0 - dx * head, y0 - dy * head, x1 + dx * tail, y1 + dy * tail
+
+
+def rasterize(x0, y0, x1, y1, width, height, thickness=1.0, antialias=True, left=0, top=0, coverage=None, caps=True):
+    x0, y0, x1, y1 = (np.asarray(a, dtype=np.float64).ravel() for a in (x0, y0, x1, y1))
+    if coverage is None:
+        coverage = np.zeros((height, width), dtype=np.float64)
+    if x0.size == 0:
+        return coverage
+    thickness = max(1.0, float(thickness))
+
+    if caps:
+        x0, y0, x1, y1 = square_caps(x0, y0, x1, y1, thickness)
+
+    # Segments are fed in chunks so the per-sample arrays stay bounded even
+    # for long strokes on poster-sized canvases.
+    samples = np.cumsum(np.ceil(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))) + 2)
+    start = 0
+    while start < x0.size:
+        done = samples[start - 1] if start else 0.0
+        stop = max(start + 1, int(np.searchsorted(samples, done + SAMPLE_BUDGET, side="right")))
+        part = slice(start, stop)
+        pixel, minor, steep, weight, slope = segment_samples(x0[part], y0[part], x1[part], y1[part])
+        # Thickness is measured across the stroke; along the minor axis it
+        # spreads by 1 / cos of the angle to the major axis.
+        accumulate(coverage, pixel, minor, steep, weight, thickness / 2.0 / slope, antialias, left, top)
+        start = stop
+
+    np.minimum(coverage, 1.0, out=coverage)
+    return coverage
+
+
+def rasterize_tiles(x0, y0, x1, y1, width, height, thickness=1.0, antialias=True, tile=None):
+    tile = tile or TILE
+    x0, y0, x1, y1 = (np.asarray(a, dtype=np.float64).ravel() for a in (x0, y0, x1, y1))
+    x0, y0, x1, y1 = square_caps(x0, y0, x1, y1, thickness)
+    pad = max(1.0, float(thickness)) * 1.5 + 1.0
+    min_x = np.minimum(x0, x1) - pad
+    max_x = np.maximum(x0, x1) + pad
+    min_y = np.minimum(y0, y1) - pad
+    max_y = np.maximum(y0, y1) + pad
+
+    for top in range(0, height, tile):
+        rows = (max_y >= top) & (min_y < top + tile)
+        for left in range(0, width, tile):
+            hit = rows & (max_x >= left) & (min_x < left + tile)
+            h = min(tile, height - top)
+            w = min(tile, width - left)
+            yield top, left, rasterize(x0[hit], y0[hit], x1[hit], y1[hit], w, h, thickness, antialias, left, top, caps=False)
+
+
+def rasterize_canvas(x0, y0, x1, y1, width, height, thickness=1.0, antialias=True, tile=None):
+    coverage = np.empty((height, width), dtype=np.float64)
+    for top, left, part in rasterize_tiles(x0, y0, x1, y1, width, height, thickness, antialias, tile):
+        coverage[top:top + part.shape[0], left:left + part.shape[1]] = part
+    return coverage
+
+
+def ink(coverage):
+    # Black strokes on white paper, as the QPainter backend draws them.
+    return np.round(255.0 * (1.0 - coverage)).astype(np.uint8)
+
+
+def coverage_pixmap(coverage):
+    frame_buffer = FrameBuffer(coverage.shape[1], coverage.shape[0])
+    out = frame_buffer.array
+    gray = ink(coverage)
+    out[..., 0] = gray
+    out[..., 1] = gray
+    out[..., 2] = gray
+    return frame_buffer.pixmap()
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+def continues(x0, y0, x1, y1, groups=None):
+    # follows[k]: segment k starts where segment k - 1 ended, in the same group.
+    follows = np.zeros(len(x0), dtype=bool)
+    follows[1:] = (x0[1:] == x1[:-1]) & (y0[1:] == y1[:-1])
+    if groups is not None:
+        follows[1:] &= groups[1:] == groups[:-1]
+    return follows
+
+
+def merge_runs(x0, y0, x1, y1, joins, commands=None):
+    # joins[k]: segment k extends the run of segment k - 1. A run keeps the
+    # start of its first segment and the end (and command) of its last one.
+    first = np.flatnonzero(~joins)
+    last = np.append(first[1:], len(x0)) - 1
+    merged = (x0[first], y0[first], x1[last], y1[last])
+    if commands is None:
+        return merged
+    return merged + (commands[last],)
+
+
+def simplify_pixels(x0, y0, x1, y1, commands=None, groups=None, thickness=1):
+    # Lossless for aliased drawing at integer pixel coordinates (QPainter's
+    # drawLine(int, int, int, int)): only what the truncated endpoints see matters.
+    x0, y0, x1, y1 = np.trunc(x0), np.trunc(y0), np.trunc(x1), np.trunc(y1)
+    if len(x0) == 0:
+        return (x0, y0, x1, y1) if commands is None else (x0, y0, x1, y1, commands)
+
+    # A segment that starts and ends in the same pixel only repeats a pixel of
+    # its neighbours, unless the whole polyline never leaves that pixel. With
+    # wider pens its square cap can fill the notch of a turn, so it stays.
+    chain = np.cumsum(~continues(x0, y0, x1, y1, groups))
+    moving = (x0 != x1) | (y0 != y1) | (thickness > 1)
+    chain_moves = np.zeros(chain[-1] + 1, dtype=bool)
+    chain_moves[chain[moving]] = True
+    keep = moving | (~chain_moves[chain] & ~continues(x0, y0, x1, y1, groups))
+    x0, y0, x1, y1, chain = x0[keep], y0[keep], x1[keep], y1[keep], chain[keep]
+    if commands is not None:
+        commands = commands[keep]
+    if groups is not None:
+        groups = groups[keep]
+
+    # Steps along a row, a column or an exact diagonal rasterize to the same
+    # pixels one by one or as a single line, so a run of them in the same
+    # direction becomes one segment.
+    dx = x1 - x0
+    dy = y1 - y0
+    straight = (dx == 0) | (dy == 0) | (np.abs(dx) == np.abs(dy))
+    joins = continues(x0, y0, x1, y1, groups)
+    joins[1:] &= (chain[1:] == chain[:-1]) & straight[1:] & straight[:-1]
+    joins[1:] &= (np.sign(dx[1:]) == np.sign(dx[:-1])) & (np.sign(dy[1:]) == np.sign(dy[:-1]))
+    merged = merge_runs(x0, y0, x1, y1, joins, commands)
+
+    # Once truncated, curves that fold back on themselves draw the same pixel
+    # pairs over and over. An opaque aliased line adds nothing the second
+    # time, so only the first of identical segments is drawn; keeping the
+    # first also keeps every intermediate frame exact.
+    _, first = np.unique(np.column_stack(merged[:4]), axis=0, return_index=True)
+    first.sort()
+    return tuple(part[first] for part in merged)
+
+
+def simplify_collinear(x0, y0, x1, y1, commands=None, groups=None, tolerance=1e-9):
+    # Exact geometry: consecutive segments pointing the same way (up to float
+    # noise from the turtle's accumulated position) are one straight stroke.
+    if len(x0) == 0:
+        return (x0, y0, x1, y1) if commands is None else (x0, y0, x1, y1, commands)
+    dx = x1 - x0
+    dy = y1 - y0
+    length = np.hypot(dx, dy)
+    cross = dx[1:] * dy[:-1] - dy[1:] * dx[:-1]
+    dot = dx[1:] * dx[:-1] + dy[1:] * dy[:-1]
+    joins = continues(x0, y0, x1, y1, groups)
+    joins[1:] &= (np.abs(cross) <= tolerance * length[1:] * length[:-1]) & (dot > 0)
+    return merge_runs(x0, y0, x1, y1, joins, commands)
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def mirror_index(axis, tolerance=1e-6):
+    # axis[k] == -axis[j] for k = A - j, if the grid is aligned with the origin.
+    if len(axis) < 2 or axis[-1] == axis[0]:
+        return None
+    step = (axis[-1] - axis[0]) / (len(axis) - 1)
+    a = -2.0 * axis[0] / step
+    if abs(a - round(a)) > tolerance:
+        return None
+    return int(round(a))
+
+
+def symmetric_field(compute, x, y, symmetry=None):
+    # symmetry is "mirror" (f(conj p) == f(p), flip about the real axis) or
+    # "point" (f(-p) == f(p), rotate by 180 degrees about the origin).
+    if symmetry is None:
+        return compute(x, y)
+
+    row_mirror = mirror_index(y)
+    col_mirror = mirror_index(x) if symmetry == "point" else None
+    if row_mirror is None or (symmetry == "point" and col_mirror is None):
+        return compute(x, y)
+
+    # A row is copied when its mirror image lies inside the view above it;
+    # every other row (including the mirror sources) is computed.
+    rows = np.arange(len(y))
+    sources = row_mirror - rows
+    copied = (sources >= 0) & (sources < rows)
+    if not copied.any():
+        return compute(x, y)
+
+    own = ~copied
+    fields = []
+    for part in compute(x, y[own]):
+        field = np.empty((len(y), len(x)) + part.shape[2:], dtype=part.dtype)
+        field[own] = part
+        fields.append(field)
+
+    sources = sources[copied]
+    if symmetry == "mirror":
+        for field in fields:
+            field[copied] = field[sources]
+        return tuple(fields)
+
+    cols = col_mirror - np.arange(len(x))
+    inside_view = (cols >= 0) & (cols < len(x))
+    for field in fields:
+        field[np.ix_(copied, inside_view)] = field[np.ix_(sources, cols[inside_view])]
+    if not inside_view.all():
+        for field, part in zip(fields, compute(x[~inside_view], y[copied])):
+            field[np.ix_(copied, ~inside_view)] = part
+    return tuple(fields)
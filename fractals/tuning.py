@@ -0,0 +1,79 @@
+import json
+import os
+
+
+# Built-in settings; `python -m utils.calibrate` measures this machine and
+# writes the fastest ones to the per-user config file read below.
+DEFAULTS = {
+    "escape_backend": "auto",
+    "block_pixels": 1 << 16,
+    "jit_threads": 0,
+    "raster_samples": 1 << 20,
+    "raster_tile": 2048,
+    "tile_executor": "process",
+    "tile_workers": 0,
+}
+
+CHOICES = {
+    "escape_backend": ("auto", "jit", "blocked", "numpy"),
+    "tile_executor": ("process", "thread"),
+}
+
+
+def config_path():
+    # FRACTALAB_CONFIG points at another file, or is "default" to ignore the
+    # calibrated file altogether (for reproducible benchmarks and renders).
+    override = os.environ.get("FRACTALAB_CONFIG")
+    if override:
+        return None if override == "default" else override
+    if os.name == "nt" and os.environ.get("APPDATA"):
+        root = os.path.join(os.environ["APPDATA"], "FractaLab")
+    else:
+        root = os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "fractalab")
+    return os.path.join(root, "tuning.json")
+
+
+def valid(key, value):
+    if key not in DEFAULTS or type(value) is not type(DEFAULTS[key]):
+        return False
+    if key in CHOICES:
+        return value in CHOICES[key]
+    # 0 means "pick automatically" where the default is 0; sizes must be positive.
+    return value >= 0 if DEFAULTS[key] == 0 else value > 0
+
+
+def load_settings(path=None):
+    settings = dict(DEFAULTS)
+    path = path or config_path()
+    if path is None:
+        return settings
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return settings
+    # A hand-edited file of the wrong shape is ignored like an unreadable one.
+    if not isinstance(data, dict) or not isinstance(data.get("settings"), dict):
+        return settings
+    for key, value in data["settings"].items():
+        if valid(key, value):
+            settings[key] = value
+    return settings
+
+
+def save_settings(settings, report=None, path=None):
+    path = path or config_path()
+    if path is None:
+        raise ValueError("FRACTALAB_CONFIG=default has no config file to write")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    data = {"settings": {k: v for k, v in settings.items() if valid(k, v)}}
+    if report is not None:
+        data["report"] = report
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+SETTINGS = load_settings()
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+def shift_slices(shift, n):
+    if shift >= 0:
+        return slice(shift, n), slice(0, n - shift), slice(0, shift)
+    return slice(0, n + shift), slice(-shift, n), slice(n + shift, n)
+
+
+class ViewCache:
+    def __init__(self, generator):
+        self.generator = generator
+        self.clear()
+
+    def clear(self):
+        self.mu = None
+        self.inside = None
+        self.view = None
+        self.max_iter = None
+        self.params = None
+        self.exact = False
+
+    def matches(self, max_iter, params):
+        return self.mu is not None and self.max_iter == max_iter and self.params == params
+
+    def axes(self, view=None):
+        zoom, px, py = view or self.view
+        return self.generator.view_axes(zoom, px, py)
+
+    def pixel_steps(self):
+        x, y = self.axes()
+        return (x[-1] - x[0]) / (len(x) - 1), (y[-1] - y[0]) / (len(y) - 1)
+
+    def render(self, zoom, px, py, max_iter, **params):
+        self.view = (zoom, px, py)
+        self.max_iter = max_iter
+        self.params = params
+        x, y = self.axes()
+        self.mu, self.inside = self.generator.compute_field(x, y, max_iter, keep_state=True, **params)
+        self.exact = True
+        return self.mu, self.inside
+
+    def refine(self):
+        if not self.exact and self.view is not None:
+            self.render(*self.view, self.max_iter, **self.params)
+        return self.mu, self.inside
+
+    def pan(self, dx, dy):
+        h, w = self.mu.shape
+        zoom, px, py = self.view
+        step_x, step_y = self.pixel_steps()
+        view = (zoom, px - dx * step_x, py - dy * step_y)
+
+        if abs(dx) >= w or abs(dy) >= h:
+            return self.render(*view, self.max_iter, **self.params)
+
+        dst_x, src_x, new_x = shift_slices(dx, w)
+        dst_y, src_y, new_y = shift_slices(dy, h)
+
+        mu = np.empty_like(self.mu)
+        inside = np.empty_like(self.inside)
+        mu[dst_y, dst_x] = self.mu[src_y, src_x]
+        inside[dst_y, dst_x] = self.inside[src_y, src_x]
+
+        x, y = self.axes(view)
+        if dx:
+            mu[:, new_x], inside[:, new_x] = self.generator.compute_field(
+                x[new_x], y, self.max_iter, **self.params
+            )
+        if dy:
+            mu[new_y, dst_x], inside[new_y, dst_x] = self.generator.compute_field(
+                x[dst_x], y[new_y], self.max_iter, **self.params
+            )
+
+        self.view = view
+        self.mu = mu
+        self.inside = inside
+        return self.mu, self.inside
+
+    def zoom_preview(self, factor, anchor_x, anchor_y):
+        zoom, px, py = self.view
+        x, y = self.axes()
+        step_x, step_y = self.pixel_steps()
+        h, w = self.mu.shape
+
+        anchor_x = min(max(int(anchor_x), 0), w - 1)
+        anchor_y = min(max(int(anchor_y), 0), h - 1)
+        keep = 1.0 - 1.0 / factor
+        view = (
+            zoom * factor,
+            px + (x[anchor_x] - px) * keep,
+            py + (y[anchor_y] - py) * keep,
+        )
+
+        nx, ny = self.axes(view)
+        ix = np.clip(np.rint((nx - x[0]) / step_x), 0, w - 1).astype(np.intp)
+        iy = np.clip(np.rint((ny - y[0]) / step_y), 0, h - 1).astype(np.intp)
+
+        self.view = view
+        self.mu = self.mu[iy[:, None], ix]
+        self.inside = self.inside[iy[:, None], ix]
+        self.exact = False
+        return self.mu, self.inside
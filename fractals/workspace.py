@@ -0,0 +1,145 @@
+import threading
+
+import numpy as np
+
+from fractals.tuning import SETTINGS
+
+
+BLOCK_PIXELS = SETTINGS["block_pixels"]
+
+
+class EscapeWorkspace:
+    def __init__(self, block_pixels=BLOCK_PIXELS):
+        self.block_pixels = int(block_pixels)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.reserve(self.block_pixels)
+
+    def reserve(self, size):
+        if size <= self.size:
+            return
+        self.size = size
+        # Two copies of the live state: compaction reads one and writes the
+        # other. z and c are kept as separate real and imaginary planes so the
+        # step works on contiguous float arrays.
+        self.zr = [np.empty(size, dtype=np.float64) for _ in range(2)]
+        self.zi = [np.empty(size, dtype=np.float64) for _ in range(2)]
+        self.cr = [np.empty(size, dtype=np.float64) for _ in range(2)]
+        self.ci = [np.empty(size, dtype=np.float64) for _ in range(2)]
+        self.index = [np.empty(size, dtype=np.intp) for _ in range(2)]
+        self.buffers = []
+        self.magnitude = np.empty(size, dtype=np.float64)
+        self.square = np.empty(size, dtype=np.float64)
+        self.escaped = np.empty(size, dtype=bool)
+        self.keep = np.empty(size, dtype=bool)
+        self.escaped_index = np.empty(size, dtype=np.intp)
+        self.escaped_part = np.empty(size, dtype=np.float64)
+        self.positions = np.arange(size)
+
+    def step_buffers(self, count):
+        while len(self.buffers) < count:
+            self.buffers.append(np.empty(self.size, dtype=np.float64))
+        return self.buffers
+
+    def escape_time(self, z, c, max_iter, formula):
+        # A generator can be rendering on the GUI thread and in a video thread
+        # at once; the second caller gets a private workspace.
+        if not self.lock.acquire(blocking=False):
+            return EscapeWorkspace(self.block_pixels).escape_time(z, c, max_iter, formula)
+        try:
+            return self.escape_frame(z, c, max_iter, formula)
+        finally:
+            self.lock.release()
+
+    def escape_frame(self, z, c, max_iter, formula):
+        shape = z.shape
+        flat_z = z.reshape(-1)
+        per_pixel_c = np.ndim(c) > 0
+        flat_c = np.broadcast_to(c, shape).reshape(-1) if per_pixel_c else c
+
+        iterations = np.zeros(flat_z.size, dtype=np.int32)
+        inside = np.ones(flat_z.size, dtype=bool)
+
+        # Rows of the frame are processed a block at a time so the live state
+        # and the step temporaries stay in cache; every array is reused.
+        block = self.block_pixels
+        if shape and shape[-1] > block:
+            block = shape[-1]
+        elif shape:
+            block = max(1, block // shape[-1]) * shape[-1]
+        self.reserve(min(block, flat_z.size))
+        buffers = self.step_buffers(formula.buffer_count)
+
+        for start in range(0, flat_z.size, block):
+            stop = min(start + block, flat_z.size)
+            self.escape_block(flat_z, flat_c if per_pixel_c else None, c, start, stop, max_iter, formula,
+                              iterations, inside, buffers)
+
+        return iterations.reshape(shape), flat_z.reshape(shape), inside.reshape(shape)
+
+    def escape_block(self, flat_z, flat_c, scalar_c, start, stop, max_iter, formula, iterations, inside, buffers):
+        n = stop - start
+        side = 0
+        np.copyto(self.zr[side][:n], flat_z.real[start:stop])
+        np.copyto(self.zi[side][:n], flat_z.imag[start:stop])
+        if flat_c is not None:
+            np.copyto(self.cr[side][:n], flat_c.real[start:stop])
+            np.copyto(self.ci[side][:n], flat_c.imag[start:stop])
+        else:
+            cr, ci = np.real(scalar_c), np.imag(scalar_c)
+        np.add(self.positions[:n], start, out=self.index[side][:n])
+        step = formula.step_inplace
+
+        dead = 0
+        for i in range(max_iter):
+            zr = self.zr[side][:n]
+            zi = self.zi[side][:n]
+            if flat_c is not None:
+                cr = self.cr[side][:n]
+                ci = self.ci[side][:n]
+            step(zr, zi, cr, ci, [b[:n] for b in buffers])
+
+            # |z|^2 > 4 in the same operations as formulas.escaped.
+            magnitude = np.multiply(zr, zr, out=self.magnitude[:n])
+            square = np.multiply(zi, zi, out=self.square[:n])
+            np.add(magnitude, square, out=magnitude)
+            escaped = np.greater(magnitude, 4.0, out=self.escaped[:n])
+            k = np.count_nonzero(escaped)
+            if not k:
+                continue
+
+            index = self.index[side][:n]
+            escaped_index = np.compress(escaped, index, out=self.escaped_index[:k])
+            iterations[escaped_index] = i
+            inside[escaped_index] = False
+            flat_z.real[escaped_index] = np.compress(escaped, zr, out=self.escaped_part[:k])
+            flat_z.imag[escaped_index] = np.compress(escaped, zi, out=self.escaped_part[:k])
+
+            # Escaped pixels are retired as NaN, which never compares > 2 again,
+            # and only squeezed out once they are a sizeable part of the block.
+            np.copyto(zr, np.nan, where=escaped)
+            dead += k
+            if dead * 4 >= n:
+                n, side = self.compact(n, dead, side, flat_c is not None)
+                dead = 0
+                if n == 0:
+                    return
+
+        if dead:
+            n, side = self.compact(n, dead, side, flat_c is not None)
+        index = self.index[side][:n]
+        flat_z.real[index] = self.zr[side][:n]
+        flat_z.imag[index] = self.zi[side][:n]
+
+    def compact(self, n, dead, side, per_pixel_c):
+        zr = self.zr[side][:n]
+        keep = np.equal(zr, zr, out=self.keep[:n])
+        live = n - dead
+        other = 1 - side
+        np.compress(keep, zr, out=self.zr[other][:live])
+        np.compress(keep, self.zi[side][:n], out=self.zi[other][:live])
+        np.compress(keep, self.index[side][:n], out=self.index[other][:live])
+        if per_pixel_c:
+            np.compress(keep, self.cr[side][:n], out=self.cr[other][:live])
+            np.compress(keep, self.ci[side][:n], out=self.ci[other][:live])
+        return live, other
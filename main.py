@@ -1,19 +1,41 @@
 import sys
 import os
+import threading
+import multiprocessing
 import resources_rc
-from PyQt5.QtWidgets import QApplication, QDialog, QColorDialog, QFileDialog, QLabel, QMessageBox
-from PyQt5.QtCore import QFile, QPropertyAnimation, QEasingCurve
+from PyQt5.QtWidgets import (
+    QApplication, QDialog, QColorDialog, QFileDialog, QLabel, QMenu, QMessageBox, QInputDialog, QProgressDialog
+)
+from PyQt5.QtCore import QFile, QPropertyAnimation, QEasingCurve, QEvent, QTimer, Qt
 from PyQt5.uic import loadUi
 from PyQt5.QtGui import QMovie, QIcon, QImage
 from PIL import Image
 
 from fractals.mandelbrot import MandelbrotGenerator
+from fractals.buddhabrot import BuddhabrotGenerator
 from fractals.julia import JuliaGenerator
 from fractals.Lsystem import LSystemGenerator
 from fractals.koha import KochGenerator
 from fractals.lsystem_presets import L_SYSTEM_PRESETS
+from fractals.view_cache import ViewCache
+from fractals.julia_preview import JuliaPreview
+from fractals.formulas import FORMULAS, DEFAULT_FORMULA
+from fractals.iteration_budget import estimate_max_iter
+from fractals import jit_backend
 
 from utils.zoom_dialog import ZoomDialog
+from utils.poster_thread import PosterExportThread
+from utils.buddhabrot_thread import BuddhabrotThread, SAMPLE_STEP
+from utils.poster_export import export_field_png, export_poster, poster_axes
+from utils.render_farm import RenderFarm, HOST as FARM_HOST, PORT as FARM_PORT
+from utils.zoom_video import save_frames_to_gif, save_frames_to_video
+from fractals.field_file import open_field, write_field
+from fractals.color_cycle import ColorCycle
+from fractals.frame_buffer import bgrx_to_pil, qimage_view
+
+
+# Seconds per pass of the L-system / Koch preview.
+LINE_PREVIEW_BUDGET = 0.05
 
 
 def resource_path(relative_path):
@@ -30,10 +52,22 @@ class FractalMainWindow(QDialog):
         self.selected_julia_color = None
         self.selected_mandel_color = None
         self.mandel = MandelbrotGenerator()
+        self.buddha = BuddhabrotGenerator()
+        self.buddha_run = None
+        self.buddha_thread = None
         self.julia = JuliaGenerator()
         self.lsystem = LSystemGenerator()
         self.koch = KochGenerator()
         self.lsystem_frames = []
+        self.view_caches = {0: ViewCache(self.mandel), 1: ViewCache(self.julia)}
+        # Views last rendered with distance shading, which the caches do not hold.
+        self.distance_views = set()
+        self.drag_pos = None
+        self.julia_preview = JuliaPreview()
+        self.hover_pos = None
+        self.farm = None
+        # The iteration field opened from the Field menu.
+        self.field = None
 
         self.load_ui()
         self.load_styles()
@@ -51,6 +85,12 @@ class FractalMainWindow(QDialog):
         self.lblEndXY.setGeometry(5, 30, 200, 20)
         self.lblEndXY.hide()
 
+        self.lblJuliaInset = QLabel(self.lblFractalDisplay)
+        self.lblJuliaInset.setStyleSheet("border: 1px solid rgba(255,255,255,60%);")
+        self.lblJuliaInset.setFixedSize(self.julia_preview.generator.width, self.julia_preview.generator.height)
+        self.lblJuliaInset.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.lblJuliaInset.hide()
+
         gif_path = resource_path("resources/gif/dance.gif")
         if os.path.exists(gif_path):
             self.movie = QMovie(gif_path)
@@ -59,6 +99,38 @@ class FractalMainWindow(QDialog):
         else:
             self.movie = None
         self.lblFractalDisplay.setScaledContents(True)
+        self.lblFractalDisplay.installEventFilter(self)
+
+        # While the window is being resized the label stretches the last image;
+        # the new size is only rendered once resizing pauses.
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(300)
+        self.resize_timer.timeout.connect(self.rerender_at_display_size)
+
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.setInterval(250)
+        self.refine_timer.timeout.connect(self.refine_view)
+
+        # Mouse moves only record the latest position; the zero-interval timer
+        # renders once per event-loop pass, so a burst of moves costs one preview.
+        self.lblFractalDisplay.setMouseTracking(True)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(0)
+        self.preview_timer.timeout.connect(self.update_julia_preview)
+
+        # Editing an L-system or Koch control draws an anytime preview: each
+        # pass refines it within LINE_PREVIEW_BUDGET and the next pass waits
+        # for the event loop, until it is complete or the next depth no
+        # longer fits the budget.
+        self.line_preview = None
+        self.line_preview_quality = None
+        self.line_preview_timer = QTimer(self)
+        self.line_preview_timer.setSingleShot(True)
+        self.line_preview_timer.setInterval(0)
+        self.line_preview_timer.timeout.connect(self.refine_line_preview)
     
     def load_ui(self):
         from utils.clean_spinBox import CleanSpinBox
@@ -104,12 +176,33 @@ class FractalMainWindow(QDialog):
         self.comboFractal.currentIndexChanged.connect(self.stackedWidget.setCurrentIndex)
         self.btnGenerate.clicked.connect(self.generate_fractal)
         self.btnSave.clicked.connect(self.save_image)
+        field_menu = QMenu(self)
+        field_menu.addAction("Open field...", self.open_field_file)
+        self.field_actions = [
+            field_menu.addAction("Recolour to PNG...", self.recolour_field),
+            field_menu.addAction("Crop...", self.crop_field),
+            field_menu.addAction("Refine...", self.refine_field),
+        ]
+        for action in self.field_actions:
+            action.setEnabled(False)
+        self.btnField.setMenu(field_menu)
+        self.chkRenderFarm.toggled.connect(self.toggle_render_farm)
         self.btnZoomVideo.clicked.connect(self.open_zoom_dialog)
         self.btnZoomVideo_2.clicked.connect(self.open_zoom_dialog)
         self.comboColorTheme.currentTextChanged.connect(self.change_theme)
         self.comboColorTheme_2.currentTextChanged.connect(self.change_theme)
+        self.comboFormulaMandelbrot.currentTextChanged.connect(lambda name: self.change_formula(self.mandel, name))
+        self.comboFormulaJulia.currentTextChanged.connect(lambda name: self.change_formula(self.julia, name))
         self.btnResetPalette.clicked.connect(self.reset_palette)
+        self.chkJuliaPreview.toggled.connect(lambda checked: self.lblJuliaInset.hide())
+        self.comboFractal.currentIndexChanged.connect(lambda index: self.lblJuliaInset.hide())
         self.comboPresetsLSystem.currentTextChanged.connect(self.apply_lsystem_preset)
+        for spin in (self.spinIterationsLSystem, self.spinAngleLSystem, self.spinLengthLSystem,
+                     self.spinLevelKoch, self.spinThicknessKoch):
+            spin.valueChanged.connect(self.start_line_preview)
+        for line in (self.lineAxiomLSystem, self.lineRuleALSystem, self.lineRuleBLSystem, self.lineRuleCLSystem):
+            line.textChanged.connect(self.start_line_preview)
+        self.comboTypeKoch.currentTextChanged.connect(self.start_line_preview)
         self.connect_linked_controls()
 
     def change_theme(self, theme):
@@ -122,6 +215,12 @@ class FractalMainWindow(QDialog):
             elif self.comboFractal.currentIndex() == 1:
                 self.pick_color("Julia")
 
+    def change_formula(self, gen, name):
+        gen.formula = FORMULAS.get(name, DEFAULT_FORMULA)
+        for cache in self.view_caches.values():
+            if cache.generator is gen:
+                cache.clear()
+
     def pick_color(self, fractal_name):
         dialog = QColorDialog(self)
         style_path = resource_path("resources/stylesheet.qss")
@@ -219,6 +318,8 @@ class FractalMainWindow(QDialog):
     def generate_fractal(self):
         if self.movie:
             self.movie.stop()
+        self.stop_buddhabrot()
+        self.fit_to_display()
 
         if self.comboFractal.currentIndex() == 0:
             self.generate_mandelbrot()
@@ -237,6 +338,220 @@ class FractalMainWindow(QDialog):
             QApplication.processEvents()
             QApplication.processEvents()
 
+    def show_last_frame(self, generator):
+        pix = None
+        for pix in generator:
+            pass
+        if pix is not None:
+            self.lblFractalDisplay.setPixmap(pix)
+
+    def display_size(self):
+        # Device pixels: on a HiDPI screen the image gets one pixel per
+        # physical pixel instead of being upscaled from the logical size.
+        ratio = self.lblFractalDisplay.devicePixelRatioF()
+        return (max(1, round(self.lblFractalDisplay.width() * ratio)),
+                max(1, round(self.lblFractalDisplay.height() * ratio)))
+
+    def fit_to_display(self):
+        # A hidden label has no real size yet; keep rendering at the last one.
+        if not self.lblFractalDisplay.isVisible():
+            return False
+        width, height = self.display_size()
+        generators = (self.mandel, self.julia, self.buddha, self.lsystem, self.koch)
+        if all((gen.width, gen.height) == (width, height) for gen in generators):
+            return False
+        for gen in generators:
+            gen.width, gen.height = width, height
+        for cache in self.view_caches.values():
+            cache.clear()
+        return True
+
+    def rerender_at_display_size(self):
+        if not self.fit_to_display():
+            return
+        pix = self.lblFractalDisplay.pixmap()
+        if pix is None or pix.isNull():
+            return
+        index = self.comboFractal.currentIndex()
+        if index in self.view_caches:
+            # A running Buddhabrot keeps its histogram size; it is redone at
+            # the new size on the next Generate.
+            if self.buddhabrot_active():
+                return
+            self.render_escape_view(index, index in self.distance_views)
+        elif index == 2:
+            self.generate_lsystem(animate=False)
+        elif index == 3:
+            self.generate_koch(animate=False)
+
+    def eventFilter(self, obj, event):
+        if obj is self.lblFractalDisplay and event.type() == QEvent.Resize:
+            self.resize_timer.start()
+        if obj is self.lblFractalDisplay and self.comboFractal.currentIndex() in self.view_caches:
+            if self.lblFractalDisplay.pixmap() is not None and not self.lblFractalDisplay.pixmap().isNull():
+                if self.julia_preview_active():
+                    if event.type() == QEvent.MouseMove and self.drag_pos is None:
+                        self.hover_pos = event.pos()
+                        if not self.preview_timer.isActive():
+                            self.preview_timer.start()
+                    if event.type() == QEvent.MouseButtonPress and event.button() == Qt.RightButton:
+                        c = self.hovered_c(event.pos())
+                        self.spinCRealJulia.setValue(c.real)
+                        self.spinCImagJulia.setValue(c.imag)
+                        return True
+                if self.buddhabrot_active():
+                    return super().eventFilter(obj, event)
+                if event.type() == QEvent.MouseButtonPress and event.button() == Qt.LeftButton:
+                    self.drag_pos = self.label_to_image(event.pos())
+                    return True
+                if event.type() == QEvent.MouseMove and self.drag_pos is not None:
+                    self.pan_view(event.pos())
+                    return True
+                if event.type() == QEvent.MouseButtonRelease and self.drag_pos is not None:
+                    self.pan_view(event.pos())
+                    self.drag_pos = None
+                    return True
+                if event.type() == QEvent.Wheel:
+                    self.zoom_view(event)
+                    return True
+            if event.type() == QEvent.Leave:
+                self.hover_pos = None
+                self.lblJuliaInset.hide()
+        return super().eventFilter(obj, event)
+
+    def label_to_image(self, pos):
+        gen = self.view_caches[self.comboFractal.currentIndex()].generator
+        sx = gen.width / max(1, self.lblFractalDisplay.width())
+        sy = gen.height / max(1, self.lblFractalDisplay.height())
+        return pos.x() * sx, pos.y() * sy
+
+    def buddhabrot_active(self):
+        return self.comboFractal.currentIndex() == 0 and self.chkBuddhabrot.isChecked()
+
+    def julia_preview_active(self):
+        return self.comboFractal.currentIndex() == 0 and self.chkJuliaPreview.isChecked()
+
+    def hovered_c(self, pos):
+        cache = self.view_caches[0]
+        view = cache.view if cache.mu is not None else self.current_view()[0]
+        x, y = self.mandel.view_axes(*view)
+        ix, iy = self.label_to_image(pos)
+        ix = min(max(int(ix), 0), len(x) - 1)
+        iy = min(max(int(iy), 0), len(y) - 1)
+        return complex(x[ix], y[iy])
+
+    def update_julia_preview(self):
+        if self.hover_pos is None or not self.julia_preview_active():
+            self.lblJuliaInset.hide()
+            return
+        self.julia_preview.generator.formula = self.mandel.formula
+        pix = self.julia_preview.render(
+            self.hovered_c(self.hover_pos),
+            self.comboColorTheme.currentText(),
+            self.selected_mandel_color
+        )
+        self.lblJuliaInset.setPixmap(pix)
+        self.lblJuliaInset.move(self.lblFractalDisplay.width() - self.lblJuliaInset.width() - 5, 5)
+        self.lblJuliaInset.show()
+
+    def current_view(self):
+        if self.comboFractal.currentIndex() == 0:
+            view = (
+                float(self.spinZoomMandelbrot.value()),
+                float(self.spinCenterXMandelbrot.value()),
+                float(self.spinCenterYMandelbrot.value()),
+            )
+            return view, int(self.spinIterationsMandelbrot.value()), {}
+
+        view = (
+            float(self.spinZoomJulia.value()),
+            float(self.spinCenterXJulia.value()),
+            float(self.spinCenterYJulia.value()),
+        )
+        params = {
+            "cx_param": float(self.spinCRealJulia.value()),
+            "cy_param": float(self.spinCImagJulia.value()),
+        }
+        return view, int(self.spinIterationsJulia.value()), params
+
+    def active_view_cache(self):
+        cache = self.view_caches[self.comboFractal.currentIndex()]
+        view, max_iter, params = self.current_view()
+        if not cache.matches(max_iter, params):
+            cache.render(*view, max_iter, **params)
+        return cache
+
+    def show_view(self, cache):
+        zoom, px, py = cache.view
+        self.distance_views.discard(0 if cache.generator is self.mandel else 1)
+        if cache.generator is self.mandel:
+            pix = self.mandel.render_field(cache.mu, cache.inside, self.selected_mandel_color)
+            self.spinZoomMandelbrot.setValue(zoom)
+            self.spinCenterXMandelbrot.setValue(px)
+            self.spinCenterYMandelbrot.setValue(py)
+        else:
+            pix = self.julia.render_field(cache.mu, cache.inside, self.selected_julia_color)
+            self.spinZoomJulia.setValue(zoom)
+            self.spinCenterXJulia.setValue(px)
+            self.spinCenterYJulia.setValue(py)
+        self.lblFractalDisplay.setPixmap(pix)
+
+    def pan_view(self, pos):
+        x, y = self.label_to_image(pos)
+        dx = int(round(x - self.drag_pos[0]))
+        dy = int(round(y - self.drag_pos[1]))
+        if not dx and not dy:
+            return
+        self.drag_pos = (self.drag_pos[0] + dx, self.drag_pos[1] + dy)
+        cache = self.active_view_cache()
+        cache.pan(dx, dy)
+        self.show_view(cache)
+
+    def zoom_view(self, event):
+        steps = event.angleDelta().y() / 120.0
+        if not steps:
+            return
+        x, y = self.label_to_image(event.pos())
+        cache = self.active_view_cache()
+        cache.zoom_preview(1.25 ** steps, x, y)
+        self.show_view(cache)
+        self.refine_timer.start()
+
+    def refine_view(self):
+        if self.comboFractal.currentIndex() not in self.view_caches:
+            return
+        cache = self.view_caches[self.comboFractal.currentIndex()]
+        if cache.mu is None or cache.exact:
+            return
+        cache.refine()
+        self.show_view(cache)
+
+    def render_escape_view(self, index, distance=None):
+        # Generate and the re-render after a resize share this path. Escape
+        # fields go through the view cache, so pan and zoom continue from
+        # them and a new max_iter on the same view only iterates what was
+        # still inside; distance=None reads the checkbox.
+        cache = self.view_caches[index]
+        gen = cache.generator
+        view, max_iter, params = self.current_view()
+        if distance is None:
+            check = self.chkDistanceMandelbrot if index == 0 else self.chkDistanceJulia
+            distance = check.isChecked() and gen.formula.transform == "none"
+        if distance:
+            cache.clear()
+            zoom, px, py = view
+            if index == 0:
+                frames = gen.generate_numpy(max_iter=max_iter, zoom=zoom, offset_x=px, offset_y=py,
+                                            base_color=self.selected_mandel_color, mode="distance")
+            else:
+                frames = gen.generate_numpy(max_iter=max_iter, zoom=zoom, center_x=px, center_y=py,
+                                            base_color=self.selected_julia_color, mode="distance", **params)
+            self.animate_frames(frames)
+            self.distance_views.add(index)
+            return
+        cache.render(*view, max_iter, **params)
+        self.show_view(cache)
+
     def generate_julia(self):
         self.lsystem_frames = []
         iterations = self.spinIterationsJulia.value()
@@ -246,6 +561,10 @@ class FractalMainWindow(QDialog):
         center_x = self.spinCenterXJulia.value()
         center_y = self.spinCenterYJulia.value()
 
+        if self.chkAutoIterJulia.isChecked():
+            iterations = estimate_max_iter(self.julia, zoom, center_x, center_y, cx_param=cx, cy_param=cy)
+            self.spinIterationsJulia.setValue(iterations)
+
         if iterations > 5000:
             reply = QMessageBox.warning(
                 self,
@@ -258,23 +577,19 @@ class FractalMainWindow(QDialog):
             if reply == QMessageBox.No:
                 return
 
-        base_color = self.selected_julia_color
-
-        gen = self.julia.generate(
-            max_iter=iterations,
-            zoom=zoom,
-            cx_param=cx,
-            cy_param=cy,
-            center_x=center_x,
-            center_y=center_y,
-            base_color=base_color
-        )
-
-        self.animate_frames(gen)
+        self.render_escape_view(1)
 
     def generate_mandelbrot(self):
         self.lsystem_frames = []
         iterations = int(self.spinIterationsMandelbrot.value())
+        zoom = float(self.spinZoomMandelbrot.value())
+        ox = float(self.spinCenterXMandelbrot.value())
+        oy = float(self.spinCenterYMandelbrot.value())
+
+        if self.chkAutoIterMandelbrot.isChecked():
+            iterations = estimate_max_iter(self.mandel, zoom, ox, oy)
+            self.spinIterationsMandelbrot.setValue(iterations)
+
         if iterations > 5000:
             reply = QMessageBox.warning(
                 self,
@@ -286,24 +601,37 @@ class FractalMainWindow(QDialog):
             )
             if reply == QMessageBox.No:
                 return
-        zoom = float(self.spinZoomMandelbrot.value())
-        ox = float(self.spinCenterXMandelbrot.value())
-        oy = float(self.spinCenterYMandelbrot.value())
 
-        base_color = self.selected_mandel_color
-
-        gen = self.mandel.generate(
-            max_iter=iterations,
-            zoom=zoom,
-            offset_x=ox,
-            offset_y=oy,
-            base_color=base_color
-        )
-
-        self.animate_frames(gen)
+        if self.chkBuddhabrot.isChecked():
+            self.generate_buddhabrot(iterations, zoom, ox, oy)
+            return
 
-    def generate_lsystem(self):
-        self.lsystem_frames = []
+        self.render_escape_view(0)
+
+    def generate_buddhabrot(self, iterations, zoom, ox, oy):
+        self.buddha.formula = self.mandel.formula
+        self.buddha.theme = self.mandel.theme
+        # Generating the same view again adds another batch of samples to the
+        # picture instead of starting over.
+        self.buddha_run = self.buddha.new_run(iterations, zoom=zoom, offset_x=ox, offset_y=oy, run=self.buddha_run)
+        self.buddha_thread = BuddhabrotThread(self.buddha_run, self.buddha_run.samples + SAMPLE_STEP)
+        self.buddha_thread.round_done.connect(self.show_buddhabrot)
+        self.buddha_thread.error_occurred.connect(
+            lambda msg: QMessageBox.critical(self, "Error", f"Buddhabrot failed:\n{msg}"))
+        self.buddha_thread.start()
+
+    def stop_buddhabrot(self):
+        if self.buddha_thread is not None:
+            self.buddha_thread.requestInterruption()
+            self.buddha_thread.wait()
+            self.buddha_thread = None
+
+    def show_buddhabrot(self, histogram):
+        mu, empty = self.buddha.density_field(histogram)
+        pix = self.buddha.render_field(mu, empty, self.selected_mandel_color, self.buddha.density_colorize)
+        self.lblFractalDisplay.setPixmap(pix)
+
+    def generate_lsystem(self, animate=True):
         iterations = self.spinIterationsLSystem.value()
         angle = self.spinAngleLSystem.value()
         length = self.spinLengthLSystem.value()
@@ -321,12 +649,59 @@ class FractalMainWindow(QDialog):
             angle_deg=angle,
             step=length,
             axiom=axiom,
-            rules=rules
+            rules=rules,
+            backend="numpy" if self.chkFastRasterLSystem.isChecked() else "qpainter"
         )
+        if not animate:
+            # The GIF keeps the frames of the last animated generation.
+            self.show_last_frame(gen)
+            return
+        self.lsystem_frames = []
         self.animate_frames(gen, capture_frames=True, frame_store=self.lsystem_frames)
 
 
 
+    def start_line_preview(self):
+        self.line_preview = None
+        self.line_preview_timer.start()
+
+    def refine_line_preview(self):
+        index = self.comboFractal.currentIndex()
+        if index == 2:
+            axiom = self.lineAxiomLSystem.text()
+            rules = self.parse_rules_from_ui(
+                axiom, [self.lineRuleALSystem.text(), self.lineRuleBLSystem.text(), self.lineRuleCLSystem.text()])
+            state = self.lsystem.render_anytime(
+                LINE_PREVIEW_BUDGET,
+                iterations=self.spinIterationsLSystem.value(),
+                angle_deg=self.spinAngleLSystem.value(),
+                step=self.spinLengthLSystem.value(),
+                axiom=axiom,
+                rules=rules,
+                state=self.line_preview
+            )
+        elif index == 3:
+            state = self.koch.render_anytime(
+                LINE_PREVIEW_BUDGET,
+                level=self.spinLevelKoch.value(),
+                thickness=self.spinThicknessKoch.value(),
+                type=self.comboTypeKoch.currentText().lower(),
+                state=self.line_preview
+            )
+        else:
+            return
+
+        progressed = self.line_preview is None or state.quality != self.line_preview_quality
+        self.line_preview = state
+        self.line_preview_quality = state.quality
+        if not progressed:
+            return
+        if self.movie:
+            self.movie.stop()
+        self.lblFractalDisplay.setPixmap(state.pixmap)
+        if not state.complete:
+            self.line_preview_timer.start()
+
     def apply_lsystem_preset(self):
         preset = self.comboPresetsLSystem.currentText()
 
@@ -347,8 +722,7 @@ class FractalMainWindow(QDialog):
         self.spinIterationsLSystem.setValue(int(cfg["iterations"]))
         self.spinLengthLSystem.setValue(int(cfg["length"]))
 
-    def generate_koch(self):
-        self.lsystem_frames = []
+    def generate_koch(self, animate=True):
         level = self.spinLevelKoch.value()
         thickness = self.spinThicknessKoch.value()
         fractal_type = self.comboTypeKoch.currentText().lower()
@@ -356,8 +730,13 @@ class FractalMainWindow(QDialog):
         gen = self.koch.generate(
             level=level,
             thickness=thickness,
-            type=fractal_type
+            type=fractal_type,
+            backend="numpy" if self.chkFastRasterKoch.isChecked() else "qpainter"
         )
+        if not animate:
+            self.show_last_frame(gen)
+            return
+        self.lsystem_frames = []
         self.animate_frames(gen)
 
     def open_zoom_dialog(self):
@@ -383,6 +762,9 @@ class FractalMainWindow(QDialog):
         filters = "PNG Image (*.png);;JPEG Image (*.jpg)"
         if self.comboFractal.currentIndex() == 2:
             filters = "GIF Animation (*.gif);;" + filters
+        elif self.comboFractal.currentIndex() in self.view_caches:
+            filters += (";;Poster PNG (*.png);;Poster raw buffer (*.npy);;Iteration field (*.npy)"
+                        ";;Color cycle video (*.mp4);;Color cycle GIF (*.gif)")
 
         path, selected_filter = QFileDialog.getSaveFileName(
             self,
@@ -395,17 +777,202 @@ class FractalMainWindow(QDialog):
             lower = path.lower()
             if lower.endswith(".gif") and self.comboFractal.currentIndex() == 2:
                 self.save_lsystem_gif(path)
+            elif selected_filter.startswith("Color cycle"):
+                self.export_color_cycle(path, gif=selected_filter.startswith("Color cycle GIF"))
+            elif selected_filter.startswith("Poster") or selected_filter.startswith("Iteration field"):
+                self.export_poster(path, field=selected_filter.startswith("Iteration field"))
             else:
                 pix.save(path)
 
+    def toggle_render_farm(self, enabled):
+        if enabled and self.farm is None:
+            try:
+                # Loopback unless another address is entered: the farm port
+                # takes jobs from anybody who can reach it.
+                host = self.lineFarmHost.text().strip() or FARM_HOST
+                self.farm = RenderFarm(FARM_PORT, host).start()
+            except OSError as e:
+                QMessageBox.critical(self, "Error", f"Cannot start the render farm:\n{e}")
+                self.chkRenderFarm.setChecked(False)
+            self.lineFarmHost.setEnabled(self.farm is None)
+        elif not enabled and self.farm is not None:
+            self.farm.close()
+            self.farm = None
+            self.lineFarmHost.setEnabled(True)
+
+    def active_farm(self):
+        # Only worth it when somebody is there to do the work.
+        if self.farm is not None and self.farm.worker_count() > 0:
+            return self.farm
+        return None
+
+    def export_poster(self, path, field=False):
+        cache = self.view_caches[self.comboFractal.currentIndex()]
+        gen = cache.generator
+        width, ok = QInputDialog.getInt(self, "Poster", "Width (px):", 16000, 900, 65535, 1000)
+        if not ok:
+            return
+        height = int(round(width * gen.height / gen.width))
+
+        view, max_iter, params = self.current_view()
+        if cache.mu is not None:
+            view = cache.view
+        base_color = self.selected_mandel_color if gen is self.mandel else self.selected_julia_color
+
+        if field:
+            x, y = poster_axes(gen, view, width, height)
+            self.poster_thread = PosterExportThread(write_field, path, gen, x, y, max_iter, params, view)
+        else:
+            self.poster_thread = PosterExportThread(
+                export_poster, gen, path, view, width, height, max_iter, params, base_color, antialias=True,
+                farm=self.active_farm()
+            )
+        self.start_poster_thread("Rendering poster...", lambda finished: self.on_poster_exported(finished, path))
+
+    def start_poster_thread(self, label, on_finished):
+        self.poster_progress = QProgressDialog(label, "Cancel", 0, 100, self)
+        self.poster_progress.setWindowModality(Qt.WindowModal)
+        self.poster_progress.setAutoClose(False)
+        self.poster_progress.canceled.connect(self.poster_thread.requestInterruption)
+        self.poster_thread.progress_updated.connect(self.poster_progress.setValue)
+        self.poster_thread.finished_export.connect(on_finished)
+        self.poster_thread.error_occurred.connect(self.on_poster_error)
+        self.poster_progress.show()
+        self.poster_thread.start()
+
+    def field_generator(self, field):
+        # A generator of the kind and formula the field was computed with,
+        # coloured like the one on its page.
+        sources = {"MandelbrotGenerator": (self.mandel, self.selected_mandel_color),
+                   "JuliaGenerator": (self.julia, self.selected_julia_color)}
+        if field.meta["generator"] not in sources:
+            raise ValueError("Fields of " + field.meta["generator"] + " cannot be shown")
+        source, color = sources[field.meta["generator"]]
+        gen = type(source)(source.width, source.height, FORMULAS.get(field.meta["formula"], DEFAULT_FORMULA))
+        gen.theme = source.theme
+        gen.user_color = source.user_color
+        return gen, color
+
+    def show_field(self, path):
+        try:
+            field = open_field(path)
+            gen, color = self.field_generator(field)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.critical(self, "Error", f"Cannot open the iteration field:\n{e}")
+            return
+        self.field = field
+        for action in self.field_actions:
+            action.setEnabled(True)
+        mu, inside = field.preview(*self.display_size())
+        self.lblFractalDisplay.setPixmap(gen.render_field(mu, inside, color))
+
+    def open_field_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open iteration field", "", "Iteration field (*.npy)")
+        if path:
+            self.show_field(path)
+
+    def recolour_field(self):
+        # The preview takes the current theme; the PNG is written band by band
+        # at the field's full size.
+        self.show_field(self.field.path)
+        path, _ = QFileDialog.getSaveFileName(self, "Save recoloured field", "", "PNG Image (*.png)")
+        if not path:
+            return
+        gen, color = self.field_generator(self.field)
+        self.poster_thread = PosterExportThread(export_field_png, self.field, gen, path, color)
+        self.start_poster_thread("Colouring field...", lambda finished: self.on_field_done(
+            finished, self.field.path, f"Image saved to:\n{path}"))
+
+    def crop_field(self):
+        field = self.field
+        text, ok = QInputDialog.getText(
+            self, "Crop field", "Pixels to keep (left, top, right, bottom):",
+            text=f"0, 0, {field.width}, {field.height}"
+        )
+        if not ok:
+            return
+        try:
+            left, top, right, bottom = (int(v) for v in text.split(","))
+        except ValueError:
+            QMessageBox.critical(self, "Error", "Enter four whole numbers: left, top, right, bottom.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save cropped field", "", "Iteration field (*.npy)")
+        if not path:
+            return
+        self.poster_thread = PosterExportThread(field.crop, path, left, top, right, bottom)
+        self.start_poster_thread("Cropping field...", lambda finished: self.on_field_done(
+            finished, path, f"Cropped field saved to:\n{path}"))
+
+    def refine_field(self):
+        field = self.field
+        max_iter, ok = QInputDialog.getInt(
+            self, "Refine field", f"New max iterations (now {field.max_iter}):",
+            field.max_iter * 2, field.max_iter + 1, 10_000_000, 100
+        )
+        if not ok:
+            return
+        try:
+            writable = open_field(field.path, "r+")
+            gen, _ = self.field_generator(writable)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.critical(self, "Error", f"Cannot refine the iteration field:\n{e}")
+            return
+        self.poster_thread = PosterExportThread(writable.refine, gen, max_iter)
+        self.start_poster_thread("Refining field...", lambda finished: self.on_field_done(
+            finished, field.path, f"Field refined to {max_iter} iterations."))
+
+    def on_field_done(self, finished, path, message):
+        self.poster_progress.close()
+        # The file is reopened so the sidecar written by the thread is read.
+        self.show_field(path if finished else self.field.path)
+        if finished:
+            QMessageBox.information(self, "Done", message)
+        else:
+            QMessageBox.information(self, "Info", "Stopped. Run it again to finish.")
+
+    def export_color_cycle(self, path, gif=False):
+        cache = self.view_caches[self.comboFractal.currentIndex()]
+        gen = cache.generator
+        n_frames, ok = QInputDialog.getInt(self, "Color cycle", "Frames per palette cycle:", 120, 2, 3600, 10)
+        if not ok:
+            return
+
+        view, max_iter, params = self.current_view()
+        if cache.mu is not None:
+            view = cache.view
+        base_color = self.selected_mandel_color if gen is self.mandel else self.selected_julia_color
+
+        # The field is computed once; every frame only shifts the palette.
+        if cache.mu is not None and cache.exact and cache.matches(max_iter, params):
+            mu, inside = cache.mu, cache.inside
+        else:
+            x, y = gen.view_axes(*view)
+            mu, inside = gen.compute_field(x, y, max_iter, keep_state=True, **params)
+        cycle = ColorCycle(gen, mu, inside, base_color)
+        try:
+            if gif:
+                save_frames_to_gif(cycle.gif_frames(n_frames), path, duration=40)
+            else:
+                save_frames_to_video(cycle.frames(n_frames), path)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to save animation:\n{e}")
+            return
+        QMessageBox.information(self, "Done", f"Animation saved to:\n{path}")
+
+    def on_poster_exported(self, finished, path):
+        self.poster_progress.close()
+        if finished:
+            QMessageBox.information(self, "Done", f"Poster saved to:\n{path}")
+        else:
+            QMessageBox.information(self, "Info", "Poster export paused. Save to the same file again to resume.")
+
+    def on_poster_error(self, error_msg):
+        self.poster_progress.close()
+        QMessageBox.critical(self, "Error", f"Poster export failed:\n{error_msg}")
+
     def qimage_to_pil(self, qimg: QImage) -> Image.Image:
-        qimg = qimg.convertToFormat(QImage.Format_RGBA8888)
-        width = qimg.width()
-        height = qimg.height()
-        ptr = qimg.bits()
-        ptr.setsize(qimg.byteCount())
-        img = Image.frombuffer("RGBA", (width, height), bytes(ptr), "raw", "RGBA", 0, 1)
-        return img.copy()
+        arr, qimg = qimage_view(qimg)
+        return bgrx_to_pil(arr)
 
     def save_lsystem_gif(self, path: str):
         if not getattr(self, "lsystem_frames", None):
@@ -420,19 +987,16 @@ class FractalMainWindow(QDialog):
         if not pil_frames:
             QMessageBox.information(self, "Info", "Нет кадров для сохранения.")
             return
-        
-        pil_frames[0].save(
-            path,
-            save_all=True,
-            append_images=pil_frames[1:],
-            duration=50,
-            loop=0,
-            optimize=False,
-        )
+
+        save_frames_to_gif(pil_frames, path)
 
 def main():
+    # Buddhabrot workers are spawned processes; a frozen build must not start
+    # the GUI again in each of them.
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setApplicationName("Fractal Generator")
+    threading.Thread(target=jit_backend.warm_up, daemon=True).start()
 
     window = FractalMainWindow()
     window.show()
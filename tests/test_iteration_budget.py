@@ -0,0 +1,26 @@
+import numpy as np
+
+from fractals.escape_time import escape_time
+from fractals.iteration_budget import estimate_max_iter
+from fractals.mandelbrot import MandelbrotGenerator
+
+
+def smallest_escape(generator, zoom, x, y, limit):
+    xs, ys = generator.view_axes(zoom, x, y)
+    points = np.linspace(xs[0], xs[-1], 120) + np.linspace(ys[0], ys[-1], 80)[:, None] * 1j
+    z, c = generator.initial_state(points)
+    iterations, _, inside = escape_time(z, c, limit, formula=generator.formula)
+    return iterations[~inside].min()
+
+
+def test_deep_zoom_budget_reaches_the_first_escapes():
+    # At zoom 1e6 no probe pixel escapes within the first budgets; the
+    # estimate must not stop at the floor and render the frame solid black.
+    generator = MandelbrotGenerator(120, 80)
+    view = (1e6, -0.743643887037151, 0.131825904205330)
+    assert estimate_max_iter(generator, *view) > smallest_escape(generator, *view, 20000)
+
+
+def test_shallow_view_keeps_a_small_budget():
+    generator = MandelbrotGenerator(120, 80)
+    assert estimate_max_iter(generator, 1.0, 0.0, 0.0) < 200
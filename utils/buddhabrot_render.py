@@ -0,0 +1,56 @@
+import argparse
+import os
+
+from PIL import Image
+
+from fractals.buddhabrot import BuddhabrotGenerator, open_run
+from fractals.formulas import FORMULAS
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render a Buddhabrot; the histogram is checkpointed so a later run with more samples extends it.")
+    parser.add_argument("path", help="output .png")
+    parser.add_argument("--samples", type=int, default=100_000_000, help="total samples (including checkpointed ones)")
+    parser.add_argument("--width", type=int, default=1800)
+    parser.add_argument("--height", type=int, default=None)
+    parser.add_argument("--zoom", type=float, default=1.0)
+    parser.add_argument("--x", type=float, default=0.0)
+    parser.add_argument("--y", type=float, default=0.0)
+    parser.add_argument("--iter", type=int, default=2000)
+    parser.add_argument("--min-iter", type=int, default=20, help="shorter orbits are not drawn")
+    parser.add_argument("--formula", choices=sorted(FORMULAS), default="z^2 + c")
+    parser.add_argument("--theme", default="Ocean")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: cores)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--checkpoint", default=None, help="histogram .npy (default: next to the output)")
+    args = parser.parse_args()
+
+    height = args.height or args.width * 2 // 3
+    gen = BuddhabrotGenerator(args.width, height, FORMULAS[args.formula])
+    gen.theme = args.theme
+    checkpoint = args.checkpoint or os.path.splitext(args.path)[0] + ".npy"
+
+    run = None
+    if os.path.exists(checkpoint):
+        run = open_run(checkpoint)
+        if run.meta["seed"] != args.seed:
+            run = None
+    run = gen.new_run(args.iter, args.min_iter, args.zoom, args.x, args.y, args.seed, run=run)
+    if run.samples:
+        print(f"Continuing {checkpoint} from {run.samples} samples")
+
+    def progress(value):
+        print(f"\r{run.samples} samples ({value}%)", end="", flush=True)
+
+    try:
+        finished = run.extend(args.samples, args.workers, progress=progress, round_done=lambda r: r.save(checkpoint))
+    except KeyboardInterrupt:
+        finished = False
+    print()
+    Image.fromarray(gen.run_rgb(run), "RGB").save(args.path)
+    print(("Saved " if finished else "Interrupted; rerun to continue. Saved ") + args.path)
+
+
+if __name__ == "__main__":
+    main()
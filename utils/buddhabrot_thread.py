@@ -0,0 +1,39 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+# Samples each Generate adds to the picture on screen.
+SAMPLE_STEP = 1 << 22
+
+
+class BuddhabrotThread(QThread):
+    round_done = pyqtSignal(object)
+    progress_updated = pyqtSignal(int)
+    finished_run = pyqtSignal(bool)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, buddha_run, samples, workers=None, checkpoint=None):
+        super().__init__()
+        self.buddha_run = buddha_run
+        self.samples = samples
+        self.workers = workers
+        self.checkpoint = checkpoint
+
+    def on_round(self, buddha_run):
+        if self.checkpoint:
+            buddha_run.save(self.checkpoint)
+        # A copy, so the GUI can colour it while the next round accumulates.
+        self.round_done.emit(buddha_run.histogram.copy())
+
+    def run(self):
+        try:
+            finished = self.buddha_run.extend(
+                self.samples,
+                self.workers,
+                progress=self.progress_updated.emit,
+                should_stop=self.isInterruptionRequested,
+                round_done=self.on_round,
+            )
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+            return
+        self.finished_run.emit(bool(finished))
@@ -0,0 +1,221 @@
+import argparse
+import multiprocessing
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from fractals import tuning
+
+
+BLOCK_SIZES = (1 << 14, 1 << 15, 1 << 16, 1 << 17, 1 << 18)
+SAMPLE_BUDGETS = (1 << 16, 1 << 18, 1 << 20, 1 << 22)
+RASTER_TILES = (1024, 2048, 4096)
+
+ESCAPE_SCENES = (
+    ("mandelbrot", (1.0, -0.5, 0.0), 300, {}),
+    ("mandelbrot", (200.0, -0.7436, 0.1318), 1500, {}),
+    ("julia", (1.0, 0.0, 0.0), 500, {"cx_param": -0.8, "cy_param": 0.156}),
+)
+LINE_SCENES = (
+    ("Dragon Curve", 14, (1800, 1200)),
+    ("Fractal Plant", 6, (1800, 1200)),
+    ("Koch", 7, (6000, 4000)),
+)
+TILE_JOBS = [("mandelbrot", "z^2 + c", "Ocean", None, 800, 0.0, 0.0, 3, x, y) for x in range(8) for y in range(2, 6)]
+
+
+def best_of(run, repeats=2, limit=None):
+    # Best of a few runs; a run slower than `limit` (the current winner) is
+    # not repeated, it has lost already.
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        spent = time.perf_counter() - started
+        best = spent if best is None else min(best, spent)
+        if limit is not None and spent > limit:
+            break
+    return best
+
+
+def escape_candidates(cores):
+    from fractals import jit_backend
+    if jit_backend.available():
+        for threads in sorted({1, max(1, cores // 2), cores}):
+            yield {"escape_backend": "jit", "jit_threads": threads}
+    for block in BLOCK_SIZES:
+        yield {"escape_backend": "blocked", "block_pixels": block}
+    yield {"escape_backend": "numpy"}
+
+
+def escape_scenes():
+    from fractals.escape_time import escape_time
+    from fractals.mandelbrot import MandelbrotGenerator
+    from fractals.julia import JuliaGenerator
+    scenes = []
+    for kind, view, max_iter, params in ESCAPE_SCENES:
+        gen = MandelbrotGenerator(600, 400) if kind == "mandelbrot" else JuliaGenerator(600, 400)
+        x, y = gen.view_axes(*view)
+        points = x + y[:, None] * 1j
+        z, c = gen.initial_state(points, **params)
+        expected = escape_time(z, c, max_iter, backend="numpy", formula=gen.formula)
+        scenes.append((gen, points, max_iter, params, expected))
+    return scenes
+
+
+def time_escape(candidate, scenes, limit=None):
+    from fractals.escape_time import escape_time
+    from fractals.workspace import EscapeWorkspace, BLOCK_PIXELS
+
+    backend = candidate["escape_backend"]
+    if backend == "jit":
+        import numba
+        numba.set_num_threads(min(candidate["jit_threads"], numba.config.NUMBA_NUM_THREADS))
+    workspace = EscapeWorkspace(candidate.get("block_pixels", BLOCK_PIXELS))
+
+    total = 0.0
+    for gen, points, max_iter, params, expected in scenes:
+        # Engines must agree bit for bit; one that does not is never picked.
+        z, c = gen.initial_state(points, **params)
+        result = escape_time(z, c, max_iter, backend=backend, formula=gen.formula, workspace=workspace)
+        if not all(np.array_equal(a, b) for a, b in zip(result, expected)):
+            return False
+
+        def run():
+            z, c = gen.initial_state(points, **params)
+            escape_time(z, c, max_iter, backend=backend, formula=gen.formula, workspace=workspace)
+        total += best_of(run, limit=None if limit is None else limit - total)
+        if limit is not None and total > limit:
+            return None
+    return total
+
+
+def line_scenes():
+    from fractals.Lsystem import LSystemGenerator
+    from fractals.koha import KochGenerator
+    from fractals.lsystem_presets import L_SYSTEM_PRESETS
+    from fractals.simplify import simplify_collinear
+
+    scenes = []
+    for name, depth, (width, height) in LINE_SCENES:
+        if name == "Koch":
+            x0, y0, x1, y1 = KochGenerator(width, height).segments(depth)
+        else:
+            preset = L_SYSTEM_PRESETS[name]
+            gen = LSystemGenerator(width, height)
+            x0, y0, x1, y1, _, _ = gen.segments(depth, preset["angle"], preset["length"], preset["axiom"],
+                                                preset["rules"])
+            x0, y0, x1, y1 = simplify_collinear(x0, y0, x1, y1)
+        scenes.append((x0, y0, x1, y1, width, height))
+    return scenes
+
+
+def time_raster(candidate, scenes):
+    from fractals import raster
+    raster.SAMPLE_BUDGET = candidate["raster_samples"]
+    total = 0.0
+    for x0, y0, x1, y1, width, height in scenes:
+        total += best_of(lambda: raster.rasterize_canvas(x0, y0, x1, y1, width, height, 1.0, True,
+                                                         candidate["raster_tile"]))
+    return total
+
+
+def time_tiles(candidate):
+    # A tile server lives for hours, so pool start-up is left out: the pool
+    # renders the batch once to warm up and the second pass is timed.
+    from utils.tile_server import init_thread_worker, init_worker, render_tile
+    workers = candidate["tile_workers"]
+    if candidate["tile_executor"] == "thread":
+        pool = ThreadPoolExecutor(workers, initializer=init_thread_worker)
+    else:
+        # Spawned, not forked: this process has already started numba's
+        # OpenMP threads, which do not survive a fork.
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker)
+    try:
+        jobs = list(zip(*TILE_JOBS))
+        list(pool.map(render_tile, *jobs))
+        started = time.perf_counter()
+        list(pool.map(render_tile, *jobs))
+        return time.perf_counter() - started
+    finally:
+        pool.shutdown()
+
+
+def describe(candidate):
+    return ", ".join(f"{k}={v}" for k, v in candidate.items())
+
+
+def pick(title, candidates, measure, timings):
+    print(title)
+    best, best_time = None, None
+    for candidate in candidates:
+        spent = measure(candidate, best_time)
+        timings.append({"group": title, "settings": candidate, "seconds": spent})
+        if spent is False:
+            outcome = "differs from numpy"
+        else:
+            outcome = "slower" if spent is None else f"{spent:.3f} s"
+        print(f"  {describe(candidate):55} {outcome}", flush=True)
+        if spent is not None and spent is not False and (best_time is None or spent < best_time):
+            best, best_time = candidate, spent
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the escape-time and line engines on this machine and save the fastest settings.")
+    parser.add_argument("--config", default=None, help="file to write (default: the per-user config file)")
+    parser.add_argument("--dry-run", action="store_true", help="only print the results")
+    parser.add_argument("--skip-tiles", action="store_true", help="leave the tile server pool settings alone")
+    args = parser.parse_args()
+
+    path = args.config or tuning.config_path()
+    cores = os.cpu_count() or 1
+    # Every thread count up to the core count is tried, whatever the saved
+    # config currently limits numba's pool to.
+    os.environ["NUMBA_NUM_THREADS"] = str(cores)
+
+    from fractals import jit_backend
+    jit_backend.warm_up()
+
+    # Keys that are not measured this run (--skip-tiles) keep their saved values.
+    settings = tuning.load_settings(path)
+    timings = []
+
+    scenes = escape_scenes()
+    escape = pick("Escape-time engine", list(escape_candidates(cores)),
+                  lambda candidate, limit: time_escape(candidate, scenes, limit), timings)
+    settings.update(escape)
+
+    scenes = line_scenes()
+    raster = pick("Line raster", [{"raster_samples": s, "raster_tile": t} for s in SAMPLE_BUDGETS for t in RASTER_TILES],
+                  lambda candidate, limit: time_raster(candidate, scenes), timings)
+    settings.update(raster)
+
+    if not args.skip_tiles:
+        workers = sorted({1, max(1, cores // 2), max(1, cores - 1), cores})
+        tiles = pick("Tile server pool",
+                     [{"tile_executor": e, "tile_workers": w} for e in ("process", "thread") for w in workers],
+                     lambda candidate, limit: time_tiles(candidate), timings)
+        settings.update(tiles)
+
+    report = {
+        "calibrated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": cores,
+        "python": platform.python_version(),
+        "timings": timings,
+    }
+    print("Best: " + describe(settings))
+    if args.dry_run or path is None:
+        return
+    print("Saved " + tuning.save_settings(settings, report, path))
+
+
+if __name__ == "__main__":
+    main()
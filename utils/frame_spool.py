@@ -0,0 +1,61 @@
+import glob
+import json
+import os
+
+from PyQt5.QtGui import QImage
+
+from fractals.frame_buffer import FrameBuffer
+
+
+SPOOL_FORMAT = "fractalab-spool"
+
+
+class FrameSpool:
+    def __init__(self, directory, job):
+        self.directory = directory
+        self.job = job
+        self.manifest_path = os.path.join(directory, "manifest.json")
+
+        # A spool left by a different job would mix frames from two videos,
+        # so it is only reused when the manifest matches exactly.
+        manifest = None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        if manifest != {"format": SPOOL_FORMAT, "job": job}:
+            self.clear()
+            os.makedirs(directory, exist_ok=True)
+            tmp = self.manifest_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"format": SPOOL_FORMAT, "job": job}, f, indent=1)
+            os.replace(tmp, self.manifest_path)
+
+    def frame_path(self, index):
+        return os.path.join(self.directory, f"frame_{index:05d}.png")
+
+    def has(self, index):
+        return os.path.exists(self.frame_path(index))
+
+    def write(self, index, frame):
+        if isinstance(frame, FrameBuffer):
+            image = frame.qimage()
+        else:
+            image = frame if isinstance(frame, QImage) else frame.toImage()
+        tmp = self.frame_path(index) + ".tmp"
+        if not image.save(tmp, "PNG"):
+            raise IOError(f"Failed to write frame {index} to {self.directory}")
+        os.replace(tmp, self.frame_path(index))
+        return self.frame_path(index)
+
+    def done(self, n_frames):
+        return [i for i in range(n_frames) if self.has(i)]
+
+    def complete(self, n_frames):
+        return len(self.done(n_frames)) == n_frames
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, "frame_*.png*")) + [self.manifest_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.isdir(self.directory) and not os.listdir(self.directory):
+            os.rmdir(self.directory)
@@ -0,0 +1,50 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class MorphGenerationThread(QThread):
+    progress_updated = pyqtSignal(int)
+    finished_generation = pyqtSignal(list)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, julia, c_values, center_x, center_y, zoom, iterations, base_color=None,
+                 antialias=False, spool=None):
+        super().__init__()
+        self.julia = julia
+        self.c_values = c_values[:600]
+        self.n_frames = len(self.c_values)
+        self.center_x = center_x
+        self.center_y = center_y
+        self.zoom = zoom
+        self.iterations = iterations
+        self.base_color = base_color
+        self.antialias = antialias
+        self.spool = spool
+
+    def run(self):
+        frames = [None] * self.n_frames
+        pending = []
+        for i in range(self.n_frames):
+            if self.spool is not None and self.spool.has(i):
+                frames[i] = self.spool.frame_path(i)
+            else:
+                pending.append(i)
+
+        try:
+            sweep = self.julia.generate_sweep(
+                self.c_values[pending],
+                center_x=self.center_x,
+                center_y=self.center_y,
+                zoom=self.zoom,
+                max_iter=self.iterations,
+                base_color=self.base_color,
+                antialias=self.antialias,
+                should_stop=self.isInterruptionRequested,
+                as_frames=True
+            )
+            for done, (i, frame) in enumerate(zip(pending, sweep), self.n_frames - len(pending) + 1):
+                frames[i] = self.spool.write(i, frame) if self.spool is not None else frame
+                self.progress_updated.emit(int(done / self.n_frames * 100))
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+            return
+        self.finished_generation.emit([frame for frame in frames if frame is not None])
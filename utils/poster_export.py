@@ -0,0 +1,170 @@
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from fractals.supersample import supersample
+from utils.render_farm import axis_spec, field_job
+
+
+def poster_axes(generator, view, width, height):
+    x, y = generator.view_axes(*view)
+    return np.linspace(x[0], x[-1], int(width)), np.linspace(y[0], y[-1], int(height))
+
+
+def png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+class PngStreamWriter:
+    def __init__(self, path, width, height, level=6):
+        self.width = int(width)
+        self.height = int(height)
+        self.file = open(path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self.file.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)))
+        self.compressor = zlib.compressobj(level)
+        self.previous = np.zeros(self.width * 3, dtype=np.uint8)
+
+    def write_rows(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8).reshape(len(rows), self.width * 3)
+
+        # PNG "Up" filter: every row is stored as its difference to the row above.
+        filtered = np.empty((len(rows), self.width * 3 + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[0, 1:] = rows[0] - self.previous
+        filtered[1:, 1:] = rows[1:] - rows[:-1]
+        self.previous = rows[-1].copy()
+
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self.file.write(png_chunk(b"IDAT", data))
+
+    def close(self):
+        self.file.write(png_chunk(b"IDAT", self.compressor.flush()))
+        self.file.write(png_chunk(b"IEND", b""))
+        self.file.close()
+
+
+def poster_job(generator, view, width, height, max_iter, params, base_color, antialias, band_height):
+    color = base_color if base_color is not None else generator.user_color
+    return {
+        "generator": type(generator).__name__,
+        "formula": generator.formula.name,
+        "view": [float(v) for v in view],
+        "params": {k: float(v) for k, v in params.items()},
+        "width": int(width),
+        "height": int(height),
+        "max_iter": int(max_iter),
+        "theme": generator.theme,
+        "user_color": [color.red(), color.green(), color.blue()],
+        "base_color": base_color is not None,
+        "antialias": bool(antialias),
+        "band_height": int(band_height),
+    }
+
+
+def write_manifest(path, manifest):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def render_bands(generator, raw_path, view, width, height, max_iter=200, params=None, base_color=None,
+                 antialias=False, band_height=256, progress=None, should_stop=None, farm=None):
+    params = params or {}
+    job = poster_job(generator, view, width, height, max_iter, params, base_color, antialias, band_height)
+    manifest_path = raw_path + ".json"
+    manifest = None
+    if os.path.exists(manifest_path) and os.path.exists(raw_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("job") != job:
+            manifest = None
+
+    if manifest is None:
+        manifest = {"job": job, "done": []}
+        image = np.lib.format.open_memmap(raw_path, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+        write_manifest(manifest_path, manifest)
+    else:
+        image = np.lib.format.open_memmap(raw_path, mode="r+")
+
+    x, y = poster_axes(generator, view, width, height)
+    bands = list(range(0, height, band_height))
+    done = set(manifest["done"])
+
+    def store(top, mu, inside):
+        band_y = y[top:top + band_height]
+        colorize = None
+        if antialias:
+            def colorize(mu, inside):
+                return supersample(generator, x, band_y, mu, inside, max_iter, **params)
+
+        image[top:top + band_height] = generator.field_to_rgb(mu, inside, base_color, colorize)
+        image.flush()
+
+        manifest["done"].append(top)
+        write_manifest(manifest_path, manifest)
+        if progress is not None:
+            progress(int(len(manifest["done"]) / len(bands) * 100))
+
+    if farm is not None:
+        jobs = {top: field_job(generator, axis_spec(x), axis_spec(y, top, top + band_height), max_iter, params)
+                for top in bands if top not in done}
+        for top, mu, inside in farm.map(jobs, should_stop):
+            store(top, mu, inside)
+        del image
+        return len(manifest["done"]) == len(bands)
+
+    for top in bands:
+        if top in done:
+            continue
+        if should_stop is not None and should_stop():
+            break
+
+        mu, inside = generator.compute_field(x, y[top:top + band_height], max_iter, **params)
+        store(top, mu, inside)
+
+    del image
+    return len(manifest["done"]) == len(bands)
+
+
+def export_poster(generator, path, view, width, height, max_iter=200, params=None, base_color=None,
+                  antialias=False, band_height=256, progress=None, should_stop=None, farm=None):
+    if path.lower().endswith(".npy"):
+        return render_bands(generator, path, view, width, height, max_iter, params, base_color,
+                            antialias, band_height, progress, should_stop, farm)
+
+    raw_path = path + ".part.npy"
+    finished = render_bands(generator, raw_path, view, width, height, max_iter, params, base_color,
+                            antialias, band_height, progress, should_stop, farm)
+    if not finished:
+        return False
+
+    image = np.load(raw_path, mmap_mode="r")
+    writer = PngStreamWriter(path, width, height)
+    for top in range(0, height, band_height):
+        writer.write_rows(image[top:top + band_height])
+    writer.close()
+    del image
+
+    os.remove(raw_path)
+    os.remove(raw_path + ".json")
+    return True
+
+
+def export_field_png(field, generator, path, base_color=None, band_height=256, progress=None, should_stop=None):
+    writer = PngStreamWriter(path, field.width, field.height)
+    for top, rgb in field.rgb_bands(generator, base_color, band_height):
+        if should_stop is not None and should_stop():
+            writer.file.close()
+            os.remove(path)
+            return False
+        writer.write_rows(rgb)
+        if progress is not None:
+            progress(int(min(top + band_height, field.height) / field.height * 100))
+    writer.close()
+    return True
@@ -0,0 +1,26 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class PosterExportThread(QThread):
+    progress_updated = pyqtSignal(int)
+    finished_export = pyqtSignal(bool)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, export_func, *args, **kwargs):
+        super().__init__()
+        self.export_func = export_func
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        try:
+            finished = self.export_func(
+                *self.args,
+                progress=self.progress_updated.emit,
+                should_stop=self.isInterruptionRequested,
+                **self.kwargs
+            )
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+            return
+        self.finished_export.emit(bool(finished))
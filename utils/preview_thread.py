@@ -0,0 +1,124 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QImage
+
+from utils.video_thread import VideoGenerationThread
+
+
+PROXY_WIDTH = 144
+PROXY_HEIGHT = 96
+ZOOM_STEPS = 32
+CACHE_FRAMES = 1500
+BATCH_FRAMES = 16
+
+
+class ProxyCache:
+    def __init__(self, size=CACHE_FRAMES):
+        self.size = size
+        self.frames = OrderedDict()
+
+    def get(self, key):
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+        return frame
+
+    def put(self, key, frame):
+        self.frames[key] = frame
+        self.frames.move_to_end(key)
+        while len(self.frames) > self.size:
+            self.frames.popitem(last=False)
+
+
+proxy_cache = ProxyCache()
+
+
+def snap_view(generator, ox, oy, zoom):
+    # Views are snapped to 1/ZOOM_STEPS of an octave and to the proxy pixel
+    # grid, so paths that differ only in frame count or end zoom land on the
+    # same cached frames wherever they pass the same spot.
+    level = round(math.log2(zoom) * ZOOM_STEPS)
+    zoom = 2.0 ** (level / ZOOM_STEPS)
+    x, _ = generator.view_axes(zoom, 0.0, 0.0)
+    step = (x[-1] - x[0]) / (len(x) - 1)
+    ix = round(ox / step)
+    iy = round(oy / step)
+    return (level, ix, iy), (ix * step, iy * step, zoom)
+
+
+def preview_order(n_frames, stride=8):
+    # Every 8th frame (and the last) first, then the gaps are halved, so the
+    # strip can be played end to end long before every frame is in.
+    order = []
+    seen = set()
+    while stride:
+        for i in list(range(0, n_frames, stride)) + [n_frames - 1]:
+            if i not in seen:
+                seen.add(i)
+                order.append(i)
+        stride //= 2
+    return order
+
+
+class PreviewThread(VideoGenerationThread):
+    # Frames are sent as QImages; pixmaps are only made on the GUI thread.
+    frame_ready = pyqtSignal(int, QImage)
+
+    def __init__(self, generator, key, start_params, end_params, iterations, n_frames, params=None,
+                 base_color=None, budget_func=None, cache=proxy_cache):
+        super().__init__(None, start_params, end_params, iterations, n_frames, budget_func=budget_func)
+        self.generator = generator
+        self.key = key
+        self.params = params or {}
+        self.base_color = base_color
+        self.cache = cache
+
+    def render(self, views, iters):
+        # Small frames spend their time in per-iteration numpy overhead, so a
+        # batch of views with the same budget is stacked and iterated as one.
+        points = []
+        for ox, oy, zoom in views:
+            x, y = self.generator.view_axes(zoom, ox, oy)
+            points.append(x + y[:, None] * 1j)
+        mu, inside = self.generator.compute_points(np.concatenate(points), iters, **self.params)
+        h = self.generator.height
+        return [self.generator.render_frame(mu[k * h:(k + 1) * h], inside[k * h:(k + 1) * h], self.base_color).qimage()
+                for k in range(len(views))]
+
+    def run(self):
+        order = preview_order(self.n_frames)
+        done = 0
+        try:
+            for first in range(0, len(order), BATCH_FRAMES):
+                if self.isInterruptionRequested():
+                    return
+                frames = {}
+                missing = {}
+                for i in order[first:first + BATCH_FRAMES]:
+                    view_key, view = snap_view(self.generator, *self.frame_params(i))
+                    # The budget the video itself will use for this frame, so
+                    # the preview shows the same depth; frames between two
+                    # budget anchors share it and are batched together.
+                    iters = self.frame_iterations(i)
+                    key = self.key + view_key + (iters,)
+                    frames[i] = self.cache.get(key)
+                    if frames[i] is None:
+                        missing.setdefault(iters, {}).setdefault(key, (view, []))[1].append(i)
+
+                for iters, views in missing.items():
+                    rendered = self.render([view for view, _ in views.values()], iters)
+                    for (key, (_, indices)), frame in zip(views.items(), rendered):
+                        self.cache.put(key, frame)
+                        for i in indices:
+                            frames[i] = frame
+
+                for i, frame in frames.items():
+                    done += 1
+                    self.frame_ready.emit(i, frame)
+                self.progress_updated.emit(int(done / self.n_frames * 100))
+        except Exception as e:
+            self.error_occurred.emit(str(e))
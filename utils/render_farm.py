@@ -0,0 +1,343 @@
+import argparse
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from fractals.formulas import FORMULAS
+
+
+HOST = "127.0.0.1"
+PORT = 8766
+LEASE_SECONDS = 120.0
+RECONNECT_SECONDS = 1.0
+WAIT_SECONDS = 0.5
+
+# Every message is a JSON header and an optional binary payload, each
+# prefixed by its length.
+FRAME = struct.Struct(">II")
+
+_generators = {}
+
+
+def send_message(sock, header, payload=b""):
+    data = json.dumps(header).encode()
+    sock.sendall(FRAME.pack(len(data), len(payload)) + data + payload)
+
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock):
+    header_size, payload_size = FRAME.unpack(recv_exact(sock, FRAME.size))
+    header = json.loads(recv_exact(sock, header_size))
+    return header, recv_exact(sock, payload_size) if payload_size else b""
+
+
+def encode_field(mu, inside):
+    # float32 smooth counts with NaN for the set, the same values an iteration
+    # field file stores. Grouping the bytes by significance before deflate
+    # lets the slowly varying exponent and high mantissa bytes compress.
+    field = np.where(inside, np.nan, mu).astype("<f4")
+    planes = field.view(np.uint8).reshape(-1, 4).T
+    return zlib.compress(planes.tobytes(), 1)
+
+
+def decode_field(payload, shape):
+    planes = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(4, -1)
+    field = np.ascontiguousarray(planes.T).view("<f4").reshape(shape)
+    inside = np.isnan(field)
+    return np.where(inside, 0.0, field).astype(np.float64), inside
+
+
+def axis_spec(axis, start=0, stop=None):
+    # Workers rebuild the axis with the same linspace call and slice it, so
+    # their sample coordinates match a local render bit for bit.
+    stop = len(axis) if stop is None else min(stop, len(axis))
+    return [float(axis[0]), float(axis[-1]), len(axis), int(start), int(stop)]
+
+
+def spec_axis(spec):
+    first, last, n, start, stop = spec
+    return np.linspace(first, last, int(n))[int(start):int(stop)]
+
+
+def field_job(generator, x, y, max_iter, params=None):
+    return {
+        "generator": type(generator).__name__,
+        "formula": generator.formula.name,
+        "x": x,
+        "y": y,
+        "max_iter": int(max_iter),
+        "params": {k: float(v) for k, v in (params or {}).items()},
+    }
+
+
+def render_job(job):
+    name = job["generator"]
+    if name not in _generators:
+        if name == "MandelbrotGenerator":
+            from fractals.mandelbrot import MandelbrotGenerator
+            _generators[name] = MandelbrotGenerator()
+        elif name == "JuliaGenerator":
+            from fractals.julia import JuliaGenerator
+            _generators[name] = JuliaGenerator()
+        else:
+            raise ValueError("Unknown generator: " + name)
+    gen = _generators[name]
+    gen.formula = FORMULAS[job["formula"]]
+    return gen.compute_field(spec_axis(job["x"]), spec_axis(job["y"]), job["max_iter"], **job["params"])
+
+
+class LeaseQueue:
+    def __init__(self, jobs, lease=LEASE_SECONDS):
+        self.jobs = dict(jobs)
+        self.lease = lease
+        self.pending = deque(self.jobs)
+        self.leases = {}
+        self.done = set()
+        self.lock = threading.Lock()
+
+    def expire(self):
+        now = time.monotonic()
+        for job_id, (expires, worker) in list(self.leases.items()):
+            if expires < now:
+                del self.leases[job_id]
+                self.pending.append(job_id)
+
+    def acquire(self, worker):
+        with self.lock:
+            self.expire()
+            while self.pending:
+                job_id = self.pending.popleft()
+                if job_id not in self.done:
+                    self.leases[job_id] = (time.monotonic() + self.lease, worker)
+                    return job_id, self.jobs[job_id]
+            return None
+
+    def complete(self, job_id):
+        # A job whose lease ran out may come back twice; the first copy wins.
+        with self.lock:
+            if job_id not in self.jobs or job_id in self.done:
+                return False
+            self.done.add(job_id)
+            self.leases.pop(job_id, None)
+            return True
+
+    def release(self, worker):
+        with self.lock:
+            for job_id, (_, holder) in list(self.leases.items()):
+                if holder == worker:
+                    del self.leases[job_id]
+                    self.pending.appendleft(job_id)
+
+
+class RenderFarm:
+    def __init__(self, port=PORT, host=HOST, lease=LEASE_SECONDS):
+        self.port = port
+        self.host = host
+        self.lease = lease
+        self.server = None
+        self.jobs = None
+        self.results = queue.Queue()
+        self.workers = {}
+        self.lock = threading.Lock()
+        self.batch = 0
+        self.closed = False
+
+    def start(self):
+        self.server = socket.create_server((self.host, self.port))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+        return self
+
+    def worker_count(self):
+        with self.lock:
+            return len(self.workers)
+
+    def accept(self):
+        while not self.closed:
+            try:
+                conn, address = self.server.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.serve_worker, args=(conn, address), daemon=True).start()
+
+    def serve_worker(self, conn, address):
+        worker = f"{address[0]}:{address[1]}"
+        with self.lock:
+            self.workers[worker] = conn
+        try:
+            while not self.closed:
+                header, payload = recv_message(conn)
+                if header["type"] == "result":
+                    self.accept_result(header, payload)
+                elif header["type"] == "ready":
+                    jobs, batch = self.jobs, self.batch
+                    leased = jobs.acquire(worker) if jobs is not None else None
+                    if leased is None:
+                        send_message(conn, {"type": "wait", "seconds": WAIT_SECONDS})
+                    else:
+                        job_id, job = leased
+                        send_message(conn, {"type": "job", "id": [batch, job_id], "job": job})
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            with self.lock:
+                self.workers.pop(worker, None)
+            # Whatever the worker held goes straight back to the queue.
+            if self.jobs is not None:
+                self.jobs.release(worker)
+            conn.close()
+
+    def accept_result(self, header, payload):
+        batch, job_id = header["id"]
+        jobs = self.jobs
+        if batch != self.batch or jobs is None:
+            return
+        if "error" in header:
+            self.results.put((job_id, header["error"], None))
+            return
+        mu, inside = decode_field(payload, tuple(header["shape"]))
+        if jobs.complete(job_id):
+            self.results.put((job_id, mu, inside))
+
+    def map(self, jobs, should_stop=None):
+        # Yields (job_id, mu, inside) in completion order while connected
+        # workers render the jobs; lost or expired leases are handed out again.
+        self.batch += 1
+        self.results = queue.Queue()
+        self.jobs = LeaseQueue(jobs, self.lease)
+        remaining = len(self.jobs.jobs)
+        try:
+            while remaining:
+                if should_stop is not None and should_stop():
+                    return
+                try:
+                    job_id, mu, inside = self.results.get(timeout=WAIT_SECONDS)
+                except queue.Empty:
+                    continue
+                if inside is None:
+                    raise RuntimeError(f"Worker failed on job {job_id}: {mu}")
+                remaining -= 1
+                yield job_id, mu, inside
+        finally:
+            self.jobs = None
+
+    def close(self):
+        self.closed = True
+        if self.server is not None:
+            self.server.close()
+        with self.lock:
+            for conn in self.workers.values():
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def run_worker(host=HOST, port=PORT, should_stop=None):
+    while should_stop is None or not should_stop():
+        try:
+            with socket.create_connection((host, port)) as sock:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                while should_stop is None or not should_stop():
+                    send_message(sock, {"type": "ready"})
+                    header, _ = recv_message(sock)
+                    if header["type"] == "wait":
+                        time.sleep(header["seconds"])
+                        continue
+                    try:
+                        mu, inside = render_job(header["job"])
+                    except Exception as e:
+                        send_message(sock, {"type": "result", "id": header["id"], "error": str(e)})
+                        continue
+                    send_message(sock, {"type": "result", "id": header["id"], "shape": list(mu.shape)},
+                                 encode_field(mu, inside))
+        except (ConnectionError, OSError):
+            time.sleep(RECONNECT_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render farm: workers render escape-time tiles for a coordinator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="connect to a coordinator and render its jobs")
+    worker.add_argument("--host", default=HOST)
+    worker.add_argument("--port", type=int, default=PORT)
+
+    poster = commands.add_parser("poster", help="coordinate a poster export across connected workers")
+    poster.add_argument("path", help="output .png (or .npy for the raw buffer)")
+    poster.add_argument("--fractal", choices=("mandelbrot", "julia"), default="mandelbrot")
+    poster.add_argument("--width", type=int, default=16000)
+    poster.add_argument("--height", type=int, default=None)
+    poster.add_argument("--zoom", type=float, default=1.0)
+    poster.add_argument("--x", type=float, default=0.0, help="offset (Mandelbrot) or centre (Julia)")
+    poster.add_argument("--y", type=float, default=0.0)
+    poster.add_argument("--cx", type=float, default=-0.8)
+    poster.add_argument("--cy", type=float, default=0.156)
+    poster.add_argument("--iter", type=int, default=500)
+    poster.add_argument("--formula", choices=sorted(FORMULAS), default="z^2 + c")
+    poster.add_argument("--theme", default="Ocean")
+    poster.add_argument("--band-height", type=int, default=256)
+    poster.add_argument("--host", default=HOST,
+                        help="address to listen on; the farm has no authentication, so only open it (0.0.0.0 or a LAN "
+                             "address) on a trusted network")
+    poster.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        try:
+            run_worker(args.host, args.port)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    from utils.poster_export import export_poster
+    if args.fractal == "mandelbrot":
+        from fractals.mandelbrot import MandelbrotGenerator
+        gen = MandelbrotGenerator()
+        params = {}
+    else:
+        from fractals.julia import JuliaGenerator
+        gen = JuliaGenerator()
+        params = {"cx_param": args.cx, "cy_param": args.cy}
+    gen.formula = FORMULAS[args.formula]
+    gen.theme = args.theme
+    height = args.height or int(round(args.width * gen.height / gen.width))
+
+    farm = RenderFarm(args.port, args.host).start()
+    print(f"Coordinator listening on {args.host}:{farm.port}; start workers with "
+          f"python -m utils.render_farm worker --host <this machine> --port {farm.port}")
+
+    def progress(value):
+        print(f"\r{value}% ({farm.worker_count()} workers)", end="", flush=True)
+
+    try:
+        finished = export_poster(gen, args.path, (args.zoom, args.x, args.y), args.width, height, args.iter, params,
+                                 band_height=args.band_height, progress=progress, farm=farm)
+    except KeyboardInterrupt:
+        finished = False
+    finally:
+        farm.close()
+    print()
+    print("Saved " + args.path if finished else "Interrupted; rerun the same command to resume")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from collections import OrderedDict, deque
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from fractals.formulas import FORMULAS
+from fractals.tuning import SETTINGS
+
+
+HOST = "127.0.0.1"
+TILE_SIZE = 256
+THEMES = ("Ocean", "Fire", "Ice", "Neon", "Pastel", "Custom")
+MAX_ZOOM = 40
+MAX_ITER = 20000
+
+# Slippy-map z/x/y addresses a square world cut into 2^z x 2^z tiles; the
+# world is centred on the interesting part of each set.
+WORLDS = {
+    "mandelbrot": (-0.75, 0.0, 3.0),
+    "julia": (0.0, 0.0, 4.0),
+}
+
+_local = threading.local()
+
+
+def init_worker():
+    # Every worker is a process of its own, so numba must not spread a single
+    # tile across all cores as well.
+    os.environ["NUMBA_NUM_THREADS"] = "1"
+
+
+def init_thread_worker():
+    # numba's thread count is per calling thread, so each pool thread renders
+    # its tiles on one core too.
+    from fractals import jit_backend
+    if jit_backend.available():
+        import numba
+        numba.set_num_threads(1)
+
+
+def default_workers():
+    return SETTINGS["tile_workers"] or max(1, (os.cpu_count() or 2) - 1)
+
+
+def make_pool(workers, executor=None):
+    if (executor or SETTINGS["tile_executor"]) == "thread":
+        return ThreadPoolExecutor(workers, initializer=init_thread_worker)
+    return ProcessPoolExecutor(workers, initializer=init_worker)
+
+
+def tile_axes(kind, z, x, y, size=TILE_SIZE):
+    cx, cy, extent = WORLDS[kind]
+    span = extent / (1 << z)
+    step = span / size
+    left = cx - extent / 2 + x * span
+    top = cy - extent / 2 + y * span
+    # Pixel centres, so neighbouring tiles never sample the same coordinate.
+    xs = left + (np.arange(size) + 0.5) * step
+    ys = top + (np.arange(size) + 0.5) * step
+    return xs, ys
+
+
+def render_tile(kind, formula, theme, color, max_iter, cx, cy, z, x, y, size=TILE_SIZE):
+    from PyQt5.QtGui import QColor
+    from PIL import Image
+
+    # Generators are per thread: a thread pool shares the module, and a
+    # generator holds the formula, theme and workspace of the tile in hand.
+    generators = getattr(_local, "generators", None)
+    if generators is None:
+        generators = _local.generators = {}
+    if kind not in generators:
+        if kind == "mandelbrot":
+            from fractals.mandelbrot import MandelbrotGenerator
+            generators[kind] = MandelbrotGenerator(size, size)
+        else:
+            from fractals.julia import JuliaGenerator
+            generators[kind] = JuliaGenerator(size, size)
+    gen = generators[kind]
+    gen.formula = FORMULAS[formula]
+    gen.theme = theme
+
+    params = {"cx_param": cx, "cy_param": cy} if kind == "julia" else {}
+    xs, ys = tile_axes(kind, z, x, y, size)
+    mu, inside = gen.compute_field(xs, ys, max_iter, **params)
+    base_color = QColor(*color) if color is not None else None
+    rgb = gen.field_to_rgb(mu, inside, base_color)
+
+    out = io.BytesIO()
+    Image.fromarray(rgb, "RGB").save(out, "PNG", compress_level=1)
+    return out.getvalue()
+
+
+class TileRequestError(Exception):
+    pass
+
+
+def parse_tile_request(path, query):
+    parts = path.strip("/").split("/")
+    if len(parts) != 4 or parts[0] not in WORLDS or not parts[3].endswith(".png"):
+        raise TileRequestError("Expected /mandelbrot/z/x/y.png or /julia/z/x/y.png")
+    kind = parts[0]
+    try:
+        z, x, y = int(parts[1]), int(parts[2]), int(parts[3][:-4])
+    except ValueError:
+        raise TileRequestError("Tile coordinates must be integers")
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < (1 << z) or not 0 <= y < (1 << z):
+        raise TileRequestError("Tile outside the world")
+
+    def arg(name, default):
+        return query.get(name, [default])[0]
+
+    try:
+        max_iter = int(arg("iter", "200"))
+        cx = float(arg("cx", "-0.8"))
+        cy = float(arg("cy", "0.156"))
+    except ValueError:
+        raise TileRequestError("iter, cx and cy must be numbers")
+    if not 1 <= max_iter <= MAX_ITER:
+        raise TileRequestError(f"iter must be between 1 and {MAX_ITER}")
+
+    theme = arg("theme", "Ocean")
+    formula = arg("formula", "z^2 + c")
+    if theme not in THEMES:
+        raise TileRequestError("Unknown theme: " + theme)
+    if formula not in FORMULAS:
+        raise TileRequestError("Unknown formula: " + formula)
+
+    color = None
+    if "color" in query:
+        try:
+            value = int(arg("color", ""), 16)
+        except ValueError:
+            raise TileRequestError("color must be a hex RRGGBB value")
+        color = ((value >> 16) & 255, (value >> 8) & 255, value & 255)
+        theme = "Custom"
+    if kind == "mandelbrot":
+        cx = cy = 0.0
+
+    return (kind, formula, theme, color, max_iter, cx, cy, z, x, y)
+
+
+def tile_key(job):
+    kind, formula, theme, color, max_iter, cx, cy, z, x, y = job
+    color = "%02x%02x%02x" % color if color is not None else "-"
+    style = f"{formula}_{theme}_{color}_{max_iter}_{cx!r}_{cy!r}".replace(" ", "").replace("^", "p")
+    return os.path.join(kind, style, str(z), str(x), f"{y}.png")
+
+
+class TileCache:
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.tiles = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        data = self.tiles.get(key)
+        if data is not None:
+            self.tiles.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if key in self.tiles:
+            return
+        self.tiles[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes and self.tiles:
+            _, old = self.tiles.popitem(last=False)
+            self.size -= len(old)
+
+    def read_disk(self, key):
+        if self.directory is None:
+            return None
+        path = os.path.join(self.directory, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write_disk(self, key, data):
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+class Metrics:
+    def __init__(self, window=2048):
+        self.started = time.time()
+        self.latencies = deque(maxlen=window)
+        self.counters = dict.fromkeys(
+            ("requests", "memory_hits", "disk_hits", "renders", "coalesced", "errors"), 0
+        )
+
+    def count(self, name):
+        self.counters[name] += 1
+
+    def report(self, in_flight, cache):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        report = dict(self.counters)
+        report.update(
+            uptime=round(time.time() - self.started, 1),
+            in_flight=in_flight,
+            cached_tiles=len(cache.tiles),
+            cached_bytes=cache.size,
+            latency_ms={"p50": round(p50, 3), "p90": round(p90, 3), "p99": round(p99, 3),
+                        "max": round(float(latencies.max()), 3)},
+        )
+        return report
+
+
+class TileServer:
+    def __init__(self, port=8765, workers=None, cache_dir=None, cache_bytes=64 * 1024 * 1024, queue_limit=None,
+                 executor=None):
+        self.port = port
+        self.workers = workers or default_workers()
+        self.cache = TileCache(cache_dir, cache_bytes)
+        self.metrics = Metrics()
+        self.in_flight = {}
+        # Bounds how many renders may wait on the pool; further misses wait
+        # here instead of piling unbounded work into the executor.
+        self.render_slots = asyncio.Semaphore(queue_limit or self.workers * 4)
+        self.pool = make_pool(self.workers, executor)
+
+    async def tile(self, job):
+        key = tile_key(job)
+        data = self.cache.get(key)
+        if data is not None:
+            self.metrics.count("memory_hits")
+            return data
+
+        # Identical tiles requested while one is rendering share its result.
+        if key in self.in_flight:
+            self.metrics.count("coalesced")
+            return await asyncio.shield(self.in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            data = await self.load_or_render(key, job)
+            self.cache.put(key, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; retrieving it here keeps asyncio from
+            # logging an unretrieved exception when nobody else was waiting.
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+    async def load_or_render(self, key, job):
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self.cache.read_disk, key)
+        if data is not None:
+            self.metrics.count("disk_hits")
+            return data
+
+        async with self.render_slots:
+            self.metrics.count("renders")
+            data = await loop.run_in_executor(self.pool, render_tile, *job)
+        await loop.run_in_executor(None, self.cache.write_disk, key, data)
+        return data
+
+    async def respond(self, path, query):
+        if path == "/metrics":
+            body = json.dumps(self.metrics.report(len(self.in_flight), self.cache), indent=1).encode()
+            return 200, "application/json", body
+        try:
+            job = parse_tile_request(path, query)
+        except TileRequestError as e:
+            return 400, "text/plain; charset=utf-8", str(e).encode()
+        return 200, "image/png", await self.tile(job)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                started = time.perf_counter()
+                self.metrics.count("requests")
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                if method != "GET":
+                    status, content_type, body = 405, "text/plain; charset=utf-8", b"Only GET is supported"
+                else:
+                    url = urlsplit(target)
+                    try:
+                        status, content_type, body = await self.respond(url.path, parse_qs(url.query))
+                    except Exception as e:
+                        self.metrics.count("errors")
+                        status, content_type, body = 500, "text/plain; charset=utf-8", str(e).encode()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                reason = {200: "OK", 400: "Bad Request", 405: "Method Not Allowed"}.get(status, "Error")
+                head = [
+                    f"HTTP/1.1 {status} {reason}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(body)}",
+                    "Cache-Control: " + ("public, max-age=86400" if content_type == "image/png" else "no-store"),
+                    "Access-Control-Allow-Origin: *",
+                    "Connection: " + ("keep-alive" if keep_alive else "close"),
+                ]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                self.metrics.latencies.append((time.perf_counter() - started) * 1000.0)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, ready=None):
+        server = await asyncio.start_server(self.handle, HOST, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready(self.port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Mandelbrot and Julia z/x/y PNG tiles on localhost.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="render workers (default: calibrated, else cores - 1)")
+    parser.add_argument("--executor", choices=("process", "thread"), default=None,
+                        help="render pool type (default: calibrated, else process)")
+    parser.add_argument("--cache-dir", default=None, help="directory for the on-disk tile cache")
+    parser.add_argument("--cache-mb", type=int, default=64, help="in-memory tile cache size")
+    args = parser.parse_args()
+
+    server = TileServer(args.port, args.workers, args.cache_dir, args.cache_mb * 1024 * 1024, executor=args.executor)
+    try:
+        asyncio.run(server.serve(lambda port: print(f"Serving tiles on http://{HOST}:{port}/")))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
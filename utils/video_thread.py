@@ -5,9 +5,17 @@ class VideoGenerationThread(QThread):
     finished_generation = pyqtSignal(list)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, gen_func, start_params, end_params, iterations, n_frames):
+    def __init__(self, gen_func, start_params, end_params, iterations, n_frames, budget_func=None,
+                 budget_interval=10, spool=None, farm=None, farm_job=None, farm_render=None):
         super().__init__()
         self.gen_func = gen_func
+        self.budget_func = budget_func
+        self.budget_interval = max(1, int(budget_interval))
+        self.budgets = {}
+        self.spool = spool
+        self.farm = farm
+        self.farm_job = farm_job
+        self.farm_render = farm_render
         self.start_params = start_params
         self.end_params = end_params
         self.iterations = iterations
@@ -15,23 +23,26 @@ class VideoGenerationThread(QThread):
         self.frames = []
         
     def run(self):
-        start_x, start_y, start_zoom = self.start_params
-        end_x, end_y, end_zoom = self.end_params
-        
+        if self.farm is not None:
+            try:
+                self.run_farm()
+            except Exception as e:
+                self.error_occurred.emit(str(e))
+            return
+
         frames = []
         
         for i in range(self.n_frames):
             if self.isInterruptionRequested():
                 break
-                
-            t = i / (self.n_frames - 1) if self.n_frames > 1 else 0
-            t_smooth = self.smooth_step(t)
-            
-            current_x = start_x + (end_x - start_x) * t_smooth
-            current_y = start_y + (end_y - start_y) * t_smooth
-            current_zoom = start_zoom * (end_zoom / start_zoom) ** t_smooth
             
-            adaptive_iters = max(50, min(self.iterations, int(100 + current_zoom * 2)))
+            if self.spool is not None and self.spool.has(i):
+                frames.append(self.spool.frame_path(i))
+                self.progress_updated.emit(int((i + 1) / self.n_frames * 100))
+                continue
+                
+            current_x, current_y, current_zoom = self.frame_params(i)
+            adaptive_iters = self.frame_iterations(i)
             
             frame_generator = self.gen_func(
                 current_x, current_y, current_zoom, adaptive_iters
@@ -41,7 +52,9 @@ class VideoGenerationThread(QThread):
             for frame in frame_generator:
                 final_frame = frame
                 
-            if final_frame:
+            if final_frame and self.spool is not None:
+                frames.append(self.spool.write(i, final_frame))
+            elif final_frame:
                 frames.append(final_frame)
             
             progress = int((i + 1) / self.n_frames * 100)
@@ -49,5 +62,51 @@ class VideoGenerationThread(QThread):
             
         self.finished_generation.emit(frames)
 
+    def run_farm(self):
+        # Frames are leased to farm workers and come back in any order; each is
+        # coloured here as it arrives and the list is put back in order at the end.
+        jobs = {}
+        done = {}
+        for i in range(self.n_frames):
+            if self.spool is not None and self.spool.has(i):
+                done[i] = self.spool.frame_path(i)
+            else:
+                jobs[i] = self.farm_job(*self.frame_params(i), self.frame_iterations(i))
+
+        for i, mu, inside in self.farm.map(jobs, self.isInterruptionRequested):
+            frame = self.farm_render(*self.frame_params(i), self.frame_iterations(i), mu, inside)
+            done[i] = self.spool.write(i, frame) if self.spool is not None else frame
+            self.progress_updated.emit(int(len(done) / self.n_frames * 100))
+
+        # An interrupted run keeps only the unbroken prefix, like the local loop.
+        frames = []
+        for i in range(self.n_frames):
+            if i not in done:
+                break
+            frames.append(done[i])
+        self.finished_generation.emit(frames)
+
+    def frame_iterations(self, i):
+        if self.budget_func is None:
+            return max(50, min(self.iterations, int(100 + self.frame_params(i)[2] * 2)))
+        # Resumed runs skip spooled frames, so the budget is taken at the
+        # frame that would have set it in an uninterrupted run.
+        anchor = i if i == self.n_frames - 1 else i - i % self.budget_interval
+        if anchor not in self.budgets:
+            self.budgets[anchor] = self.budget_func(*self.frame_params(anchor), self.iterations)
+        return self.budgets[anchor]
+
+    def frame_params(self, i):
+        start_x, start_y, start_zoom = self.start_params
+        end_x, end_y, end_zoom = self.end_params
+        
+        t = i / (self.n_frames - 1) if self.n_frames > 1 else 0
+        t_smooth = self.smooth_step(t)
+        
+        current_x = start_x + (end_x - start_x) * t_smooth
+        current_y = start_y + (end_y - start_y) * t_smooth
+        current_zoom = start_zoom * (end_zoom / start_zoom) ** t_smooth
+        return current_x, current_y, current_zoom
+
     def smooth_step(self, t):
         return t * t * (3 - 2 * t)
\ No newline at end of file
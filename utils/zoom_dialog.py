@@ -1,7 +1,16 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QDialog, QFileDialog, QMessageBox
 from PyQt5.uic import loadUi
 from utils.zoom_video import save_frames_to_video
 from utils.video_thread import VideoGenerationThread
+from utils.morph_thread import MorphGenerationThread
+from utils.frame_spool import FrameSpool
+from fractals.julia_sweep import c_path
+from fractals.iteration_budget import estimate_max_iter
+from fractals.supersample import supersample
+from utils.render_farm import axis_spec, field_job
+from utils.preview_thread import PreviewThread, PROXY_WIDTH, PROXY_HEIGHT
 
 class ZoomDialog(QDialog):
     def __init__(self, mandel, parent=None, julia=None, lblFractal=None):
@@ -17,16 +26,88 @@ class ZoomDialog(QDialog):
         self.parent = parent
         self.lblFractal = lblFractal
         self.video_thread = None
+        self.budget_func = None
+        self.spool = None
+        self.job = None
+        self.farm_job = None
+        self.farm_render = None
+        self.preview_thread = None
+        self.preview_frames = None
 
         self.btnGenerateVideo.clicked.connect(self.generate_video)
+        self.btnPreview.clicked.connect(self.start_preview)
+        self.btnPlayPreview.toggled.connect(self.play_preview)
+        self.sliderPreview.valueChanged.connect(self.show_preview_frame)
+        self.finished.connect(self.stop_preview)
+        self.comboVideoMode.currentIndexChanged.connect(lambda index: self.groupBoxPreview.setEnabled(index == 0))
+
+        self.play_timer = QTimer(self)
+        self.play_timer.setInterval(1000 // 30)
+        self.play_timer.timeout.connect(self.next_preview_frame)
+
+        # Once a preview is up, editing the path re-runs it; cached proxy
+        # frames make that cheap.
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(300)
+        self.preview_timer.timeout.connect(self.start_preview)
+        for spin in (self.endXSpinBox, self.endYSpinBox, self.spinStartZoom, self.spinEndZoom,
+                     self.spinFrames, self.spinIterations):
+            spin.valueChanged.connect(self.schedule_preview)
+
+        is_julia = self.parent.comboFractal.currentIndex() == 1
+        self.groupBoxMorph.setEnabled(is_julia)
+        if is_julia:
+            self.spinEndCReal.setValue(self.parent.spinCRealJulia.value())
+            self.spinEndCImag.setValue(self.parent.spinCImagJulia.value())
 
         self._selecting_start = None
 
+    def job_description(self, gen_obj, base_color, **extra):
+        job = {
+            "fractal": type(gen_obj).__name__,
+            "formula": gen_obj.formula.name,
+            # Generators follow the window size; frames spooled at another
+            # size are not reused.
+            "width": gen_obj.width,
+            "height": gen_obj.height,
+            "theme": gen_obj.theme,
+            "color": [base_color.red(), base_color.green(), base_color.blue()] if base_color is not None else None,
+            "antialias": self.chkAntialias.isChecked(),
+        }
+        job.update(extra)
+        return job
+
+    def farm_funcs(self, gen_obj, base_color, antialias, mode, **params):
+        # Workers only send back the iteration field, so distance shading
+        # (which needs the derivative) stays local.
+        if mode != "escape":
+            return None, None
+
+        def farm_job(ox, oy, zoom, iters):
+            x, y = gen_obj.view_axes(zoom, ox, oy)
+            return field_job(gen_obj, axis_spec(x), axis_spec(y), iters, params)
+
+        def farm_render(ox, oy, zoom, iters, mu, inside):
+            colorize = None
+            if antialias:
+                x, y = gen_obj.view_axes(zoom, ox, oy)
+                def colorize(mu, inside):
+                    return supersample(gen_obj, x, y, mu, inside, iters, **params)
+            return gen_obj.render_frame(mu, inside, base_color, colorize)
+
+        return farm_job, farm_render
+
     def get_gen_func(self):
+        antialias = self.chkAntialias.isChecked()
+        self.farm_job = self.farm_render = None
         if self.parent.comboFractal.currentIndex() == 0:
             gen_obj = self.mandel
             gen_obj.theme = self.parent.comboColorTheme.currentText()
             base_color = getattr(self.parent, "selected_mandel_color", None)
+            mode = "distance" if self.parent.chkDistanceMandelbrot.isChecked() else "escape"
+            if gen_obj.formula.transform != "none":
+                mode = "escape"
 
             def mandel_numpy_wrapper(ox, oy, zoom, iters):
                 return gen_obj.generate_numpy(
@@ -34,10 +115,19 @@ class ZoomDialog(QDialog):
                     zoom=zoom,
                     offset_x=ox,
                     offset_y=oy,
-                    base_color=base_color
+                    base_color=base_color,
+                    antialias=antialias,
+                    mode=mode,
+                    as_frames=True
                 )
                 
+            def mandel_budget(ox, oy, zoom, limit):
+                return estimate_max_iter(gen_obj, zoom, ox, oy, limit=limit)
+
             gen_func = mandel_numpy_wrapper
+            self.budget_func = mandel_budget
+            self.farm_job, self.farm_render = self.farm_funcs(gen_obj, base_color, antialias, mode)
+            self.job = self.job_description(gen_obj, base_color, mode=mode)
             
         elif self.parent.comboFractal.currentIndex() == 1:
             gen_obj = self.julia
@@ -49,6 +139,9 @@ class ZoomDialog(QDialog):
             
             cx = self.parent.spinCRealJulia.value()
             cy = self.parent.spinCImagJulia.value()
+            mode = "distance" if self.parent.chkDistanceJulia.isChecked() else "escape"
+            if gen_obj.formula.transform != "none":
+                mode = "escape"
             
             def julia_numpy_wrapper(ox, oy, zoom, iters):
                 return gen_obj.generate_numpy(
@@ -58,32 +151,150 @@ class ZoomDialog(QDialog):
                     cy_param=cy,
                     base_color=base_color,
                     center_x=ox,
-                    center_y=oy
+                    center_y=oy,
+                    antialias=antialias,
+                    mode=mode,
+                    as_frames=True
                 )
                 
+            def julia_budget(ox, oy, zoom, limit):
+                return estimate_max_iter(gen_obj, zoom, ox, oy, limit=limit, cx_param=cx, cy_param=cy)
+
             gen_func = julia_numpy_wrapper
+            self.budget_func = julia_budget
+            self.farm_job, self.farm_render = self.farm_funcs(gen_obj, base_color, antialias, mode,
+                                                              cx_param=cx, cy_param=cy)
+            self.job = self.job_description(gen_obj, base_color, mode=mode, c=[cx, cy])
         else:
             gen_func = None
+            self.budget_func = None
             
         return gen_func
 
+    def path_params(self):
+        endX = self.endXSpinBox.value()
+        endY = self.endYSpinBox.value()
+        startZoom = self.spinStartZoom.value()
+        endZoom = self.spinEndZoom.value()
+        startX = endX - (0.05 / endZoom)
+        startY = endY - (0.05 / endZoom)
+        return (startX, startY, startZoom), (endX, endY, endZoom)
+
+    def preview_source(self):
+        # A private generator at proxy size, so the preview never shares the
+        # main window's frame buffer or workspace.
+        if self.parent.comboFractal.currentIndex() == 0:
+            gen_obj = self.mandel
+            theme = self.parent.comboColorTheme.currentText()
+            base_color = getattr(self.parent, "selected_mandel_color", None)
+            params = {}
+        elif self.parent.comboFractal.currentIndex() == 1:
+            gen_obj = self.julia
+            theme = self.parent.comboColorTheme_2.currentText()
+            base_color = getattr(self.parent, "selected_julia_color", None)
+            params = {"cx_param": self.parent.spinCRealJulia.value(), "cy_param": self.parent.spinCImagJulia.value()}
+        else:
+            return None
+
+        proxy = type(gen_obj)(PROXY_WIDTH, PROXY_HEIGHT, formula=gen_obj.formula)
+        proxy.theme = theme
+        key = (type(gen_obj).__name__, gen_obj.formula.name, theme,
+               base_color.rgb() if base_color is not None else None, tuple(sorted(params.items())))
+
+        def budget(ox, oy, zoom, limit):
+            return estimate_max_iter(proxy, zoom, ox, oy, limit=limit, **params)
+        return proxy, key, params, base_color, budget
+
+    def schedule_preview(self):
+        if self.preview_frames is not None:
+            self.preview_timer.start()
+
+    def start_preview(self):
+        source = self.preview_source()
+        if source is None:
+            QMessageBox.warning(self, "Error", "Unsupported fractal type")
+            return
+        self.stop_preview()
+
+        proxy, key, params, base_color, budget = source
+        start_params, end_params = self.path_params()
+        self.preview_thread = PreviewThread(
+            proxy,
+            key,
+            start_params,
+            end_params,
+            self.spinIterations.value(),
+            self.spinFrames.value(),
+            params=params,
+            base_color=base_color,
+            budget_func=budget
+        )
+        n_frames = self.preview_thread.n_frames
+        self.preview_frames = [None] * n_frames
+        self.sliderPreview.setMaximum(n_frames - 1)
+        self.sliderPreview.setValue(min(self.sliderPreview.value(), n_frames - 1))
+
+        self.preview_thread.frame_ready.connect(self.on_preview_frame)
+        self.preview_thread.error_occurred.connect(self.on_preview_error)
+        self.preview_thread.start()
+
+    def stop_preview(self):
+        self.preview_timer.stop()
+        if self.preview_thread is not None:
+            self.preview_thread.requestInterruption()
+            self.preview_thread.wait()
+            self.preview_thread = None
+
+    def on_preview_frame(self, i, image):
+        # Frames still queued from a preview that was restarted are dropped.
+        if self.sender() is not self.preview_thread:
+            return
+        self.preview_frames[i] = QPixmap.fromImage(image)
+        self.show_preview_frame(self.sliderPreview.value())
+
+    def on_preview_error(self, error_msg):
+        QMessageBox.critical(self, "Error", f"Preview failed:\n{error_msg}")
+
+    def show_preview_frame(self, value):
+        if not self.preview_frames:
+            return
+        # Frames still being rendered are stood in for by the nearest earlier one.
+        for i in range(value, -1, -1):
+            if self.preview_frames[i] is not None:
+                self.lblPreview.setPixmap(self.preview_frames[i])
+                break
+        ready = sum(frame is not None for frame in self.preview_frames)
+        self.lblPreviewFrame.setText(f"{value + 1} / {len(self.preview_frames)} ({ready} ready)")
+
+    def play_preview(self, playing):
+        if playing and not self.preview_frames:
+            self.start_preview()
+        if playing:
+            self.play_timer.start()
+        else:
+            self.play_timer.stop()
+        self.btnPlayPreview.setText("Pause" if playing else "Play")
+
+    def next_preview_frame(self):
+        if self.preview_frames:
+            self.sliderPreview.setValue((self.sliderPreview.value() + 1) % len(self.preview_frames))
+
     def generate_video(self):
         path, _ = QFileDialog.getSaveFileName(self, "Save Video", "", "MP4 Video (*.mp4)")
         if not path:
             return
         
-        endX = self.endXSpinBox.value()
-        endY = self.endYSpinBox.value()
-        startZoom = self.spinStartZoom.value()
-        endZoom = self.spinEndZoom.value()
+        (startX, startY, startZoom), (endX, endY, endZoom) = self.path_params()
         iterations = self.spinIterations.value()
         n_frames = self.spinFrames.value()        
-        startX = endX - (0.05 / endZoom)
-        startY = endY - (0.05 / endZoom)
 
         self.btnGenerateVideo.setEnabled(False)
         self.btnGenerateVideo.setText("Generating...")
 
+        if self.comboVideoMode.currentIndex() == 1 and self.parent.comboFractal.currentIndex() == 1:
+            self.generate_morph(path, endX, endY, endZoom, iterations, n_frames)
+            return
+
         gen_func = self.get_gen_func()
         if gen_func is None:
             QMessageBox.warning(self, "Error", "Unsupported fractal type")
@@ -91,12 +302,31 @@ class ZoomDialog(QDialog):
             self.btnGenerateVideo.setText("Generate Video")
             return
 
+        # Finished frames go to a spool next to the video, so a rerun of the
+        # same job after a crash or cancel only renders what is missing.
+        # Without "Resumable" they stay in memory and reach the encoder as
+        # they were rendered.
+        self.job.update(
+            video="zoom",
+            start=[startX, startY, startZoom],
+            end=[endX, endY, endZoom],
+            iterations=iterations,
+            n_frames=n_frames
+        )
+        self.spool = FrameSpool(path + ".frames", self.job) if self.chkResumable.isChecked() else None
+
+        farm = self.parent.active_farm() if self.farm_job is not None else None
         self.video_thread = VideoGenerationThread(
             gen_func=gen_func,
             start_params=(startX, startY, startZoom),
             end_params=(endX, endY, endZoom),
             iterations=iterations,
-            n_frames=n_frames
+            n_frames=n_frames,
+            budget_func=self.budget_func,
+            spool=self.spool,
+            farm=farm,
+            farm_job=self.farm_job,
+            farm_render=self.farm_render
         )
         
         self.video_thread.progress_updated.connect(self.progressBar.setValue)
@@ -107,10 +337,51 @@ class ZoomDialog(QDialog):
         
         self.video_thread.start()
 
+    def generate_morph(self, path, center_x, center_y, zoom, iterations, n_frames):
+        julia = self.julia
+        julia.theme = self.parent.comboColorTheme_2.currentText()
+        start_c = complex(self.parent.spinCRealJulia.value(), self.parent.spinCImagJulia.value())
+        end_c = complex(self.spinEndCReal.value(), self.spinEndCImag.value())
+        base_color = getattr(self.parent, "selected_julia_color", None)
+
+        self.job = self.job_description(
+            julia,
+            base_color,
+            video="morph",
+            start_c=[start_c.real, start_c.imag],
+            end_c=[end_c.real, end_c.imag],
+            view=[center_x, center_y, zoom],
+            iterations=iterations,
+            n_frames=n_frames
+        )
+        self.spool = FrameSpool(path + ".frames", self.job) if self.chkResumable.isChecked() else None
+
+        self.video_thread = MorphGenerationThread(
+            julia=julia,
+            c_values=c_path(start_c, end_c, n_frames),
+            center_x=center_x,
+            center_y=center_y,
+            zoom=zoom,
+            iterations=iterations,
+            base_color=base_color,
+            antialias=self.chkAntialias.isChecked(),
+            spool=self.spool
+        )
+
+        self.video_thread.progress_updated.connect(self.progressBar.setValue)
+        self.video_thread.finished_generation.connect(
+            lambda frames: self.on_video_generated(frames, path)
+        )
+        self.video_thread.error_occurred.connect(self.on_generation_error)
+
+        self.video_thread.start()
+
     def on_video_generated(self, frames, path):
         if frames:
             try:
                 save_frames_to_video(frames, path)
+                if self.spool is not None and self.spool.complete(self.video_thread.n_frames):
+                    self.spool.clear()
                 QMessageBox.information(self, "Done", f"Video saved to:\n{path}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save video:\n{str(e)}")
@@ -1,16 +1,38 @@
+import itertools
+
 import cv2
 import numpy as np
+from PyQt5.QtGui import QImage, QPixmap
+
+from fractals.frame_buffer import FrameBuffer, bgrx_to_pil, qimage_view
+
+def frame_array(frame):
+    # Rendered frames arrive as FrameBuffers or BGRX arrays and are used in
+    # place; spooled frames arrive as file paths and are only loaded while
+    # encoding. The second value keeps the array's memory alive.
+    if isinstance(frame, FrameBuffer):
+        return frame.array, frame
+    if isinstance(frame, np.ndarray):
+        return frame, None
+    if isinstance(frame, str):
+        frame = QImage(frame)
+    if isinstance(frame, QPixmap):
+        frame = frame.toImage()
+    return qimage_view(frame)
 
 def save_frames_to_video(frames, path, fps=30):
     if not frames:
         return
 
-    valid_frames = [frame for frame in frames if frame is not None]
-    if not valid_frames:
+    # Frames may also come from a generator, in which case only the one being
+    # encoded is ever held in memory.
+    valid_frames = (frame for frame in frames if frame is not None)
+    first = next(valid_frames, None)
+    if first is None:
         return
 
-    w = valid_frames[0].width()
-    h = valid_frames[0].height()
+    first = frame_array(first)
+    h, w = first[0].shape[:2]
     
     if w % 2 != 0:
         w -= 1
@@ -43,17 +65,41 @@ def save_frames_to_video(frames, path, fps=30):
         print("Failed to create video writer")
         return
 
-    for pix in valid_frames:
-        if pix.width() != w or pix.height() != h:
-            pix = pix.scaled(w, h, aspectRatioMode=1, transformMode=1)
-        
-        img = pix.toImage().convertToFormat(4)
-        ptr = img.bits()
-        ptr.setsize(img.byteCount())
-        arr = np.frombuffer(ptr, np.uint8).reshape(h, w, 4)
-        
-        arr = cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR)
-        
-        out.write(arr)
-
-    out.release()
\ No newline at end of file
+    # The writer takes 3-channel BGR; dropping the pad byte into one reused
+    # buffer is the only pass over each frame.
+    bgr = np.empty((h, w, 3), dtype=np.uint8)
+    for arr, owner in itertools.chain([first], map(frame_array, valid_frames)):
+        if arr.shape[:2] != (h, w):
+            # Odd sizes lose their last row or column; any other size is scaled.
+            if arr.shape[0] - h in (0, 1) and arr.shape[1] - w in (0, 1):
+                arr = arr[:h, :w]
+            else:
+                arr = cv2.resize(arr, (w, h), interpolation=cv2.INTER_AREA)
+        out.write(cv2.cvtColor(arr, cv2.COLOR_BGRA2BGR, dst=bgr))
+
+    out.release()
+
+
+def save_frames_to_gif(frames, path, duration=50):
+    # Palette images are written as they are; anything else is converted from
+    # the RGB32 frames the generators produce.
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return False
+
+    def to_pil(frame):
+        if isinstance(frame, (str, QImage, QPixmap, FrameBuffer, np.ndarray)):
+            arr, owner = frame_array(frame)
+            return bgrx_to_pil(arr).copy()
+        return frame
+
+    to_pil(first).save(
+        path,
+        save_all=True,
+        append_images=(to_pil(frame) for frame in frames),
+        duration=duration,
+        loop=0,
+        optimize=False,
+    )
+    return True